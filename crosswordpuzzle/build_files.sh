@@ -3,5 +3,6 @@ python3 -m pip install -r requirements.txt
 echo "Migrating Database..."
 python3 manage.py makemigrations --noinput
 python3 manage.py migrate --noinput
+python3 manage.py createcachetable
 echo "Collecting static files..."
 python3 manage.py collectstatic --noinput
\ No newline at end of file
@@ -1,9 +1,30 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import CrosswordPuzzle, Word, Player
+from .models import CrosswordPuzzle, Word, Player, PuzzleArchive
+from . import answers, routers, snapshots
+
+def words_changed(puzzle_ids):
+    """Recompile the snapshots of puzzles whose words were edited and move their clients onto them"""
+    for puzzle in CrosswordPuzzle.objects.filter(pk__in=puzzle_ids):
+        snapshots.refresh(puzzle)
+        CrosswordPuzzle.objects.bump_version(puzzle.pk)
+        answers.invalidate(puzzle.code)
+
+class ReplicaListAdmin(admin.ModelAdmin):
+    """Model admin whose list pages read from a replica; edits and bulk actions stay on the primary"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with routers.use_replicas():
+            response = super().changelist_view(request, extra_context)
+            # The list is only queried when the template renders
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
 @admin.register(CrosswordPuzzle)
-class CrosswordPuzzleAdmin(admin.ModelAdmin):
+class CrosswordPuzzleAdmin(ReplicaListAdmin):
     list_display = ('code', 'status', 'created_at', 'duration', 'is_active', 'player_count')
     list_filter = ('status', 'is_active', 'created_at')
     search_fields = ('code',)
@@ -13,8 +34,13 @@ class CrosswordPuzzleAdmin(admin.ModelAdmin):
         return obj.players.count()
     player_count.short_description = 'Players'
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Size changes and word inlines both show up in the snapshot
+        words_changed([form.instance.pk])
+
 @admin.register(Word)
-class WordAdmin(admin.ModelAdmin):
+class WordAdmin(ReplicaListAdmin):
     list_display = ('word', 'puzzle_code', 'direction', 'position')
     list_filter = ('direction', 'puzzle__status')
     search_fields = ('word', 'hint', 'puzzle__code')
@@ -27,8 +53,24 @@ class WordAdmin(admin.ModelAdmin):
         return f"({obj.start_row}, {obj.start_col})"
     position.short_description = 'Position'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        puzzle_ids = {obj.puzzle_id}
+        if change and 'puzzle' in form.changed_data:
+            puzzle_ids.add(form.initial['puzzle'])
+        words_changed(puzzle_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        words_changed([obj.puzzle_id])
+
+    def delete_queryset(self, request, queryset):
+        puzzle_ids = set(queryset.values_list('puzzle_id', flat=True))
+        super().delete_queryset(request, queryset)
+        words_changed(puzzle_ids)
+
 @admin.register(Player)
-class PlayerAdmin(admin.ModelAdmin):
+class PlayerAdmin(ReplicaListAdmin):
     list_display = ('display_name', 'puzzle_code', 'points', 'is_active', 'is_creator', 'joined_at')
     list_filter = ('is_active', 'is_creator', 'puzzle__status')
     search_fields = ('display_name', 'puzzle__code')
@@ -37,3 +79,14 @@ class PlayerAdmin(admin.ModelAdmin):
     def puzzle_code(self, obj):
         return obj.puzzle.code
     puzzle_code.short_description = 'Puzzle'
+
+@admin.register(PuzzleArchive)
+class PuzzleArchiveAdmin(ReplicaListAdmin):
+    list_display = ('code', 'created_at', 'archived_at', 'format', 'size')
+    search_fields = ('code',)
+    exclude = ('data',)
+    readonly_fields = ('code', 'created_at', 'archived_at', 'format')
+
+    def size(self, obj):
+        return f"{len(obj.data)} bytes"
+    size.short_description = 'Size'
@@ -0,0 +1,162 @@
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.crypto import salted_hmac
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Process-local indexes kept for the most recently guessed puzzles
+LOCAL_INDEX_SIZE = 256
+ANSWER_INDEX_TIMEOUT = 3 * 60 * 60
+
+def normalize(guess):
+    return guess.strip().upper()
+
+def answer_digest(puzzle_id, guess):
+    """Keyed hash of a normalized guess; indexes hold these instead of the answers"""
+    return salted_hmac(f'crossword.answers.{puzzle_id}', normalize(guess), algorithm='sha256').hexdigest()[:32]
+
+def _cache_key(code):
+    # v2 indexes are keyed by answer_digest
+    return f'answers_v2_{code}'
+
+class AnswerIndex:
+    """Maps the digests of a puzzle's answers to word ids and tracks which are solved"""
+
+    def __init__(self, puzzle_id, status, ends_at, answers, solved=()):
+        self.puzzle_id = puzzle_id
+        self.status = status
+        self.ends_at = ends_at
+        self.answers = answers
+        self.solved = set(solved)
+
+    @property
+    def in_progress(self):
+        return self.status == 'in_progress' and (self.ends_at is None or time.time() < self.ends_at)
+
+    def lookup(self, guess):
+        """Return the word id for a guess, or None when it is not an answer"""
+        return self.answers.get(answer_digest(self.puzzle_id, guess))
+
+    def is_solved(self, word_id):
+        return word_id in self.solved
+
+    def mark_solved(self, word_id):
+        self.solved.add(word_id)
+
+    def to_dict(self):
+        return {
+            'puzzle_id': self.puzzle_id,
+            'status': self.status,
+            'ends_at': self.ends_at,
+            'answers': self.answers,
+            'solved': list(self.solved),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['puzzle_id'], data['status'], data['ends_at'], data['answers'], data['solved'])
+
+class _LocalIndexes:
+    """Thread-safe LRU of answer indexes for this process"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        with self._lock:
+            index = self._entries.get(code)
+            if index is not None:
+                self._entries.move_to_end(code)
+            return index
+
+    def set(self, code, index):
+        with self._lock:
+            self._entries[code] = index
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, code):
+        with self._lock:
+            return self._entries.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_local = _LocalIndexes(LOCAL_INDEX_SIZE)
+
+def build_index(code):
+    """Load a puzzle's answers from the database and publish the index to both tiers"""
+    from .models import CrosswordPuzzle, Word, SolvedWord
+
+    puzzle = CrosswordPuzzle.objects.filter(code=code).values('id', 'status', 'start_time', 'duration').first()
+    if not puzzle:
+        return None
+
+    ends_at = None
+    if puzzle['start_time']:
+        ends_at = puzzle['start_time'].timestamp() + puzzle['duration'] * 60
+
+    if puzzle['status'] != 'in_progress':
+        # Only running games are worth indexing, status changes would go stale otherwise
+        return AnswerIndex(puzzle['id'], puzzle['status'], ends_at, {})
+
+    answers = {
+        answer_digest(puzzle['id'], word): word_id
+        for word_id, word in Word.objects.filter(puzzle_id=puzzle['id']).values_list('id', 'word')
+    }
+    solved = SolvedWord.objects.filter(puzzle_id=puzzle['id']).values_list('word_id', flat=True)
+    index = AnswerIndex(puzzle['id'], puzzle['status'], ends_at, answers, solved)
+
+    _local.set(code, index)
+    cache.set(_cache_key(code), index.to_dict(), ANSWER_INDEX_TIMEOUT)
+    logger.info(f"Built answer index for puzzle {code} with {len(answers)} answers")
+    return index
+
+def get_index(code):
+    """Answer index for a puzzle: process-local first, then the shared cache, then the database"""
+    index = _local.get(code)
+    if index is not None:
+        return index
+
+    data = cache.get(_cache_key(code))
+    if data is not None:
+        index = AnswerIndex.from_dict(data)
+        _local.set(code, index)
+        return index
+
+    return build_index(code)
+
+async def aget_index(code):
+    """get_index for async views, the database is only reached through a thread on a full miss"""
+    index = _local.get(code)
+    if index is not None:
+        return index
+
+    data = await cache.aget(_cache_key(code))
+    if data is not None:
+        index = AnswerIndex.from_dict(data)
+        _local.set(code, index)
+        return index
+
+    return await sync_to_async(build_index)(code)
+
+def mark_solved(code, word_id):
+    """Record a solve locally and drop the shared copy so other processes reload it"""
+    index = _local.get(code)
+    if index is not None:
+        index.mark_solved(word_id)
+    transaction.on_commit(lambda: cache.delete(_cache_key(code)))
+
+def invalidate(code):
+    """Forget a puzzle's index in this process and the shared cache"""
+    _local.pop(code)
+    transaction.on_commit(lambda: cache.delete(_cache_key(code)))
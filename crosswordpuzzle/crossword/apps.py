@@ -8,8 +8,10 @@ class CrosswordConfig(AppConfig):
 
     def ready(self):
         """Initialize app-specific configurations"""
-        # Import signal handlers
-        from . import signals
+        # Subscribe the domain event handlers
+        from . import handlers
+        # Installs the SQL query counter on new database connections
+        from . import instrumentation
 
         # Schedule periodic tasks
         try:
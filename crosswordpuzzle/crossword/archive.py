@@ -0,0 +1,140 @@
+from collections import defaultdict
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from django.utils.dateparse import parse_datetime
+from .models import CrosswordPuzzle, Player, PuzzleArchive, PuzzleSnapshot, SolvedWord, Word, STANDINGS_ORDER
+import json
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the document layout below changes, old records keep their format number
+FORMAT_VERSION = 1
+
+def encode(document):
+    return zlib.compress(json.dumps(document, cls=DjangoJSONEncoder, separators=(',', ':')).encode(), 9)
+
+def decode(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+def _group(rows):
+    grouped = defaultdict(list)
+    for puzzle_id, *row in rows:
+        grouped[puzzle_id].append(row)
+    return grouped
+
+def _document(puzzle, words, players, solves):
+    """
+    Archive layout, rows as positional lists to keep records small:
+        words:    [word, hint, direction, start_row, start_col]
+        players:  [display_name, points, is_creator, is_active, joined_at, last_solve_at] in final standing order
+        timeline: [word index, player index or None, solved_at] in solve order
+    """
+    word_index = {word_id: i for i, (word_id, *_) in enumerate(words)}
+    player_index = {player_id: i for i, (player_id, *_) in enumerate(players)}
+    return {
+        'code': puzzle['code'],
+        'rows': puzzle['rows'],
+        'cols': puzzle['cols'],
+        'duration': puzzle['duration'],
+        'status': puzzle['status'],
+        'created_at': puzzle['created_at'],
+        'words': [row[1:] for row in words],
+        'players': [row[1:] for row in players],
+        'timeline': [
+            [word_index[word_id], player_index.get(player_id), solved_at]
+            for word_id, player_id, solved_at in solves
+        ],
+    }
+
+def archivable(puzzles):
+    """
+    Completed puzzles of a queryset that can be archived.
+
+    A puzzle whose code is already archived, possible for puzzles created
+    before codes were checked against the archive, is left in place rather
+    than failing its whole batch on the unique code.
+    """
+    return puzzles.filter(status='completed').exclude(code__in=PuzzleArchive.objects.values('code'))
+
+def _raw_delete(queryset):
+    """DELETE ... WHERE for a queryset without Django's collector, so no cascades, signals or SET_NULL updates"""
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+def delete_puzzles(puzzle_ids):
+    """
+    Delete puzzles and their rows with one plain DELETE per table.
+
+    Tables are emptied in dependency order, children first, because the
+    collector that would otherwise cascade is skipped.
+    """
+    solved = _raw_delete(SolvedWord.objects.filter(puzzle_id__in=puzzle_ids))
+    _raw_delete(Player.correct_words.through.objects.filter(player__puzzle_id__in=puzzle_ids))
+    players = _raw_delete(Player.objects.filter(puzzle_id__in=puzzle_ids))
+    words = _raw_delete(Word.objects.filter(puzzle_id__in=puzzle_ids))
+    _raw_delete(PuzzleSnapshot.objects.filter(puzzle_id__in=puzzle_ids))
+    puzzles = _raw_delete(CrosswordPuzzle.objects.filter(id__in=puzzle_ids))
+    return {'puzzles': puzzles, 'words': words, 'players': players, 'solved_words': solved}
+
+def archive_puzzles(puzzle_ids):
+    """
+    Fold completed puzzles into PuzzleArchive records and delete their rows.
+
+    Runs a fixed number of queries however many puzzles are given. Returns the
+    delete counts.
+    """
+    with transaction.atomic():
+        puzzles = list(archivable(CrosswordPuzzle.objects.filter(id__in=puzzle_ids)).values(
+            'id', 'code', 'rows', 'cols', 'duration', 'status', 'created_at'
+        ))
+        ids = [puzzle['id'] for puzzle in puzzles]
+        words = _group(Word.objects.filter(puzzle_id__in=ids).order_by('puzzle_id', 'id').values_list(
+            'puzzle_id', 'id', 'word', 'hint', 'direction', 'start_row', 'start_col'
+        ))
+        players = _group(Player.objects.filter(puzzle_id__in=ids).order_by('puzzle_id', *STANDINGS_ORDER).values_list(
+            'puzzle_id', 'id', 'display_name', 'points', 'is_creator', 'is_active', 'joined_at', 'last_solve_at'
+        ))
+        solves = _group(SolvedWord.objects.filter(puzzle_id__in=ids).order_by('puzzle_id', 'solved_at').values_list(
+            'puzzle_id', 'word_id', 'solved_by_id', 'solved_at'
+        ))
+
+        PuzzleArchive.objects.bulk_create([
+            PuzzleArchive(
+                code=puzzle['code'],
+                created_at=puzzle['created_at'],
+                format=FORMAT_VERSION,
+                data=encode(_document(puzzle, words[puzzle['id']], players[puzzle['id']], solves[puzzle['id']]))
+            )
+            for puzzle in puzzles
+        ])
+        return delete_puzzles(ids)
+
+def load(code):
+    """Decoded archive document of a puzzle, or None when it was not archived"""
+    data = PuzzleArchive.objects.filter(code=code).values_list('data', flat=True).first()
+    return decode(data) if data is not None else None
+
+def archived_standings(code, active_only=True):
+    """(puzzle, players) of an archived puzzle shaped like standings.get_standings, or None"""
+    document = load(code)
+    if document is None:
+        return None
+
+    words_solved = defaultdict(int)
+    for _, player, _ in document['timeline']:
+        words_solved[player] += 1
+
+    players = []
+    for i, (display_name, points, _, is_active, joined_at, last_solve_at) in enumerate(document['players']):
+        if active_only and not is_active:
+            continue
+        joined_at = parse_datetime(joined_at)
+        players.append({
+            'display_name': display_name,
+            'points': points,
+            'words_solved': words_solved[i],
+            'last_solve_time': parse_datetime(last_solve_at) if last_solve_at else joined_at,
+            'joined_at': joined_at,
+        })
+    return {'code': document['code'], 'status': document['status']}, players
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import threading
+from itertools import count
+
+logger = logging.getLogger(__name__)
+
+# Events pushed to clients subscribed to a puzzle's stream
+EVENT_WORD_SOLVED = 'word_solved'
+EVENT_PLAYER_JOINED = 'player_joined'
+EVENT_GAME_STARTED = 'game_started'
+EVENT_GAME_ENDED = 'game_ended'
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """A single client's view of a room: an asyncio queue bound to its event loop"""
+
+    def __init__(self, room):
+        self.room = room
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def _deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: tell it to resync through the polling API
+            self.overflowed = True
+
+    def push(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, message)
+        except RuntimeError:
+            # Event loop already closed, the stream is gone
+            self.room.unsubscribe(self)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.room.unsubscribe(self)
+
+
+class RoomBroadcaster:
+    """Fans out events of one puzzle to every subscribed stream in this process"""
+
+    def __init__(self, code):
+        self.code = code
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = count(1)
+
+    def subscribe(self):
+        subscription = Subscription(self)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            empty = not self._subscribers
+        if empty:
+            _discard_room(self)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, data=None):
+        message = {'id': next(self._ids), 'event': event, 'data': data or {}}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(message)
+        return len(subscribers)
+
+
+_rooms = {}
+_rooms_lock = threading.Lock()
+
+
+def get_room(code):
+    """Return the broadcaster for a puzzle, creating it on first subscription"""
+    with _rooms_lock:
+        room = _rooms.get(code)
+        if room is None:
+            room = _rooms[code] = RoomBroadcaster(code)
+        return room
+
+
+def _discard_room(room):
+    with _rooms_lock:
+        if _rooms.get(room.code) is room and not room.subscriber_count:
+            del _rooms[room.code]
+
+
+def publish(code, event, data=None):
+    """Push an event to every listener of a puzzle, a no-op when nobody listens"""
+    with _rooms_lock:
+        room = _rooms.get(code)
+    if room is None:
+        return 0
+    try:
+        return room.publish(event, data)
+    except Exception as e:
+        logger.error(f"Error publishing {event} for puzzle {code}: {str(e)}", exc_info=True)
+        return 0
+
+
+def format_sse(message):
+    """Encode a broadcaster message as a Server-Sent Events frame"""
+    return (
+        f"id: {message['id']}\n"
+        f"event: {message['event']}\n"
+        f"data: {json.dumps(message['data'])}\n\n"
+    )
@@ -0,0 +1,260 @@
+from collections import Counter
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends import db
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, connections, router, transaction
+from django.utils.module_loading import import_string
+from django.utils.timezone import now as tz_now
+import base64
+import pickle
+import threading
+
+_MISSING = object()
+
+# Counters are shared by every thread's instance of the same cache location
+_stats = {}
+_registry_lock = threading.Lock()
+
+class CacheStats:
+    """Hit and miss counters per key prefix"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, prefix, outcome):
+        with self._lock:
+            self._counts[(prefix, outcome)] += 1
+
+    def snapshot(self):
+        """Return {prefix: {'l1_hits': n, 'l2_hits': n, 'misses': n}}"""
+        with self._lock:
+            counts = dict(self._counts)
+        result = {}
+        for (prefix, outcome), value in counts.items():
+            result.setdefault(prefix, {'l1_hits': 0, 'l2_hits': 0, 'misses': 0})[outcome] = value
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+class DatabaseCache(db.DatabaseCache):
+    """
+    Django's database cache with add and incr that are atomic across processes.
+
+    add takes over an expired entry with a conditional UPDATE and creates a
+    missing one with an INSERT that loses to a concurrent one on the primary
+    key. incr locks the entry with SELECT ... FOR UPDATE before rewriting it.
+    """
+
+    def _connection(self):
+        return connections[router.db_for_write(self.cache_model_class)]
+
+    def _encode(self, value):
+        return base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode('latin1')
+
+    def _expires(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return datetime.max
+        return datetime.fromtimestamp(timeout, tz=timezone.utc if settings.USE_TZ else None).replace(microsecond=0)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        encoded = self._encode(value)
+        expires = connection.ops.adapt_datetimefield_value(self._expires(timeout))
+        now = connection.ops.adapt_datetimefield_value(tz_now().replace(microsecond=0))
+        try:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET {quote_name("value")} = %s, {quote_name("expires")} = %s '
+                    f'WHERE {quote_name("cache_key")} = %s AND {quote_name("expires")} < %s',
+                    [encoded, expires, key, now]
+                )
+                if cursor.rowcount:
+                    return True
+                cursor.execute(
+                    f'INSERT INTO {table} ({quote_name("cache_key")}, {quote_name("value")}, {quote_name("expires")}) '
+                    f'VALUES (%s, %s, %s)',
+                    [key, encoded, expires]
+                )
+        except DatabaseError:
+            # The key exists and is live, or another process created it first
+            return False
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        lock = ' FOR UPDATE' if connection.features.has_select_for_update else ''
+        now = connection.ops.adapt_datetimefield_value(tz_now().replace(microsecond=0))
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {quote_name("value")} FROM {table} '
+                f'WHERE {quote_name("cache_key")} = %s AND {quote_name("expires")} >= %s{lock}',
+                [cache_key, now]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(base64.b64decode(connection.ops.process_clob(row[0]).encode())) + delta
+            cursor.execute(
+                f'UPDATE {table} SET {quote_name("value")} = %s WHERE {quote_name("cache_key")} = %s',
+                [self._encode(value), cache_key]
+            )
+        return value
+
+class TieredCache(BaseCache):
+    """
+    In-process L1 (LRU with TTL) in front of a shared L2 cache.
+
+    OPTIONS:
+        L2_ALIAS: alias of the configured cache used as the shared tier
+        L2_BACKEND: dotted path of a shared backend built for this cache
+            instead, with LOCATION and L2_OPTIONS (local memory by default)
+        L2_OPTIONS: OPTIONS for L2_BACKEND
+        L1_MAX_ENTRIES: size of the in-process tier
+        LOCAL_TIMEOUT: default seconds a value may be served from L1
+        PREFIX_POLICIES: {key prefix: {'timeout': s, 'local_timeout': s}}
+
+    Deletes only reach this process's L1, so local_timeout bounds how stale
+    another process can be. A local_timeout of 0 always goes to L2. add and
+    incr always go to L2, which must make them atomic across processes.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+
+        self._l1 = LocMemCache(f'tiered:{location}', {
+            'TIMEOUT': params.get('TIMEOUT', 300),
+            'OPTIONS': {'MAX_ENTRIES': options.get('L1_MAX_ENTRIES', 5000), 'CULL_FREQUENCY': 10},
+        })
+        self._owns_l2 = 'L2_ALIAS' not in options
+        if self._owns_l2:
+            self._l2 = import_string(options.get('L2_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'))(
+                location,
+                {
+                    'TIMEOUT': params.get('TIMEOUT', 300),
+                    'KEY_PREFIX': params.get('KEY_PREFIX', ''),
+                    'VERSION': params.get('VERSION', 1),
+                    'OPTIONS': options.get('L2_OPTIONS', {}),
+                }
+            )
+        else:
+            self._l2 = caches[options['L2_ALIAS']]
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 2)
+        # Longest prefix first so the most specific policy wins
+        self.policies = sorted(options.get('PREFIX_POLICIES', {}).items(), key=lambda item: -len(item[0]))
+        with _registry_lock:
+            self.stats = _stats.setdefault(location, CacheStats())
+
+    def _policy(self, key):
+        for prefix, policy in self.policies:
+            if key.startswith(prefix):
+                return prefix, policy
+        return 'other', {}
+
+    def _timeouts(self, key, timeout):
+        prefix, policy = self._policy(key)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = policy.get('timeout', DEFAULT_TIMEOUT)
+        local_timeout = policy.get('local_timeout', self.local_timeout)
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        return prefix, timeout, local_timeout
+
+    def _get_local(self, key, version):
+        prefix, _, local_timeout = self._timeouts(key, DEFAULT_TIMEOUT)
+        value = _MISSING
+        if local_timeout:
+            value = self._l1.get(key, _MISSING, version=version)
+            if value is not _MISSING:
+                self.stats.record(prefix, 'l1_hits')
+        return prefix, local_timeout, value
+
+    def _got_shared(self, key, value, prefix, local_timeout, default, version):
+        if value is _MISSING:
+            self.stats.record(prefix, 'misses')
+            return default
+        self.stats.record(prefix, 'l2_hits')
+        if local_timeout:
+            self._l1.set(key, value, local_timeout, version=version)
+        return value
+
+    def _set_local(self, key, value, local_timeout, version):
+        if local_timeout:
+            self._l1.set(key, value, local_timeout, version=version)
+        else:
+            self._l1.delete(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        prefix, local_timeout, value = self._get_local(key, version)
+        if value is not _MISSING:
+            return value
+        value = self._l2.get(key, _MISSING, version=version)
+        return self._got_shared(key, value, prefix, local_timeout, default, version)
+
+    async def aget(self, key, default=None, version=None):
+        # L1 is process memory and is read inline, only L2 goes through the backend's async API
+        prefix, local_timeout, value = self._get_local(key, version)
+        if value is not _MISSING:
+            return value
+        value = await self._l2.aget(key, _MISSING, version=version)
+        return self._got_shared(key, value, prefix, local_timeout, default, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        _, timeout, local_timeout = self._timeouts(key, timeout)
+        self._l2.set(key, value, timeout, version=version)
+        self._set_local(key, value, local_timeout, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        _, timeout, local_timeout = self._timeouts(key, timeout)
+        await self._l2.aset(key, value, timeout, version=version)
+        self._set_local(key, value, local_timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        _, timeout, local_timeout = self._timeouts(key, timeout)
+        added = self._l2.add(key, value, timeout, version=version)
+        if added and local_timeout:
+            self._l1.set(key, value, local_timeout, version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        _, timeout, _ = self._timeouts(key, timeout)
+        return self._l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1.delete(key, version=version)
+        return self._l2.delete(key, version=version)
+
+    async def adelete(self, key, version=None):
+        self._l1.delete(key, version=version)
+        return await self._l2.adelete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self._l1.has_key(key, version=version) or self._l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters always live in L2
+        value = self._l2.incr(key, delta, version=version)
+        self._l1.delete(key, version=version)
+        return value
+
+    def clear(self):
+        self._l1.clear()
+        self._l2.clear()
+
+    def close(self, **kwargs):
+        # A shared tier taken from another alias is closed with that alias
+        if self._owns_l2:
+            self._l2.close(**kwargs)
@@ -0,0 +1,56 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from typing import NamedTuple
+import json
+import struct
+import zlib
+
+# Shared documents smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+# gzip member header: magic, deflate, no flags, no mtime, no extra flags, unknown OS
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+class EncodedJson(NamedTuple):
+    """
+    A JSON object encoded once and completed per request.
+
+    head is the object without its closing brace. deflated is head as raw
+    deflate data ending on a sync flush, so a final deflate block with the
+    per-request fields can follow it, and crc is its CRC-32.
+    """
+    head: bytes
+    deflated: bytes
+    crc: int
+
+def dumps(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+def encode(document):
+    """Pre-encode a non-empty dict shared by many responses"""
+    head = dumps(document)[:-1]
+    deflated = b''
+    if len(head) >= GZIP_MIN_BYTES:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflated = compressor.compress(head) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return EncodedJson(head, deflated, zlib.crc32(head))
+
+def _tail(fields):
+    return b''.join(b',' + dumps(key) + b':' + dumps(value) for key, value in fields.items()) + b'}'
+
+def render(encoded, fields, gzip=False):
+    """Body of a shared document with fields added; gzip compresses only the added part"""
+    tail = _tail(fields)
+    if not gzip or not encoded.deflated:
+        return encoded.head + tail
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    trailer = struct.pack('<II', zlib.crc32(tail, encoded.crc), (len(encoded.head) + len(tail)) & 0xffffffff)
+    return GZIP_HEADER + encoded.deflated + compressor.compress(tail) + compressor.flush() + trailer
+
+def response(request, encoded, fields):
+    """JSON response of a shared document plus per-request fields, gzipped when the client accepts it"""
+    gzip = bool(encoded.deflated) and 'gzip' in request.headers.get('Accept-Encoding', '')
+    result = HttpResponse(render(encoded, fields, gzip), content_type='application/json')
+    result['Vary'] = 'Accept-Encoding'
+    if gzip:
+        result['Content-Encoding'] = 'gzip'
+    return result
@@ -0,0 +1,117 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from django.core.cache import cache
+from django.db import transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class PuzzleCreated:
+    puzzle_id: int
+    code: str
+
+@dataclass(frozen=True)
+class PlayerJoined:
+    puzzle_id: int
+    code: str
+    player_id: int
+    display_name: str
+
+@dataclass(frozen=True)
+class GameStarted:
+    puzzle_id: int
+    code: str
+    start_time: datetime
+    duration: int
+
+@dataclass(frozen=True)
+class WordSolved:
+    puzzle_id: int
+    code: str
+    word_id: int
+
+@dataclass(frozen=True)
+class GameEnded:
+    puzzle_id: int
+    code: str
+
+_handlers = defaultdict(list)
+
+def subscribe(event_type):
+    """
+    Register a handler for a type of event.
+
+    Handlers are called with every event of their type from one transaction
+    at once and return the cache keys that went stale, which are deleted
+    together after all handlers ran.
+    """
+    def decorator(func):
+        _handlers[event_type].append(func)
+        return func
+    return decorator
+
+def dispatch(events):
+    """Run the handlers of a list of events, grouped by type, then delete the stale cache keys in one call"""
+    by_type = defaultdict(list)
+    for event in events:
+        by_type[type(event)].append(event)
+
+    stale_keys = set()
+    for event_type, batch in by_type.items():
+        for handler in _handlers[event_type]:
+            try:
+                stale_keys.update(handler(batch) or ())
+            except Exception as e:
+                logger.error(f"Error in {handler.__name__}: {str(e)}", exc_info=True)
+    if stale_keys:
+        cache.delete_many(sorted(stale_keys))
+
+class _Batch:
+    """Events emitted inside one transaction, dispatched once it commits"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.events = []
+        self.pending = False
+        # Atomic blocks open when the flush was registered, rolling back any of them drops it
+        self.blocks = list(connection.atomic_blocks)
+
+    def is_pending(self):
+        """Whether the flush is still registered, so events appended now will be delivered"""
+        if not self.pending:
+            return False
+        # Once a block of the batch has exited it may have been rolled back, start a new batch
+        return self.connection.atomic_blocks[:len(self.blocks)] == self.blocks
+
+    def flush(self):
+        self.pending = False
+        if getattr(self.connection, 'crossword_events', None) is self:
+            self.connection.crossword_events = None
+        # Repeats, such as one puzzle invalidated by many joins, are delivered once
+        dispatch(list(dict.fromkeys(self.events)))
+
+def emit(event):
+    """
+    Deliver an event once the current transaction commits, or now outside of one.
+
+    Events of a transaction are collected and handled together, so a
+    transaction that changes many rows still runs each handler once. A batch
+    begun inside a savepoint is closed when the savepoint exits, and later
+    events start another. Events emitted inside a savepoint that is later
+    rolled back may still be delivered with the rest; handlers only
+    invalidate and notify, so that is harmless.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        dispatch([event])
+        return
+
+    batch = getattr(connection, 'crossword_events', None)
+    if batch is None or not batch.is_pending():
+        batch = _Batch(connection)
+        connection.crossword_events = batch
+        transaction.on_commit(batch.flush)
+        batch.pending = True
+    batch.events.append(event)
@@ -0,0 +1,227 @@
+from django.core.exceptions import ValidationError
+from .layout import clean_entries
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# CPU seconds a fill may use inside a request
+CPU_BUDGET = 1.0
+MAX_DICTIONARY_WORDS = 20000
+BLOCK = 1
+
+class _OutOfTime(Exception):
+    pass
+
+class WordIndex:
+    """
+    Dictionary words grouped by length with one bitset per (length, position, letter).
+
+    Bit i of bits[length][position][letter] is set when the i-th word of that
+    length has letter at position, so the words matching a partly filled slot
+    are the AND of one bitset per filled cell.
+    """
+
+    def __init__(self, words, lengths=None):
+        self.words = {}
+        self.bits = {}
+        self.all = {}
+        for word in words:
+            length = len(word)
+            if lengths is not None and length not in lengths:
+                continue
+            bucket = self.words.setdefault(length, [])
+            positions = self.bits.setdefault(length, [{} for _ in range(length)])
+            bit = 1 << len(bucket)
+            bucket.append(word)
+            for position, letter in enumerate(word):
+                positions[position][letter] = positions[position].get(letter, 0) | bit
+        for length, bucket in self.words.items():
+            self.all[length] = (1 << len(bucket)) - 1
+
+    def matches(self, pattern):
+        """Bitset of the words fitting a pattern such as ['C', '', 'T'], '' for an open cell"""
+        mask = self.all.get(len(pattern), 0)
+        positions = self.bits.get(len(pattern))
+        for position, letter in enumerate(pattern):
+            if letter and mask:
+                mask &= positions[position].get(letter, 0)
+        return mask
+
+class Slot:
+    __slots__ = ('direction', 'row', 'col', 'cells', 'crossers')
+
+    def __init__(self, direction, row, col, cells):
+        self.direction = direction
+        self.row = row
+        self.col = col
+        self.cells = cells
+        self.crossers = []
+
+def find_slots(grid):
+    """Runs of two or more open cells, across then down; single cells are checked by the other direction"""
+    rows, cols = len(grid), len(grid[0])
+    slots = []
+    for direction, outer, inner in (('across', rows, cols), ('down', cols, rows)):
+        for line in range(outer):
+            run = []
+            for position in range(inner + 1):
+                row, col = (line, position) if direction == 'across' else (position, line)
+                if position < inner and grid[row][col] != BLOCK:
+                    run.append(row * cols + col)
+                    continue
+                if len(run) > 1:
+                    start_row, start_col = divmod(run[0], cols)
+                    slots.append(Slot(direction, start_row, start_col, run))
+                run = []
+
+    owners = {}
+    for slot in slots:
+        for cell in slot.cells:
+            owners.setdefault(cell, []).append(slot)
+    for shared in owners.values():
+        if len(shared) == 2:
+            shared[0].crossers.append(shared[1])
+            shared[1].crossers.append(shared[0])
+    return slots
+
+class _Filler:
+    """Most constrained slot first, with forward checking and conflict-directed backjumping"""
+
+    def __init__(self, slots, index, size, deadline):
+        self.slots = slots
+        self.index = index
+        self.letters = [''] * size
+        self.assigned = {}
+        self.used = {length: 0 for length in index.words}
+        self.deadline = deadline
+        self.nodes = 0
+
+    def pattern_mask(self, slot):
+        return self.index.matches([self.letters[cell] for cell in slot.cells])
+
+    def candidates(self, slot):
+        return self.pattern_mask(slot) & ~self.used.get(len(slot.cells), 0)
+
+    def reasons(self, slot):
+        """Assigned slots that narrowed this slot's candidates: its crossers and same length slots holding a match"""
+        culprits = {other for other in slot.crossers if other in self.assigned}
+        length = len(slot.cells)
+        matching = self.pattern_mask(slot)
+        for other, bit in self.assigned.items():
+            if bit & matching and len(other.cells) == length:
+                culprits.add(other)
+        return culprits
+
+    def place(self, slot, bit):
+        word = self.index.words[len(slot.cells)][bit.bit_length() - 1]
+        filled = []
+        for cell, letter in zip(slot.cells, word):
+            if not self.letters[cell]:
+                self.letters[cell] = letter
+                filled.append(cell)
+        self.assigned[slot] = bit
+        self.used[len(slot.cells)] |= bit
+        return filled
+
+    def unplace(self, slot, filled):
+        bit = self.assigned.pop(slot)
+        self.used[len(slot.cells)] &= ~bit
+        for cell in filled:
+            self.letters[cell] = ''
+
+    def solve(self, unassigned):
+        """None once every slot is filled, otherwise the conflict set to jump back to"""
+        if not unassigned:
+            return None
+        self.nodes += 1
+        if time.thread_time() >= self.deadline:
+            raise _OutOfTime
+
+        slot, mask = None, 0
+        # In grid order rather than set order, so a fill is reproducible
+        for candidate in self.slots:
+            if candidate not in unassigned:
+                continue
+            candidate_mask = self.candidates(candidate)
+            if slot is None or candidate_mask.bit_count() < mask.bit_count():
+                slot, mask = candidate, candidate_mask
+                if not mask:
+                    break
+
+        conflict = self.reasons(slot)
+        rest = unassigned - {slot}
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            filled = self.place(slot, bit)
+
+            # Forward check: a crossing slot left without words rejects this one
+            wiped = next((other for other in slot.crossers if other in rest and not self.candidates(other)), None)
+            if wiped is not None:
+                conflict |= self.reasons(wiped) - {slot}
+                self.unplace(slot, filled)
+                continue
+
+            result = self.solve(rest)
+            if result is None:
+                return None
+            self.unplace(slot, filled)
+            if slot not in result:
+                # Nothing this slot can change fixes the failure below, jump past it
+                return result
+            conflict |= result - {slot}
+        return conflict
+
+def _clean_grid(grid, max_rows, max_cols):
+    if not isinstance(grid, list) or not grid or not all(isinstance(row, list) for row in grid):
+        raise ValidationError('Template grid must be a list of rows')
+    rows, cols = len(grid), len(grid[0])
+    if not (1 <= rows <= max_rows and 1 <= cols <= max_cols):
+        raise ValidationError(f'Grid size must be between 1x1 and {max_rows}x{max_cols}')
+    if any(len(row) != cols for row in grid):
+        raise ValidationError('Template grid rows must all have the same length')
+    if any(cell not in (0, BLOCK) for row in grid for cell in row):
+        raise ValidationError('Template grid cells must be 0 (open) or 1 (block)')
+    return rows, cols
+
+def fill_template(grid, dictionary, max_rows=50, max_cols=50, cpu_budget=CPU_BUDGET):
+    """
+    Fill every slot of a template grid (rows of 0 for open, 1 for block
+    cells) with distinct words from a dictionary of {'word', 'hint'} objects.
+
+    Returns (rows, cols, words) with words in the create_puzzle format, or
+    raises ValidationError when no fill exists or none was found within
+    cpu_budget seconds of CPU time.
+    """
+    rows, cols = _clean_grid(grid, max_rows, max_cols)
+    entries = clean_entries(dictionary, MAX_DICTIONARY_WORDS)
+    slots = find_slots(grid)
+    if not slots:
+        raise ValidationError('Template has no slots of two or more open cells')
+
+    hints = {entry['word']: entry['hint'] for entry in entries}
+    started = time.thread_time()
+    index = WordIndex(hints, lengths={len(slot.cells) for slot in slots})
+    filler = _Filler(slots, index, rows * cols, started + cpu_budget)
+    try:
+        result = filler.solve(set(slots))
+    except _OutOfTime:
+        logger.info(f"Gave up filling {rows}x{cols} template after {filler.nodes} nodes")
+        raise ValidationError('No fill found within the time limit, try a larger word list or more blocks')
+    if result is not None:
+        raise ValidationError('The word list cannot fill this template')
+
+    words = []
+    for slot in slots:
+        word = index.words[len(slot.cells)][filler.assigned[slot].bit_length() - 1]
+        words.append({
+            'word': word,
+            'hint': hints[word],
+            'direction': slot.direction,
+            'startRow': slot.row,
+            'startCol': slot.col,
+        })
+    elapsed_ms = (time.thread_time() - started) * 1000
+    logger.info(f"Filled {rows}x{cols} template with {len(words)} words in {elapsed_ms:.1f}ms CPU ({filler.nodes} nodes)")
+    return rows, cols, words
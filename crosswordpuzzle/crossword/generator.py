@@ -0,0 +1,251 @@
+from .layout import clean_entries
+from collections import Counter
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds a layout search may run before the best layout found so far is returned
+TIME_BUDGET = 0.8
+# Placements tried per word when backtracking, best scoring first
+BRANCHING = 3
+# Search nodes per word an attempt may visit before the next attempt reorders the words
+NODES_PER_ATTEMPT = 4
+MAX_WORDS = 200
+
+class _Grid:
+    """
+    Letters of a layout being built, with one bitmask per letter.
+
+    Bit row * cols + col of letters[L] is set when that cell holds L, and of
+    open_cells when a word of only one direction passes through it, so the
+    cells a word could cross are found with a few integer ANDs.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.cells = [''] * (rows * cols)
+        self.across = 0
+        self.down = 0
+        self.letters = {}
+
+    def letter_at(self, row, col):
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self.cells[row * self.cols + col]
+        return ''
+
+    def open_cells(self):
+        return (self.across | self.down) & ~(self.across & self.down)
+
+    def crossable(self):
+        """Cells each letter offers to a crossing word"""
+        open_cells = self.open_cells()
+        return {letter: (cells & open_cells).bit_count() for letter, cells in self.letters.items()}
+
+    def fits(self, word, direction, row, col):
+        """Crossings of a placement, or -1 when it breaks the grid or touches letters it does not cross"""
+        dr, dc = (0, 1) if direction == 'across' else (1, 0)
+        end_row, end_col = row + dr * (len(word) - 1), col + dc * (len(word) - 1)
+        if row < 0 or col < 0 or end_row >= self.rows or end_col >= self.cols:
+            return -1
+        if self.letter_at(row - dr, col - dc) or self.letter_at(end_row + dr, end_col + dc):
+            return -1
+
+        same = self.across if direction == 'across' else self.down
+        crossings = 0
+        for i, letter in enumerate(word):
+            r, c = row + dr * i, col + dc * i
+            index = r * self.cols + c
+            existing = self.cells[index]
+            if existing:
+                if existing != letter or same >> index & 1:
+                    return -1
+                crossings += 1
+            elif self.letter_at(r - dc, c - dr) or self.letter_at(r + dc, c + dr):
+                # A new letter beside another would spell an unintended word
+                return -1
+        return crossings
+
+    def placements(self, word):
+        """Every (crossings, direction, row, col) that crosses at least one placed word"""
+        open_cells = self.open_cells()
+        seen = set()
+        found = []
+        for i, letter in enumerate(word):
+            candidates = self.letters.get(letter, 0) & open_cells
+            while candidates:
+                low = candidates & -candidates
+                candidates ^= low
+                index = low.bit_length() - 1
+                r, c = divmod(index, self.cols)
+                if self.across >> index & 1:
+                    placement = ('down', r - i, c)
+                else:
+                    placement = ('across', r, c - i)
+                if placement in seen:
+                    continue
+                seen.add(placement)
+                crossings = self.fits(word, *placement)
+                if crossings > 0:
+                    found.append((crossings, *placement))
+        return found
+
+    def place(self, word, direction, row, col):
+        """Write a word and return the cells it filled, for undo"""
+        dr, dc = (0, 1) if direction == 'across' else (1, 0)
+        filled = []
+        mask = 0
+        for i, letter in enumerate(word):
+            index = (row + dr * i) * self.cols + col + dc * i
+            mask |= 1 << index
+            if not self.cells[index]:
+                self.cells[index] = letter
+                self.letters[letter] = self.letters.get(letter, 0) | 1 << index
+                filled.append(index)
+        if direction == 'across':
+            self.across |= mask
+        else:
+            self.down |= mask
+        return filled, mask
+
+    def remove(self, direction, filled, mask):
+        if direction == 'across':
+            self.across &= ~mask
+        else:
+            self.down &= ~mask
+        for index in filled:
+            letter = self.cells[index]
+            self.cells[index] = ''
+            self.letters[letter] &= ~(1 << index)
+
+class _Search:
+    """Branch and bound over word placements, keeping the layout with the most words"""
+
+    def __init__(self, grid, words, target, failures, deadline, max_nodes):
+        self.grid = grid
+        self.words = words
+        self.letter_counts = [Counter(word).items() for word in words]
+        self.target = target
+        self.failures = failures
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.placed = {}
+        self.best = {}
+        self.nodes = 0
+
+    def out_of_time(self):
+        self.nodes += 1
+        return self.nodes >= self.max_nodes or time.perf_counter() >= self.deadline
+
+    def next_word(self, remaining):
+        """
+        Most constrained first: words that most often found no placement, then
+        the fewest crossable cells, then the longest word. Words with nothing to
+        cross yet wait for the grid to grow.
+        """
+        crossable = self.grid.crossable()
+        best = None
+        for i in remaining:
+            anchors = sum(crossable.get(letter, 0) * count for letter, count in self.letter_counts[i])
+            if anchors:
+                key = (-self.failures[i], anchors, -len(self.words[i]), i)
+                if best is None or key < best:
+                    best = key
+        return best[-1] if best else None
+
+    def run(self, remaining):
+        if len(self.placed) > len(self.best):
+            self.best = dict(self.placed)
+        if len(self.best) == self.target:
+            return True
+        # Even placing every remaining word would not beat the best layout
+        if len(self.placed) + len(remaining) <= len(self.best):
+            return False
+        if self.out_of_time():
+            return True
+
+        index = self.next_word(remaining)
+        if index is None:
+            return False
+        word = self.words[index]
+        rest = remaining - {index}
+        options = sorted(self.grid.placements(word), reverse=True)[:BRANCHING]
+        if not options:
+            self.failures[index] += 1
+        for crossings, direction, row, col in options:
+            filled, mask = self.grid.place(word, direction, row, col)
+            self.placed[index] = (direction, row, col)
+            done = self.run(rest)
+            del self.placed[index]
+            self.grid.remove(direction, filled, mask)
+            if done:
+                return True
+        # Also try leaving the word out, it may be what blocks the others
+        return self.run(rest)
+
+def _first_placement(rows, cols, word):
+    if len(word) <= cols:
+        return 'across', rows // 2, (cols - len(word)) // 2
+    if len(word) <= rows:
+        return 'down', (rows - len(word)) // 2, cols // 2
+    return None
+
+def generate_layout(rows, cols, words, time_budget=TIME_BUDGET):
+    """
+    Lay out words and hints on a rows x cols grid as one connected crossword.
+
+    Words are placed by a backtracking search that always extends the word
+    with the fewest crossable cells next and prefers placements with the most
+    crossings, keeping the grid dense. When time_budget runs out the layout
+    with the most words found so far is returned.
+
+    Returns {'words': [...], 'unplaced': [...], 'complete': bool}, placed
+    words in the create_puzzle format.
+    """
+    entries = clean_entries(words, MAX_WORDS)
+    started = time.perf_counter()
+    deadline = started + time_budget
+
+    # Start from the longest word; the others grow off it
+    order = sorted(range(len(entries)), key=lambda i: -len(entries[i]['word']))
+    words = [entries[i]['word'] for i in order]
+    fitting = [i for i, word in enumerate(words) if _first_placement(rows, cols, word) is not None]
+
+    # Each attempt is a bounded backtracking search. Words that ran into dead
+    # ends are placed earlier by the next one, until every word fits or the
+    # time budget is spent.
+    failures = Counter()
+    best = {}
+    attempts = nodes = 0
+    while fitting and time.perf_counter() < deadline:
+        search = _Search(_Grid(rows, cols), words, len(fitting), failures, deadline, NODES_PER_ATTEMPT * len(words))
+        first = fitting[0]
+        search.placed[first] = _first_placement(rows, cols, words[first])
+        search.grid.place(words[first], *search.placed[first])
+        dead_ends = failures.total()
+        search.run(set(fitting[1:]))
+        attempts += 1
+        nodes += search.nodes
+        if len(search.best) > len(best):
+            best = search.best
+        # Without new dead ends the next attempt would repeat this one
+        if len(best) == len(fitting) or failures.total() == dead_ends:
+            break
+
+    placed_at = {order[position]: placement for position, placement in best.items()}
+    placed = []
+    unplaced = []
+    for index, entry in enumerate(entries):
+        if index in placed_at:
+            direction, row, col = placed_at[index]
+            placed.append({**entry, 'direction': direction, 'startRow': row, 'startCol': col})
+        else:
+            unplaced.append(entry)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(
+        f"Generated {rows}x{cols} layout with {len(placed)} of {len(entries)} words "
+        f"in {elapsed_ms:.1f}ms ({attempts} attempts, {nodes} nodes)"
+    )
+    return {'words': placed, 'unplaced': unplaced, 'complete': not unplaced}
@@ -0,0 +1,57 @@
+from django.db.models import Exists, OuterRef
+from .events import GameEnded, GameStarted, PlayerJoined, PuzzleCreated, WordSolved, subscribe
+from .models import CrosswordPuzzle, SolvedWord, Word
+from . import answers, broadcast, lifecycle, recompute
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _state_keys(events):
+    return set(recompute.stale_keys(f'puzzle_data_{event.code}' for event in events))
+
+def _standings_keys(events):
+    return _state_keys(events) | set(recompute.stale_keys(f'leaderboard_{event.code}' for event in events))
+
+@subscribe(PuzzleCreated)
+def puzzles_created(events):
+    for event in events:
+        logger.info(f"New puzzle created: {event.code}")
+
+@subscribe(PlayerJoined)
+def players_joined(events):
+    for event in events:
+        broadcast.publish(event.code, broadcast.EVENT_PLAYER_JOINED, {
+            'player_id': str(event.player_id),
+            'display_name': event.display_name,
+        })
+    return _state_keys(events)
+
+@subscribe(GameStarted)
+def games_started(events):
+    for event in events:
+        answers.build_index(event.code)
+        broadcast.publish(event.code, broadcast.EVENT_GAME_STARTED, {
+            'start_time': event.start_time.isoformat(),
+            'duration': event.duration,
+        })
+    return _state_keys(events)
+
+@subscribe(WordSolved)
+def words_solved(events):
+    for event in events:
+        answers.mark_solved(event.code, event.word_id)
+
+    # A game is over once no word is left unsolved, checked for all puzzles of the batch at once
+    solved = Exists(SolvedWord.objects.filter(word=OuterRef('pk')))
+    unsolved = Word.objects.filter(puzzle=OuterRef('pk')).exclude(solved)
+    finished = CrosswordPuzzle.objects.filter(id__in={event.puzzle_id for event in events}).exclude(Exists(unsolved))
+    for puzzle in lifecycle.end_games(finished):
+        logger.info(f"Every word of puzzle {puzzle['code']} solved, game ended")
+    return _standings_keys(events)
+
+@subscribe(GameEnded)
+def games_ended(events):
+    for event in events:
+        answers.invalidate(event.code)
+        broadcast.publish(event.code, broadcast.EVENT_GAME_ENDED)
+    return _standings_keys(events)
@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from .models import Player
+
+# How long a player's is_active flag may be reused before the database is asked again
+IDENTITY_TIMEOUT = 60
+# Signed session keys a PlayerIdentity is built from
+SESSION_FIELDS = ('player_id', 'puzzle_id', 'puzzle_code', 'display_name')
+
+def _cache_key(player_id):
+    return f'player_identity_{player_id}'
+
+class PlayerIdentity:
+    """The few player fields request handlers need, resolvable without a query"""
+
+    __slots__ = ('id', 'puzzle_id', 'puzzle_code', 'display_name', 'is_active')
+
+    def __init__(self, id, puzzle_id, puzzle_code, display_name, is_active=True):
+        self.id = id
+        self.puzzle_id = puzzle_id
+        self.puzzle_code = puzzle_code
+        self.display_name = display_name
+        self.is_active = is_active
+
+def remember(session, player, puzzle_code, expiry):
+    """Store the player's identity in the signed session and warm the is_active cache"""
+    session['player_id'] = str(player.id)
+    session['puzzle_id'] = player.puzzle_id
+    session['puzzle_code'] = puzzle_code
+    session['display_name'] = player.display_name
+    session.set_expiry(expiry)
+    cache.set(_cache_key(player.id), player.is_active, IDENTITY_TIMEOUT)
+    return PlayerIdentity(player.id, player.puzzle_id, puzzle_code, player.display_name, player.is_active)
+
+def _is_active_query(player_id):
+    return Player.objects.filter(id=player_id).values_list('is_active', flat=True)
+
+def _identity(fields, is_active):
+    player_id, puzzle_id, puzzle_code, display_name = fields
+    return PlayerIdentity(int(player_id), puzzle_id, puzzle_code, display_name, is_active)
+
+def resolve(request):
+    """
+    Return the PlayerIdentity for the request's session, or None when it is missing or gone.
+
+    The fields come from the signed session; only is_active, which also tells
+    whether the player still exists, is read from the cache or the database.
+    """
+    fields = [request.session.get(name) for name in SESSION_FIELDS]
+    if not all(fields):
+        return None
+
+    is_active = cache.get(_cache_key(fields[0]))
+    if is_active is None:
+        is_active = _is_active_query(fields[0]).first()
+        if is_active is None:
+            return None
+        cache.set(_cache_key(fields[0]), is_active, IDENTITY_TIMEOUT)
+    return _identity(fields, is_active)
+
+async def aresolve(request):
+    """resolve for async views"""
+    fields = [await request.session.aget(name) for name in SESSION_FIELDS]
+    if not all(fields):
+        return None
+
+    is_active = await cache.aget(_cache_key(fields[0]))
+    if is_active is None:
+        is_active = await _is_active_query(fields[0]).afirst()
+        if is_active is None:
+            return None
+        await cache.aset(_cache_key(fields[0]), is_active, IDENTITY_TIMEOUT)
+    return _identity(fields, is_active)
+
+def forget(player_id):
+    cache.delete(_cache_key(player_id))
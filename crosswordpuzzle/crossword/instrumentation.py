@@ -0,0 +1,200 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from bisect import bisect_left
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+import contextvars
+import hmac
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+def _setting(name, default):
+    return getattr(settings, 'CROSSWORD_METRICS', {}).get(name, default)
+
+class Histogram:
+    """Prometheus style histogram with fixed upper bounds"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+class Registry:
+    """
+    Request metrics of this process. Each server process keeps its own
+    registry, so scrape every process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = Counter()
+            self.latency = {}
+            self.queries = {}
+            self.query_seconds = Counter()
+
+    def record_request(self, view, status, seconds, stats=None):
+        with self._lock:
+            self.requests[(view, status)] += 1
+            self.latency.setdefault(view, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            if stats is not None:
+                self.queries.setdefault(view, Histogram(QUERY_BUCKETS)).observe(stats.count)
+                self.query_seconds[view] += stats.seconds
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                '# HELP crossword_requests_total Requests by view and status code.',
+                '# TYPE crossword_requests_total counter',
+            ]
+            for (view, status), count in sorted(self.requests.items()):
+                lines.append(f'crossword_requests_total{{view="{view}",status="{status}"}} {count}')
+
+            lines += [
+                '# HELP crossword_request_duration_seconds Time until the view returned its response.',
+                '# TYPE crossword_request_duration_seconds histogram',
+            ]
+            for view, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines('crossword_request_duration_seconds', f'view="{view}"'))
+
+            lines += [
+                '# HELP crossword_db_queries_per_request SQL queries of sampled requests.',
+                '# TYPE crossword_db_queries_per_request histogram',
+            ]
+            for view, histogram in sorted(self.queries.items()):
+                lines.extend(histogram.lines('crossword_db_queries_per_request', f'view="{view}"'))
+
+            lines += [
+                '# HELP crossword_db_query_seconds_total Time spent in SQL by sampled requests.',
+                '# TYPE crossword_db_query_seconds_total counter',
+            ]
+            for view, seconds in sorted(self.query_seconds.items()):
+                lines.append(f'crossword_db_query_seconds_total{{view="{view}"}} {seconds}')
+
+        stats = getattr(caches['default'], 'stats', None)
+        if stats is not None:
+            lines += [
+                '# HELP crossword_cache_lookups_total Cache reads by key prefix and tier that answered.',
+                '# TYPE crossword_cache_lookups_total counter',
+            ]
+            for prefix, outcomes in sorted(stats.snapshot().items()):
+                for outcome, count in sorted(outcomes.items()):
+                    lines.append(f'crossword_cache_lookups_total{{prefix="{prefix}",result="{outcome}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+class QueryStats:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# Query counter of the sampled request being handled, also seen by sync_to_async threads
+_current = contextvars.ContextVar('crossword_query_stats', default=None)
+
+def _count_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - started
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+def authorized(request):
+    """
+    Metrics are served to a bearer of METRICS TOKEN, or without a token to
+    the configured ALLOWED_IPS. With neither every request is denied, since
+    behind a local proxy every client would look like 127.0.0.1.
+    """
+    token = _setting('TOKEN', '')
+    if token:
+        header = request.headers.get('Authorization', '')
+        return hmac.compare_digest(header, f'Bearer {token}')
+    return request.META.get('REMOTE_ADDR') in _setting('ALLOWED_IPS', ())
+
+class InstrumentationMiddleware:
+    """
+    Records latency and status of every request, and SQL query counts and
+    time for a SAMPLE_RATE share of them. Requests slower than
+    SLOW_REQUEST_MS are logged.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = _setting('SAMPLE_RATE', 1.0)
+        self.slow_request_ms = _setting('SLOW_REQUEST_MS', 500)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        response = self.get_response(request)
+        self._finish(request, response, stats, token, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        response = await self.get_response(request)
+        self._finish(request, response, stats, token, started)
+        return response
+
+    def _start(self):
+        stats = QueryStats() if random.random() < self.sample_rate else None
+        return stats, _current.set(stats), time.perf_counter()
+
+    def _finish(self, request, response, stats, token, started):
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        registry.record_request(view, response.status_code, elapsed, stats)
+
+        elapsed_ms = elapsed * 1000
+        if self.slow_request_ms is not None and elapsed_ms >= self.slow_request_ms:
+            queries = f"{stats.count} queries in {stats.seconds * 1000:.1f}ms" if stats else "queries not sampled"
+            logger.warning(
+                f"Slow request {request.method} {request.path} ({view}) took {elapsed_ms:.1f}ms, {queries}"
+            )
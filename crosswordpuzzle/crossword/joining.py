@@ -0,0 +1,166 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction, IntegrityError
+from django.utils import timezone
+from .models import CrosswordPuzzle, Player, publish_versions, supports_returning
+from . import events, lifecycle
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Admission counters only have to outlive a game's waiting room and play time
+ADMISSION_TIMEOUT = 3 * 60 * 60
+
+NAME_TAKEN = {
+    'error': 'This name is already taken in this puzzle',
+    'error_type': 'name_taken'
+}
+ROOM_FULL = {
+    'error': 'This puzzle is full',
+    'error_type': 'room_full'
+}
+
+def room_capacity():
+    """Most players a puzzle admits, None for no limit"""
+    return getattr(settings, 'CROSSWORD_ROOM_CAPACITY', 0) or None
+
+def admission_key(puzzle_id):
+    return f'room_admitted_{puzzle_id}'
+
+def admit(puzzle_id, capacity):
+    """
+    Take a seat in a room, False when it is full.
+
+    Seats are counted with the cache's atomic incr, so a join storm is turned
+    away before it queues on the database. The counter is seeded from the
+    players already in the room when it is missing.
+    """
+    key = admission_key(puzzle_id)
+    try:
+        seats = cache.incr(key)
+    except ValueError:
+        cache.add(key, Player.objects.filter(puzzle_id=puzzle_id).count(), ADMISSION_TIMEOUT)
+        seats = cache.incr(key)
+    if seats > capacity:
+        release(puzzle_id)
+        return False
+    return True
+
+def release(puzzle_id):
+    """Give back a seat taken by a join that did not happen"""
+    try:
+        cache.decr(admission_key(puzzle_id))
+    except ValueError:
+        # Evicted, the next admission recounts the room
+        pass
+
+def _insert_player(puzzle_id, display_name, now, may_create):
+    """
+    Insert a player unless the name is taken, returning it or None.
+
+    With may_create the player becomes creator when the puzzle has none; of
+    two first joins racing for it, the partial unique index on creators fails
+    the second one with an IntegrityError.
+    """
+    players = Player._meta.db_table
+    creator, creator_params = (
+        (f'NOT EXISTS (SELECT 1 FROM {players} WHERE puzzle_id = %s AND is_creator)', [puzzle_id])
+        if may_create else ('%s', [False])
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {players} (puzzle_id, display_name, joined_at, is_active, is_creator, points, version) '
+            f'SELECT %s, %s, %s, %s, {creator}, 0, 0 '
+            f'WHERE TRUE '
+            f'ON CONFLICT (puzzle_id, display_name) DO NOTHING '
+            f'RETURNING id, is_creator',
+            [puzzle_id, display_name, connection.ops.adapt_datetimefield_value(now), True, *creator_params]
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return Player(id=row[0], puzzle_id=puzzle_id, display_name=display_name, joined_at=now, is_creator=bool(row[1]))
+
+def _insert_player_fallback(puzzle_id, display_name, now, may_create):
+    """Portable join for databases without ON CONFLICT ... RETURNING"""
+    if Player.objects.filter(puzzle_id=puzzle_id, display_name=display_name).exists():
+        return None
+    return Player.objects.create(
+        puzzle_id=puzzle_id,
+        display_name=display_name,
+        is_creator=may_create and not Player.objects.filter(puzzle_id=puzzle_id, is_creator=True).exists()
+    )
+
+def _add_player(puzzle_id, display_name, now):
+    """Insert a player without touching the puzzle row, None when the name is taken"""
+    insert = _insert_player if supports_returning() else _insert_player_fallback
+    try:
+        with transaction.atomic():
+            return insert(puzzle_id, display_name, now, may_create=True)
+    except IntegrityError:
+        # Lost the creator seat to a concurrent first join, or the name in the fallback
+        pass
+    try:
+        with transaction.atomic():
+            return insert(puzzle_id, display_name, now, may_create=False)
+    except IntegrityError:
+        return None
+
+def _stamp_version(puzzle_id, player_id):
+    """Bump the puzzle version and set it on the new player, in one statement on PostgreSQL"""
+    if connection.vendor != 'postgresql':
+        version = CrosswordPuzzle.objects.bump_version(puzzle_id)
+        Player.objects.filter(pk=player_id).update(version=version)
+        return version
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH bumped AS (UPDATE {CrosswordPuzzle._meta.db_table} SET version = version + 1 WHERE id = %s RETURNING version) '
+            f'UPDATE {Player._meta.db_table} SET version = (SELECT version FROM bumped) WHERE id = %s '
+            f'RETURNING version',
+            [puzzle_id, player_id]
+        )
+        version = cursor.fetchone()[0]
+    publish_versions({puzzle_id: version})
+    return version
+
+def join(puzzle, display_name):
+    """
+    Add a player to a puzzle and return it.
+
+    The unique (puzzle, display_name) constraint decides name clashes and the
+    partial unique index on creators decides who creates the room, so joins
+    only queue on the puzzle row for the version bump that ends their
+    transaction. Raises ValidationError when the name is taken or the room
+    is full.
+    """
+    Player._meta.get_field('display_name').run_validators(display_name)
+
+    capacity = room_capacity()
+    if capacity is not None and not admit(puzzle.pk, capacity):
+        raise ValidationError(ROOM_FULL)
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            player = _add_player(puzzle.pk, display_name, now)
+            if player is None:
+                raise ValidationError(NAME_TAKEN)
+            # Last write on the puzzle row, which stays locked until commit to keep commits in version order
+            player.version = _stamp_version(puzzle.pk, player.pk)
+            events.emit(events.PlayerJoined(puzzle.pk, puzzle.code, player.id, player.display_name))
+
+            # Only set waiting room timer if the game is still waiting
+            if puzzle.status == 'waiting' and not puzzle.waiting_room_start_time:
+                puzzle.waiting_room_start_time = now
+                CrosswordPuzzle.objects.filter(pk=puzzle.pk, waiting_room_start_time__isnull=True).update(
+                    waiting_room_start_time=now
+                )
+                room_closes = now + timedelta(seconds=lifecycle.WAITING_ROOM_SECONDS)
+                transaction.on_commit(lambda: lifecycle.schedule(room_closes, puzzle.code))
+    except Exception:
+        if capacity is not None:
+            release(puzzle.pk)
+        raise
+    return player
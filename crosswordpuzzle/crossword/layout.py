@@ -0,0 +1,115 @@
+from django.core.exceptions import ValidationError
+import re
+
+WORD_PATTERN = re.compile(r'^[A-Za-z]+$')
+MAX_HINT_LENGTH = 500
+
+def word_cells(word, direction, start_row, start_col):
+    """Yield (row, col, letter) for every cell a placed word covers"""
+    for i, letter in enumerate(word):
+        if direction == 'across':
+            yield start_row, start_col + i, letter
+        else:
+            yield start_row + i, start_col, letter
+
+def _clean_word(index, rows, cols, data, max_length):
+    if not isinstance(data, dict):
+        raise ValidationError(f'Word {index + 1}: expected an object')
+    try:
+        word = str(data['word']).strip().upper()
+        hint = str(data['hint']).strip()
+        direction = data['direction']
+        start_row = int(data['startRow'])
+        start_col = int(data['startCol'])
+    except KeyError as e:
+        raise ValidationError(f'Word {index + 1}: missing field {e.args[0]}')
+    except (ValueError, TypeError):
+        raise ValidationError(f'Word {index + 1}: startRow and startCol must be integers')
+
+    if not WORD_PATTERN.match(word):
+        raise ValidationError(f'Word {index + 1}: word must contain only letters')
+    if len(word) > max_length:
+        raise ValidationError(f'Word {index + 1}: word is longer than {max_length} letters')
+    if not hint:
+        raise ValidationError(f'Word {index + 1}: hint is required')
+    if len(hint) > MAX_HINT_LENGTH:
+        raise ValidationError(f'Word {index + 1}: hint is longer than {MAX_HINT_LENGTH} characters')
+    if direction not in ('across', 'down'):
+        raise ValidationError(f'Word {index + 1}: direction must be across or down')
+
+    # Validate start position and extent are within puzzle bounds
+    if not (0 <= start_row < rows and 0 <= start_col < cols):
+        raise ValidationError(f'Word {index + 1}: starting position exceeds puzzle dimensions')
+    if direction == 'across' and start_col + len(word) > cols:
+        raise ValidationError(f'Word {index + 1}: word extends beyond puzzle width')
+    if direction == 'down' and start_row + len(word) > rows:
+        raise ValidationError(f'Word {index + 1}: word extends beyond puzzle height')
+
+    return {
+        'word': word,
+        'hint': hint,
+        'direction': direction,
+        'start_row': start_row,
+        'start_col': start_col,
+    }
+
+def validate_layout(rows, cols, words, max_length=50):
+    """
+    Validate a create_puzzle word list against the grid in memory.
+
+    Checks fields, bounds, duplicate answers and that crossing words agree on
+    shared letters. Returns the words as Word field dicts with upper-cased
+    answers, or raises ValidationError naming the offending word.
+    """
+    if not words:
+        raise ValidationError('At least one word is required')
+
+    cleaned = []
+    grid = {}
+    answers = set()
+    for index, data in enumerate(words):
+        word = _clean_word(index, rows, cols, data, max_length)
+
+        if word['word'] in answers:
+            raise ValidationError(f'Word {index + 1}: {word["word"]} appears more than once')
+        answers.add(word['word'])
+
+        for row, col, letter in word_cells(word['word'], word['direction'], word['start_row'], word['start_col']):
+            existing = grid.setdefault((row, col), letter)
+            if existing != letter:
+                raise ValidationError(
+                    f'Word {index + 1}: letter {letter} conflicts with {existing} at row {row}, column {col}'
+                )
+        cleaned.append(word)
+    return cleaned
+
+def clean_entries(words, max_words):
+    """
+    Validate a list of {'word', 'hint'} objects that have no position yet.
+
+    Returns them with upper-cased answers, or raises ValidationError naming
+    the offending word.
+    """
+    if not isinstance(words, list) or not words:
+        raise ValidationError('At least one word is required')
+    if len(words) > max_words:
+        raise ValidationError(f'At most {max_words} words can be used at once')
+
+    entries = []
+    seen = set()
+    for index, data in enumerate(words):
+        if not isinstance(data, dict):
+            raise ValidationError(f'Word {index + 1}: expected an object')
+        word = str(data.get('word', '')).strip().upper()
+        hint = str(data.get('hint', '')).strip()
+        if not WORD_PATTERN.match(word):
+            raise ValidationError(f'Word {index + 1}: word must contain only letters')
+        if not hint:
+            raise ValidationError(f'Word {index + 1}: hint is required')
+        if len(hint) > MAX_HINT_LENGTH:
+            raise ValidationError(f'Word {index + 1}: hint is longer than {MAX_HINT_LENGTH} characters')
+        if word in seen:
+            raise ValidationError(f'Word {index + 1}: {word} appears more than once')
+        seen.add(word)
+        entries.append({'word': word, 'hint': hint})
+    return entries
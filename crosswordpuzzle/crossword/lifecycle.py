@@ -0,0 +1,172 @@
+from datetime import timedelta
+from django.db import close_old_connections, transaction
+from django.db.models import DateTimeField, DurationField, Exists, ExpressionWrapper, F, OuterRef
+from django.utils import timezone
+from .models import CrosswordPuzzle, Player, publish_versions
+from . import events
+import heapq
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds a waiting room stays open before the game starts by itself
+WAITING_ROOM_SECONDS = 50
+# Deadlines are reloaded from the database this often to see puzzles changed by other processes
+REFRESH_INTERVAL = 5
+
+def ends_at(start='start_time', duration='duration'):
+    """Database expression for a start time plus a duration in minutes, by default when a game runs out of time"""
+    minutes = ExpressionWrapper(F(duration) * timedelta(minutes=1), output_field=DurationField())
+    return ExpressionWrapper(F(start) + minutes, output_field=DateTimeField())
+
+def _transition(due, **changes):
+    """
+    Apply changes to every due puzzle with one UPDATE.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED where supported so
+    concurrent schedulers never transition the same puzzle twice. Returns the
+    changed puzzles as dicts.
+    """
+    with transaction.atomic():
+        ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True))
+        if not ids:
+            return []
+        due.filter(id__in=ids).update(version=F('version') + 1, **changes)
+        changed = list(CrosswordPuzzle.objects.filter(id__in=ids).values('id', 'code', 'version', 'start_time', 'duration'))
+        publish_versions({puzzle['id']: puzzle['version'] for puzzle in changed})
+    return changed
+
+def occupied_waiting_rooms():
+    """Waiting puzzles with a running waiting room clock and someone still in them"""
+    return CrosswordPuzzle.objects.filter(
+        Exists(Player.objects.filter(puzzle=OuterRef('pk'), is_active=True)),
+        status='waiting',
+        waiting_room_start_time__isnull=False
+    )
+
+def start_due_games(now=None):
+    """Start every game whose waiting room has been open long enough"""
+    now = now or timezone.now()
+    due = occupied_waiting_rooms().filter(
+        waiting_room_start_time__lte=now - timedelta(seconds=WAITING_ROOM_SECONDS)
+    )
+    with transaction.atomic():
+        started = _transition(due, status='in_progress', start_time=now)
+        for puzzle in started:
+            events.emit(events.GameStarted(puzzle['id'], puzzle['code'], now, puzzle['duration']))
+    if started:
+        logger.info(f"Started {len(started)} games")
+    return started
+
+def end_games(due):
+    """End every running game in a queryset with one UPDATE"""
+    # start_time is cleared and the puzzle retired like CrosswordPuzzle.end_game does
+    with transaction.atomic():
+        ended = _transition(due.filter(status='in_progress'), status='completed', start_time=None, is_active=False)
+        for puzzle in ended:
+            events.emit(events.GameEnded(puzzle['id'], puzzle['code']))
+    return ended
+
+def end_expired_games(now=None):
+    """End every running game that has used up its duration"""
+    now = now or timezone.now()
+    ended = end_games(CrosswordPuzzle.objects.alias(ends_at=ends_at()).filter(ends_at__lte=now))
+    if ended:
+        logger.info(f"Ended {len(ended)} expired games")
+    return ended
+
+class LifecycleScheduler:
+    """
+    Min-heap of upcoming start and end deadlines.
+
+    The heap decides when to wake up; the transitions themselves are
+    set-based sweeps, so a deadline missed by one scheduler is picked up by
+    the next sweep of any other.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._heap = []
+        self._next_refresh = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def schedule(self, deadline, code):
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, code))
+        self._wake.set()
+
+    def load(self, now):
+        """Replace the heap with the deadlines of every waiting and running game"""
+        waiting = occupied_waiting_rooms().values_list('waiting_room_start_time', 'code')
+        running = CrosswordPuzzle.objects.filter(
+            status='in_progress', start_time__isnull=False
+        ).annotate(ends_at=ends_at()).values_list('ends_at', 'code')
+
+        heap = [(room_start + timedelta(seconds=WAITING_ROOM_SECONDS), code) for room_start, code in waiting]
+        heap.extend(running)
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+        self._next_refresh = now + timedelta(seconds=self.refresh_interval)
+
+    def run_pending(self, now=None):
+        """Apply the transitions that are due; returns (started, ended) counts"""
+        now = now or timezone.now()
+        if self._next_refresh is None or now >= self._next_refresh:
+            self.load(now)
+
+        with self._lock:
+            if not self._heap or self._heap[0][0] > now:
+                return 0, 0
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+
+        started = start_due_games(now)
+        ended = end_expired_games(now)
+        for puzzle in started:
+            self.schedule(now + timedelta(minutes=puzzle['duration']), puzzle['code'])
+        return len(started), len(ended)
+
+    def seconds_until_next(self, now=None):
+        now = now or timezone.now()
+        wake = self._next_refresh or now
+        with self._lock:
+            if self._heap:
+                wake = min(wake, self._heap[0][0])
+        return max((wake - now).total_seconds(), 0)
+
+    def run_forever(self, stop_event):
+        while not stop_event.is_set():
+            close_old_connections()
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Error applying game transitions: {str(e)}", exc_info=True)
+            self._wake.wait(self.seconds_until_next())
+            self._wake.clear()
+
+_scheduler = None
+_thread = None
+_thread_lock = threading.Lock()
+
+def schedule(deadline, code):
+    """Wake this process's scheduler thread for a deadline it cannot know about yet"""
+    if _scheduler is not None:
+        _scheduler.schedule(deadline, code)
+
+def start_background_thread():
+    """Run a scheduler in a daemon thread of this process, once"""
+    global _scheduler, _thread
+    with _thread_lock:
+        if _thread is None:
+            _scheduler = LifecycleScheduler()
+            _thread = threading.Thread(
+                target=_scheduler.run_forever,
+                args=(threading.Event(),),
+                name='crossword-lifecycle',
+                daemon=True
+            )
+            _thread.start()
+    return _thread
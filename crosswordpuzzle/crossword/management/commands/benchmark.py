@@ -0,0 +1,216 @@
+from collections import defaultdict
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from crossword import archive
+from crossword.lifecycle import end_games
+from crossword.models import CrosswordPuzzle
+import json
+import math
+import random
+import string
+import subprocess
+import sys
+import time
+
+# game.js polls every second during play and the player list at the slow, five second cadence
+PLAYERS_POLL_EVERY = 5
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+class Recorder:
+    """Latency, query count and status samples per endpoint"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def call(self, endpoint, method, *args, **kwargs):
+        # Reads may be routed to replicas, so queries are counted on every database
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            started = time.perf_counter()
+            response = method(*args, **kwargs)
+            elapsed = time.perf_counter() - started
+        queries = sum(len(queries) for queries in captured)
+        self.samples[endpoint].append((elapsed * 1000, queries, response.status_code))
+        return response
+
+    def report(self, seconds):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(sample[0] for sample in samples)
+            queries = [sample[1] for sample in samples]
+            statuses = defaultdict(int)
+            for sample in samples:
+                statuses[str(sample[2])] += 1
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'latency_ms': {
+                    'p50': round(percentile(latencies, 50), 3),
+                    'p95': round(percentile(latencies, 95), 3),
+                    'p99': round(percentile(latencies, 99), 3),
+                    'mean': round(sum(latencies) / len(latencies), 3),
+                    'max': round(latencies[-1], 3),
+                },
+                'queries': {
+                    'mean': round(sum(queries) / len(queries), 2),
+                    'max': max(queries),
+                },
+                'statuses': dict(statuses),
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        return {
+            'endpoints': endpoints,
+            'total': {
+                'requests': total,
+                'seconds': round(seconds, 3),
+                'throughput_rps': round(total / seconds, 2) if seconds else None,
+            },
+        }
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _puzzle_words(rng, count, length):
+    """One across word per row, so the layout is always valid"""
+    return [
+        {
+            'word': ''.join(rng.choice(string.ascii_uppercase) for _ in range(length)),
+            'hint': f'Benchmark word {row + 1}',
+            'direction': 'across',
+            'startRow': row,
+            'startCol': 0,
+        }
+        for row in range(count)
+    ]
+
+class Command(BaseCommand):
+    help = 'Simulate rooms of players against the game API in process and report latency and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=2)
+        parser.add_argument('--players', type=int, default=20, help='Players per room')
+        parser.add_argument('--words', type=int, default=20, help='Words per puzzle, at most 50')
+        parser.add_argument('--ticks', type=int, default=30, help='Seconds of play to simulate, one poll per player each')
+        parser.add_argument('--guess-rate', type=float, default=0.2, help='Chance a player guesses in a tick')
+        parser.add_argument('--wrong-ratio', type=float, default=0.7, help='Share of guesses that are wrong')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark puzzles instead of deleting them')
+        parser.add_argument(
+            '--allow-database', action='store_true',
+            help='Run against the configured database, which should be a scratch copy; without it the command only runs under the test runner'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        recorder = Recorder()
+        words_per_puzzle = max(1, min(options['words'], 50))
+        puzzle_codes = []
+
+        try:
+            # The test client needs the test environment, already in place when run from a test
+            setup_test_environment()
+            own_environment = True
+        except RuntimeError:
+            own_environment = False
+        if own_environment and not options['allow_database']:
+            teardown_test_environment()
+            raise CommandError(
+                f"Refusing to write benchmark rooms to database {connection.settings_dict['NAME']!r}; "
+                "point the settings at a scratch database and pass --allow-database"
+            )
+        started = time.perf_counter()
+        try:
+            rooms = []
+            for room in range(options['rooms']):
+                words = _puzzle_words(rng, words_per_puzzle, 8)
+                creator = Client(REMOTE_ADDR=f'10.{room // 256}.{room % 256}.1')
+                response = recorder.call(
+                    'create_puzzle', creator.post, reverse('create_puzzle'),
+                    data=json.dumps({'rows': 50, 'cols': 50, 'duration': 30, 'words': words}),
+                    content_type='application/json'
+                )
+                code = response.json()['code']
+                puzzle_codes.append(code)
+                rooms.append({'code': code, 'words': [w['word'] for w in words], 'clients': [], 'versions': {}})
+
+            # Join storm: every player of every room arrives at once
+            for room_number, room in enumerate(rooms):
+                for i in range(options['players']):
+                    client = Client(REMOTE_ADDR=f'10.{room_number // 256}.{room_number % 256}.{i % 250 + 2}')
+                    recorder.call(
+                        'join_puzzle', client.post, reverse('join_puzzle'),
+                        data=json.dumps({'code': room['code'], 'display_name': f'Player {i}'}),
+                        content_type='application/json'
+                    )
+                    room['clients'].append(client)
+                recorder.call('start_game', room['clients'][0].post, reverse('start_game', args=[room['code']]))
+
+            for tick in range(options['ticks']):
+                for room in rooms:
+                    for i, client in enumerate(room['clients']):
+                        url = reverse('get_puzzle', args=[room['code']])
+                        since = room['versions'].get(i)
+                        response = recorder.call(
+                            'get_puzzle', client.get, url if since is None else f'{url}?since={since}'
+                        )
+                        if response.status_code == 200:
+                            room['versions'][i] = response.json()['version']
+
+                        if tick % PLAYERS_POLL_EVERY == 0:
+                            recorder.call('get_players', client.get, reverse('get_players', args=[room['code']]))
+
+                        if rng.random() < options['guess_rate']:
+                            if rng.random() < options['wrong_ratio']:
+                                guess = ''.join(rng.choice(string.ascii_uppercase) for _ in range(8))
+                            else:
+                                guess = rng.choice(room['words'])
+                            recorder.call(
+                                'submit_word', client.post, reverse('submit_word', args=[room['code']]),
+                                data=json.dumps({'word': guess}), content_type='application/json'
+                            )
+
+            end_games(CrosswordPuzzle.objects.filter(code__in=puzzle_codes))
+            for room in rooms:
+                for client in room['clients']:
+                    recorder.call('leaderboard', client.get, reverse('leaderboard', args=[room['code']]))
+        finally:
+            seconds = time.perf_counter() - started
+            if own_environment:
+                teardown_test_environment()
+            if not options['keep']:
+                archive.delete_puzzles(list(CrosswordPuzzle.objects.filter(code__in=puzzle_codes).values_list('id', flat=True)))
+
+        report = recorder.report(seconds)
+        report['meta'] = {
+            'commit': _git_commit(),
+            'finished_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': sys.version.split()[0],
+            'options': {
+                name: options[name]
+                for name in ('rooms', 'players', 'words', 'ticks', 'guess_rate', 'wrong_ratio', 'seed')
+            },
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"Wrote benchmark report to {options['output']}")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from crossword.lifecycle import LifecycleScheduler
+import threading
+
+class Command(BaseCommand):
+    help = 'Start waiting games and end expired ones as their deadlines pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Apply due transitions once and exit')
+
+    def handle(self, *args, **options):
+        scheduler = LifecycleScheduler()
+        if options['once']:
+            started, ended = scheduler.run_pending()
+            self.stdout.write(f'Started {started} games, ended {ended} games')
+            return
+
+        stop = threading.Event()
+        try:
+            scheduler.run_forever(stop)
+        except KeyboardInterrupt:
+            stop.set()
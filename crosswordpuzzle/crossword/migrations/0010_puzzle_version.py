@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossword', '0009_auto_20250827_1347'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crosswordpuzzle',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solvedword',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['puzzle', 'version'], name='player_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solvedword',
+            index=models.Index(fields=['puzzle', 'version'], name='solvedword_version_idx'),
+        ),
+    ]
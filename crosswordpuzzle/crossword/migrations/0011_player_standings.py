@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:14
+
+from django.db import migrations, models
+from django.db.models import Exists, Max, OuterRef, Subquery
+
+
+def backfill_last_solve(apps, schema_editor):
+    """Derive the last solve time of existing players from their solved words"""
+    Player = apps.get_model('crossword', 'Player')
+    SolvedWord = apps.get_model('crossword', 'SolvedWord')
+    solves = SolvedWord.objects.filter(solved_by=OuterRef('pk'))
+    last_solve = solves.order_by().values('solved_by').annotate(last=Max('solved_at')).values('last')
+    Player.objects.filter(Exists(solves)).update(last_solve_at=Subquery(last_solve))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossword', '0010_puzzle_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='last_solve_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['puzzle', '-points', 'last_solve_at'], name='player_standings_idx'),
+        ),
+        migrations.RunPython(backfill_last_solve, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossword', '0011_player_standings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuzzleArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=8, unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('format', models.PositiveSmallIntegerField(default=1)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+    ]
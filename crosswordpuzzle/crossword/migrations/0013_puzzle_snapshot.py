@@ -0,0 +1,58 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:35
+
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+import gzip
+import hashlib
+import json
+
+# Frozen copy of the format 1 snapshot layout, later formats must not change it
+FORMAT_VERSION = 1
+WORD_FIELDS = ('word', 'hint', 'direction', 'start_row', 'start_col')
+
+
+def compile_snapshot(rows, cols, words):
+    document = {
+        'format': FORMAT_VERSION,
+        'rows': rows,
+        'cols': cols,
+        'words': [{field: word[field] for field in WORD_FIELDS} for word in words],
+    }
+    body = json.dumps(document, separators=(',', ':')).encode()
+    return hashlib.sha256(body).hexdigest()[:32], gzip.compress(body, mtime=0)
+
+
+def compile_existing(apps, schema_editor):
+    """Compile the snapshot of every puzzle created before snapshots existed"""
+    CrosswordPuzzle = apps.get_model('crossword', 'CrosswordPuzzle')
+    PuzzleSnapshot = apps.get_model('crossword', 'PuzzleSnapshot')
+    Word = apps.get_model('crossword', 'Word')
+    words = defaultdict(list)
+    for word in Word.objects.order_by('puzzle_id', 'id').values('puzzle_id', *WORD_FIELDS).iterator():
+        words[word['puzzle_id']].append(word)
+    snapshots = []
+    for puzzle in CrosswordPuzzle.objects.values('id', 'rows', 'cols').iterator():
+        etag, data = compile_snapshot(puzzle['rows'], puzzle['cols'], words[puzzle['id']])
+        snapshots.append(PuzzleSnapshot(puzzle_id=puzzle['id'], format=FORMAT_VERSION, etag=etag, data=data))
+    PuzzleSnapshot.objects.bulk_create(snapshots, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossword', '0012_puzzle_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuzzleSnapshot',
+            fields=[
+                ('puzzle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='crossword.crosswordpuzzle')),
+                ('format', models.PositiveSmallIntegerField(default=1)),
+                ('etag', models.CharField(max_length=32)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.RunPython(compile_existing, migrations.RunPython.noop),
+    ]
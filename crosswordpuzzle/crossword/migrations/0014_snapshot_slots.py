@@ -0,0 +1,60 @@
+from collections import defaultdict
+from django.db import migrations
+import gzip
+import hashlib
+import json
+
+# Frozen copy of the format 2 snapshot layout, later formats must not change it
+FORMAT_VERSION = 2
+WORD_FIELDS = ('id', 'word', 'hint', 'direction', 'start_row', 'start_col')
+
+
+def compile_snapshot(rows, cols, words):
+    starts = sorted({(word['start_row'], word['start_col']) for word in words})
+    numbers = {start: number for number, start in enumerate(starts, 1)}
+    document = {
+        'format': FORMAT_VERSION,
+        'rows': rows,
+        'cols': cols,
+        'slots': [
+            {
+                'id': word['id'],
+                'number': numbers[(word['start_row'], word['start_col'])],
+                'direction': word['direction'],
+                'start_row': word['start_row'],
+                'start_col': word['start_col'],
+                'length': len(word['word']),
+                'hint': word['hint'],
+            }
+            for word in words
+        ],
+    }
+    body = json.dumps(document, separators=(',', ':')).encode()
+    return hashlib.sha256(body).hexdigest()[:32], gzip.compress(body, mtime=0)
+
+
+def recompile_snapshots(apps, schema_editor):
+    """Replace snapshots that include answers with slot only ones"""
+    CrosswordPuzzle = apps.get_model('crossword', 'CrosswordPuzzle')
+    PuzzleSnapshot = apps.get_model('crossword', 'PuzzleSnapshot')
+    Word = apps.get_model('crossword', 'Word')
+    words = defaultdict(list)
+    for word in Word.objects.order_by('puzzle_id', 'id').values('puzzle_id', *WORD_FIELDS).iterator():
+        words[word['puzzle_id']].append(word)
+    snapshots = []
+    for puzzle in CrosswordPuzzle.objects.values('id', 'rows', 'cols').iterator():
+        etag, data = compile_snapshot(puzzle['rows'], puzzle['cols'], words[puzzle['id']])
+        snapshots.append(PuzzleSnapshot(puzzle_id=puzzle['id'], format=FORMAT_VERSION, etag=etag, data=data))
+    PuzzleSnapshot.objects.all().delete()
+    PuzzleSnapshot.objects.bulk_create(snapshots, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossword', '0013_puzzle_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompile_snapshots, migrations.RunPython.noop),
+    ]
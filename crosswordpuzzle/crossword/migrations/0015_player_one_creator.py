@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:05
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def keep_first_creator(apps, schema_editor):
+    """Only the earliest of several creators of a puzzle, left by racing joins, stays creator"""
+    Player = apps.get_model('crossword', 'Player')
+    earlier = Player.objects.filter(puzzle_id=OuterRef('puzzle_id'), is_creator=True, id__lt=OuterRef('id'))
+    Player.objects.filter(is_creator=True).filter(Exists(earlier)).update(is_creator=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossword', '0014_snapshot_slots'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_first_creator, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='player',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_creator', True)), fields=('puzzle',), name='player_one_creator'),
+        ),
+    ]
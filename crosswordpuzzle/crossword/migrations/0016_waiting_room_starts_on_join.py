@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:16
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def stop_empty_waiting_rooms(apps, schema_editor):
+    """Waiting rooms nobody is in lose the clock they were given at creation"""
+    CrosswordPuzzle = apps.get_model('crossword', 'CrosswordPuzzle')
+    Player = apps.get_model('crossword', 'Player')
+    occupied = Player.objects.filter(puzzle_id=OuterRef('pk'), is_active=True)
+    CrosswordPuzzle.objects.filter(status='waiting').exclude(Exists(occupied)).update(waiting_room_start_time=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossword', '0015_player_one_creator'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='crosswordpuzzle',
+            name='waiting_room_start_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(stop_empty_waiting_rooms, migrations.RunPython.noop),
+    ]
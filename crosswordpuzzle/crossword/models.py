@@ -1,12 +1,35 @@
-from django.db import models
+from django.db import models, transaction, connection
+from django.db.models import F
+from django.core.cache import cache
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
 import uuid
 from django.utils import timezone
 import re
+from . import events
 
 def generate_code():
-    return str(uuid.uuid4())[:8]
+    """A random puzzle code, never one of an archived puzzle"""
+    # Live codes are checked by the unique constraint when the puzzle is validated
+    while True:
+        code = str(uuid.uuid4())[:8]
+        if not PuzzleArchive.objects.filter(code=code).exists():
+            return code
+
+# How long the shared copy of a puzzle's version counter is kept
+PUZZLE_VERSION_TIMEOUT = 3 * 60 * 60
+
+def puzzle_version_key(puzzle_id):
+    return f'puzzle_version_{puzzle_id}'
+
+def publish_versions(versions):
+    """Share {puzzle_id: version} with other processes once the transaction commits"""
+    keys = {puzzle_version_key(puzzle_id): version for puzzle_id, version in versions.items()}
+    transaction.on_commit(lambda: cache.set_many(keys, PUZZLE_VERSION_TIMEOUT))
+
+def supports_returning():
+    """Whether the database can write and read back rows with INSERT/UPDATE ... RETURNING"""
+    return connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert
 
 class CrosswordPuzzleManager(models.Manager):
     def active_puzzles(self):
@@ -15,6 +38,40 @@ class CrosswordPuzzleManager(models.Manager):
     def get_by_code(self, code):
         return self.get(code=code, is_active=True)
         
+    def bump_version(self, puzzle_id):
+        """
+        Atomically advance a puzzle's change counter and return the new value.
+
+        The committed value is also published to the cache so process-local
+        views of the puzzle can tell they are behind without a query.
+        """
+        if supports_returning():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {self.model._meta.db_table} SET version = version + 1 WHERE id = %s RETURNING version',
+                    [puzzle_id]
+                )
+                version = cursor.fetchone()[0]
+        else:
+            self.filter(pk=puzzle_id).update(version=F('version') + 1)
+            version = self.filter(pk=puzzle_id).values_list('version', flat=True).get()
+        publish_versions({puzzle_id: version})
+        return version
+
+    def create_with_words(self, rows, cols, duration, words):
+        """Create a puzzle, all of its words in a single bulk insert and its snapshot in one transaction"""
+        from .layout import validate_layout
+
+        from . import snapshots
+
+        cleaned = validate_layout(rows, cols, words, max_length=Word.MAX_WORD_LENGTH)
+        with transaction.atomic():
+            puzzle = self.create(rows=rows, cols=cols, duration=duration, status='waiting')
+            created = Word.objects.bulk_create([Word(puzzle=puzzle, **word) for word in cleaned])
+            snapshots.create(puzzle, created)
+            events.emit(events.PuzzleCreated(puzzle.pk, puzzle.code))
+        return puzzle
+
     def cleanup_old_puzzles(self, days=7):
         cutoff_date = timezone.now() - timezone.timedelta(days=days)
         self.filter(created_at__lt=cutoff_date, status='completed').update(is_active=False)
@@ -50,7 +107,10 @@ class CrosswordPuzzle(models.Model):
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
     start_time = models.DateTimeField(null=True, blank=True)
-    waiting_room_start_time = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    # Set by the first player to join, the waiting room closes WAITING_ROOM_SECONDS later
+    waiting_room_start_time = models.DateTimeField(null=True, blank=True)
+    # Bumped on every state change so clients can ask for changes since a version
+    version = models.PositiveIntegerField(default=0)
 
     objects = CrosswordPuzzleManager()
 
@@ -65,8 +125,6 @@ class CrosswordPuzzle(models.Model):
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        if not self.waiting_room_start_time:
-            self.waiting_room_start_time = timezone.now()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -77,14 +135,20 @@ class CrosswordPuzzle(models.Model):
             raise ValidationError('Game can only be started from waiting status')
         self.status = 'in_progress'
         self.start_time = timezone.now()
+        self.version = CrosswordPuzzle.objects.bump_version(self.pk)
         self.save()
+        events.emit(events.GameStarted(self.pk, self.code, self.start_time, self.duration))
 
     def end_game(self):
         if self.status != 'in_progress':
             raise ValidationError('Only in-progress games can be ended')
         self.status = 'completed'
         self.start_time = None  # Clear start_time to pass validation
+        # Retired but kept for the leaderboard until it is archived
+        self.is_active = False
+        self.version = CrosswordPuzzle.objects.bump_version(self.pk)
         self.save()
+        events.emit(events.GameEnded(self.pk, self.code))
 
     @property
     def time_remaining(self):
@@ -158,12 +222,15 @@ class Word(models.Model):
     def __str__(self):
         return f"{self.word} ({self.direction})"
 
+# Most points first; ties go to whoever reached their score earlier
+STANDINGS_ORDER = ('-points', F('last_solve_at').asc(nulls_last=True), 'joined_at')
+
 class PlayerManager(models.Manager):
     def active_players(self, puzzle):
         return self.filter(puzzle=puzzle, is_active=True)
 
     def top_players(self, puzzle, limit=10):
-        return self.filter(puzzle=puzzle).order_by('-points')[:limit]
+        return self.filter(puzzle=puzzle).order_by(*STANDINGS_ORDER)[:limit]
 
 class Player(models.Model):
     puzzle = models.ForeignKey(CrosswordPuzzle, on_delete=models.CASCADE, related_name='players')
@@ -180,6 +247,10 @@ class Player(models.Model):
     is_active = models.BooleanField(default=True)
     is_creator = models.BooleanField(default=False)
     points = models.IntegerField(default=0)
+    # Puzzle version at which this player last changed
+    version = models.PositiveIntegerField(default=0)
+    # When the player last scored, kept alongside points as the materialized standings
+    last_solve_at = models.DateTimeField(null=True, blank=True)
     correct_words = models.ManyToManyField(Word, blank=True, related_name='solved_by')
 
     objects = PlayerManager()
@@ -190,6 +261,12 @@ class Player(models.Model):
             models.Index(fields=['puzzle', 'is_active', '-points', 'joined_at'], name='player_leaderboard_idx'),
             models.Index(fields=['puzzle', 'is_active'], name='player_active_idx'),
             models.Index(fields=['-points'], name='player_points_idx'),
+            models.Index(fields=['puzzle', 'version'], name='player_version_idx'),
+            models.Index(fields=['puzzle', '-points', 'last_solve_at'], name='player_standings_idx'),
+        ]
+        constraints = [
+            # Concurrent first joins race for the creator seat on this index, not on the puzzle row
+            models.UniqueConstraint(fields=['puzzle'], condition=models.Q(is_creator=True), name='player_one_creator'),
         ]
 
     def __str__(self):
@@ -201,18 +278,42 @@ class Player(models.Model):
         self.points += points
         self.save()
 
-    def mark_word_correct(self, word):
-        """Mark a word as correctly guessed by this player"""
-        if word.puzzle_id != self.puzzle_id:
-            raise ValidationError('Word does not belong to this puzzle')
-        self.correct_words.add(word)
-        self.add_points(1)
-
 class SolvedWord(models.Model):
     puzzle = models.ForeignKey(CrosswordPuzzle, on_delete=models.CASCADE, related_name='solved_words')
     word = models.ForeignKey(Word, on_delete=models.CASCADE)
     solved_by = models.ForeignKey(Player, on_delete=models.SET_NULL, null=True, blank=True)
     solved_at = models.DateTimeField(auto_now_add=True)
+    # Puzzle version at which the word was solved
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('puzzle', 'word')
+        indexes = [
+            models.Index(fields=['puzzle', 'version'], name='solvedword_version_idx'),
+        ]
+
+class PuzzleArchive(models.Model):
+    """A completed puzzle folded into one compressed record after its rows are removed"""
+    code = models.CharField(max_length=8, unique=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    # Layout version of data, see archive.FORMAT_VERSION
+    format = models.PositiveSmallIntegerField(default=1)
+    # zlib compressed JSON with the words, final standings and solve timeline
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f"Archived puzzle {self.code}"
+
+class PuzzleSnapshot(models.Model):
+    """The immutable part of a puzzle, size and words, compiled once when it is created"""
+    puzzle = models.OneToOneField(CrosswordPuzzle, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    # Layout version of data, see snapshots.FORMAT_VERSION
+    format = models.PositiveSmallIntegerField(default=1)
+    # Strong validator of data, also part of the snapshot URL
+    etag = models.CharField(max_length=32)
+    # gzip compressed JSON, served as is to clients accepting gzip
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f"Snapshot of puzzle {self.puzzle_id}"
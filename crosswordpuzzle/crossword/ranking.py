@@ -0,0 +1,177 @@
+from asgiref.sync import sync_to_async
+from bisect import bisect_left, insort
+from django.core.cache import cache
+from .answers import _LocalIndexes
+from .models import CrosswordPuzzle, Player, PUZZLE_VERSION_TIMEOUT, puzzle_version_key
+from . import encoding, routers
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+LOCAL_RANKING_SIZE = 256
+# Distinct ?limit= values whose encoded top list an index keeps
+ENCODED_LIMITS = 8
+# Fields of a ranked player that are returned to clients
+PUBLIC_FIELDS = ('id', 'display_name', 'points', 'is_creator', 'joined_at')
+
+def _timestamp(value):
+    # Players without a solve sort after everyone on the same points, like NULLS LAST
+    return value.timestamp() if value is not None else float('inf')
+
+def _sort_key(player):
+    """Same order as models.STANDINGS_ORDER, with the id making every key unique"""
+    return (-player['points'], _timestamp(player['last_solve_at']), player['joined_at'].timestamp(), player['id'])
+
+class RankIndex:
+    """
+    Active players of one puzzle kept sorted by standing.
+
+    Top N, rank and neighbourhood lookups are bisections and slices of the
+    sorted key list. version is the puzzle version the index reflects.
+    """
+
+    def __init__(self, puzzle_id, version, players=()):
+        self.puzzle_id = puzzle_id
+        self.version = version
+        self.built_at = time.time()
+        self._players = {player['id']: dict(player) for player in players}
+        self._keys = sorted(_sort_key(player) for player in self._players.values())
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _public(self, key, rank):
+        player = self._players[key[-1]]
+        result = {field: player[field] for field in PUBLIC_FIELDS}
+        result['rank'] = rank
+        return result
+
+    def _remove(self, player_id):
+        player = self._players.pop(player_id, None)
+        if player is not None:
+            del self._keys[bisect_left(self._keys, _sort_key(player))]
+
+    def apply(self, version, player_id, **fields):
+        """
+        Move a player to its new standing, or drop it when is_active is False.
+
+        Only the change directly following self.version can be applied; returns
+        False when a change was missed or the player is unknown, and the index
+        must then be rebuilt.
+        """
+        with self._lock:
+            if version != self.version + 1:
+                return False
+            player = {**self._players.get(player_id, {}), **fields, 'id': player_id}
+            if not player.get('is_active', True):
+                self._remove(player_id)
+            elif any(field not in player for field in ('points', 'last_solve_at', 'joined_at')):
+                return False
+            else:
+                self._remove(player_id)
+                self._players[player_id] = player
+                insort(self._keys, _sort_key(player))
+            self.version = version
+            self._encoded.clear()
+            return True
+
+    def top(self, limit=None):
+        with self._lock:
+            keys = self._keys if limit is None else self._keys[:limit]
+            return [self._public(key, rank) for rank, key in enumerate(keys, 1)]
+
+    def encoded_top(self, limit=None):
+        """top(limit) with the player count and version as a pre-encoded document, reused until the standings change"""
+        with self._lock:
+            encoded = self._encoded.get(limit)
+            if encoded is None:
+                keys = self._keys if limit is None else self._keys[:limit]
+                encoded = encoding.encode({
+                    'players': [self._public(key, rank) for rank, key in enumerate(keys, 1)],
+                    'total_players': len(self._keys),
+                    'version': self.version,
+                })
+                if len(self._encoded) >= ENCODED_LIMITS:
+                    self._encoded.clear()
+                self._encoded[limit] = encoded
+            return encoded
+
+    def rank(self, player_id):
+        """1-based position of a player, or None when it is not ranked"""
+        with self._lock:
+            player = self._players.get(player_id)
+            if player is None:
+                return None
+            return bisect_left(self._keys, _sort_key(player)) + 1
+
+    def around(self, player_id, radius=5):
+        """The player and up to radius players ranked directly above and below"""
+        with self._lock:
+            player = self._players.get(player_id)
+            if player is None:
+                return []
+            position = bisect_left(self._keys, _sort_key(player))
+            start = max(position - radius, 0)
+            keys = self._keys[start:position + radius + 1]
+            return [self._public(key, rank) for rank, key in enumerate(keys, start + 1)]
+
+_local = _LocalIndexes(LOCAL_RANKING_SIZE)
+
+def player_row(player):
+    """Ranking fields of a Player instance"""
+    return {
+        'id': player.id,
+        'display_name': player.display_name,
+        'points': player.points,
+        'is_creator': player.is_creator,
+        'is_active': player.is_active,
+        'joined_at': player.joined_at,
+        'last_solve_at': player.last_solve_at,
+    }
+
+def build_index(code):
+    """Load a puzzle's active players from the materialized standings"""
+    puzzle = CrosswordPuzzle.objects.filter(code=code).values('id', 'version').first()
+    if not puzzle:
+        return None
+    if routers.replica_behind(puzzle['version'], cache.get(puzzle_version_key(puzzle['id']))):
+        # Never keep an index older than a version already committed
+        with routers.use_primary():
+            return build_index(code)
+    players = Player.objects.filter(puzzle_id=puzzle['id'], is_active=True).values(
+        'id', 'display_name', 'points', 'is_creator', 'joined_at', 'last_solve_at'
+    )
+    index = RankIndex(puzzle['id'], puzzle['version'], players)
+    _local.set(code, index)
+    logger.info(f"Built rank index for puzzle {code} with {len(index)} players")
+    return index
+
+def _current(index, shared):
+    return shared is None or shared <= index.version
+
+def _usable(index):
+    return index is not None and time.time() - index.built_at < PUZZLE_VERSION_TIMEOUT
+
+def get_index(code):
+    """Rank index for a puzzle, rebuilt when the shared puzzle version shows it is behind"""
+    index = _local.get(code)
+    if _usable(index) and _current(index, cache.get(puzzle_version_key(index.puzzle_id))):
+        return index
+    return build_index(code)
+
+async def aget_index(code):
+    """get_index for async views"""
+    index = _local.get(code)
+    if _usable(index) and _current(index, await cache.aget(puzzle_version_key(index.puzzle_id))):
+        return index
+    return await sync_to_async(build_index)(code)
+
+def record(code, version, player_id, **fields):
+    """Apply a committed player change to this process's index, dropping it if that is not possible"""
+    index = _local.get(code)
+    if index is not None and not index.apply(version, player_id, **fields):
+        _local.pop(code)
@@ -0,0 +1,203 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from functools import wraps
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A client below this share of its limit is counted in process memory only
+LOCAL_THRESHOLD = 0.5
+# Unsynced local hits are pushed to the shared store at least this often
+SYNC_EVERY = 5
+LOCAL_STATE_SIZE = 10000
+
+class CacheStorage:
+    """Window counters kept in a Django cache, incremented atomically with add/incr"""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def incr(self, key, delta, timeout):
+        if self.cache.add(key, delta, timeout):
+            return delta
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            # Expired between add and incr
+            self.cache.set(key, delta, timeout)
+            return delta
+
+    def get(self, key):
+        return self.cache.get(key, 0)
+
+class MemoryStorage:
+    """Process-local counters for single-process deployments and tests"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key, delta, timeout):
+        now = time.time()
+        with self._lock:
+            value, expires = self._counts.get(key, (0, 0))
+            if expires <= now:
+                value, expires = 0, now + timeout
+            value += delta
+            self._counts[key] = (value, expires)
+            return value
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._counts.get(key, (0, 0))
+            return value if expires > time.time() else 0
+
+class _LocalWindow:
+    __slots__ = ('window', 'previous', 'shared', 'pending')
+
+    def __init__(self, window):
+        self.window = window
+        self.previous = None
+        self.shared = 0
+        self.pending = 0
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter: the current fixed window plus the previous one,
+    weighted by how much of it still overlaps the sliding window.
+
+    Clients well under their limit are counted locally and synced to the
+    shared store every SYNC_EVERY hits, so most requests cost no store
+    round trip. Across P processes the limit can be overshot by at most
+    P * SYNC_EVERY requests.
+    """
+
+    def __init__(self, scope, limit, period, storage):
+        self.scope = scope
+        self.limit = limit
+        self.period = period
+        self.storage = storage
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, ident, window):
+        return f"ratelimit:{self.scope}:{ident}:{window}"
+
+    def _local_window(self, ident, window):
+        state = self._local.get(ident)
+        if state is None or state.window != window:
+            # Unsynced hits of an old window are dropped, at most SYNC_EVERY of them
+            state = self._local[ident] = _LocalWindow(window)
+        self._local.move_to_end(ident)
+        while len(self._local) > LOCAL_STATE_SIZE:
+            self._local.popitem(last=False)
+        return state
+
+    def _hit_local(self, ident, now):
+        """Count a hit in process memory; returns the window state and the hits to push, 0 when done"""
+        window = int(now // self.period)
+        weight = 1 - (now % self.period) / self.period
+        with self._lock:
+            state = self._local_window(ident, window)
+            previous = state.previous or 0
+            estimate = previous * weight + state.shared + state.pending + 1
+            if (state.previous is not None and state.pending < SYNC_EVERY
+                    and estimate <= self.limit * LOCAL_THRESHOLD):
+                state.pending += 1
+                return state, 0
+            delta = state.pending + 1
+            state.pending = 0
+            return state, delta
+
+    def _hit_shared(self, ident, now, state, delta):
+        """Push local hits and read the real counts from the shared store"""
+        window = int(now // self.period)
+        weight = 1 - (now % self.period) / self.period
+        timeout = self.period * 2
+        current = self.storage.incr(self._key(ident, window), delta, timeout)
+        if state.previous is None:
+            state.previous = self.storage.get(self._key(ident, window - 1))
+        state.shared = current
+
+        estimate = state.previous * weight + current
+        if estimate <= self.limit:
+            return True, 0
+
+        # Denied requests do not count against the client
+        self.storage.incr(self._key(ident, window), -1, timeout)
+        state.shared = current - 1
+        retry_after = math.ceil(self.period - now % self.period)
+        return False, retry_after
+
+    def hit(self, ident, now=None):
+        """Count one request; returns (allowed, retry_after_seconds)"""
+        now = time.time() if now is None else now
+        state, delta = self._hit_local(ident, now)
+        if not delta:
+            return True, 0
+        return self._hit_shared(ident, now, state, delta)
+
+    async def ahit(self, ident, now=None):
+        """hit for async views, only the shared store round trip runs in a thread"""
+        now = time.time() if now is None else now
+        state, delta = self._hit_local(ident, now)
+        if not delta:
+            return True, 0
+        return await sync_to_async(self._hit_shared)(ident, now, state, delta)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def _storage():
+    path = getattr(settings, 'CROSSWORD_RATE_LIMIT_STORAGE', 'crossword.ratelimit.CacheStorage')
+    return import_string(path)()
+
+def get_limiter(scope, limit, period):
+    """Limiter for a scope, with CROSSWORD_RATE_LIMITS overriding the given defaults"""
+    config = getattr(settings, 'CROSSWORD_RATE_LIMITS', {}).get(scope, {})
+    limit = config.get('limit', limit)
+    period = config.get('period', period)
+    with _limiters_lock:
+        limiter = _limiters.get(scope)
+        if limiter is None or (limiter.limit, limiter.period) != (limit, period):
+            limiter = _limiters[scope] = SlidingWindowLimiter(scope, limit, period, _storage())
+        return limiter
+
+def _limited(retry_after):
+    response = JsonResponse({'error': 'Rate limit exceeded'}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+def rate_limit(key_prefix, limit=100, period=3600):
+    """Rate limiting decorator for sync and async views"""
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                limiter = get_limiter(key_prefix, limit, period)
+                allowed, retry_after = await limiter.ahit(request.META.get('REMOTE_ADDR', ''))
+                if not allowed:
+                    return _limited(retry_after)
+                return await view_func(request, *args, **kwargs)
+            return _wrapped_async_view
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            limiter = get_limiter(key_prefix, limit, period)
+            allowed, retry_after = limiter.hit(request.META.get('REMOTE_ADDR', ''))
+            if not allowed:
+                return _limited(retry_after)
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
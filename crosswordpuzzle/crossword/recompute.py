@@ -0,0 +1,125 @@
+from django.core.cache import cache
+import asyncio
+import math
+import random
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds a value outlives its freshness, served while one request rebuilds it
+STALE_TIMEOUT = 60
+# A rebuild lock left behind by a crashed request frees itself after this long
+REBUILD_LOCK_TIMEOUT = 5
+# How long a request without any copy waits for another one's rebuild
+WAIT_SECONDS = 0.5
+POLL_SECONDS = 0.02
+# Higher refreshes earlier; 1 is the usual choice for probabilistic early expiration
+EARLY_REFRESH_BETA = 1.0
+
+def fresh_key(key):
+    return f'{key}:fresh'
+
+def lock_key(key):
+    return f'rebuild:{key}'
+
+def stale_keys(keys):
+    """
+    Keys to delete to mark cached values stale instead of dropping them.
+
+    The values stay readable for STALE_TIMEOUT, so only the request that wins
+    the rebuild lock pays for recomputing them.
+    """
+    return [fresh_key(key) for key in keys]
+
+def _is_fresh(freshness):
+    """
+    Whether a value may still be served, expiring early at random as its end nears.
+
+    The longer a value takes to compute, the earlier one request refreshes it,
+    so popular keys are rebuilt before they expire rather than after.
+    """
+    if freshness is None:
+        return False
+    duration, expires_at = freshness
+    return time.time() - duration * EARLY_REFRESH_BETA * math.log(1 - random.random()) < expires_at
+
+def _store(key, value, duration, timeout):
+    cache.set(key, value, timeout + STALE_TIMEOUT)
+    cache.set(fresh_key(key), (duration, time.time() + timeout), timeout)
+
+async def _astore(key, value, duration, timeout):
+    await cache.aset(key, value, timeout + STALE_TIMEOUT)
+    await cache.aset(fresh_key(key), (duration, time.time() + timeout), timeout)
+
+def _rebuild(key, compute, timeout):
+    started = time.perf_counter()
+    value = compute()
+    if value is not None:
+        _store(key, value, time.perf_counter() - started, timeout)
+    return value
+
+async def _arebuild(key, compute, timeout):
+    started = time.perf_counter()
+    value = await compute()
+    if value is not None:
+        await _astore(key, value, time.perf_counter() - started, timeout)
+    return value
+
+def get_or_compute(key, compute, timeout):
+    """
+    Cached value of key, computed by compute() at most once at a time across processes.
+
+    A value is fresh for timeout seconds. Once stale, one request rebuilds it
+    while the others keep getting the stale copy; without any copy they wait
+    up to WAIT_SECONDS for the rebuild before computing it themselves. A
+    compute() returning None is not cached.
+
+    The rebuild lock is a cache add, which goes to the shared tier. That only
+    makes rebuilds single-flight across processes when the shared backend's
+    add is atomic, as it is for Redis and crossword.cache_backends.DatabaseCache;
+    with any other backend it only holds within a process.
+    """
+    value = cache.get(key)
+    if value is not None and _is_fresh(cache.get(fresh_key(key))):
+        return value
+
+    if cache.add(lock_key(key), 1, REBUILD_LOCK_TIMEOUT):
+        try:
+            return _rebuild(key, compute, timeout)
+        finally:
+            cache.delete(lock_key(key))
+    if value is not None:
+        return value
+
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    logger.warning(f"Gave up waiting for the rebuild of {key}")
+    return _rebuild(key, compute, timeout)
+
+async def aget_or_compute(key, compute, timeout):
+    """get_or_compute for async views, compute being a coroutine function"""
+    value = await cache.aget(key)
+    if value is not None and _is_fresh(await cache.aget(fresh_key(key))):
+        return value
+
+    if await cache.aadd(lock_key(key), 1, REBUILD_LOCK_TIMEOUT):
+        try:
+            return await _arebuild(key, compute, timeout)
+        finally:
+            await cache.adelete(lock_key(key))
+    if value is not None:
+        return value
+
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_SECONDS)
+        value = await cache.aget(key)
+        if value is not None:
+            return value
+    logger.warning(f"Gave up waiting for the rebuild of {key}")
+    return await _arebuild(key, compute, timeout)
@@ -0,0 +1,129 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from functools import wraps
+import random
+
+# Cookie that keeps a client on the primary right after it wrote
+STICKY_COOKIE = 'crossword_primary'
+
+# Replica alias chosen for the current request, None to read from the primary
+_replica = ContextVar('crossword_read_replica', default=None)
+# Set for requests of clients that may not see their own writes on a replica yet
+_pinned = ContextVar('crossword_pinned_to_primary', default=False)
+
+def replicas():
+    return getattr(settings, 'CROSSWORD_READ_REPLICAS', [])
+
+def read_alias():
+    """Database alias reads of the current context go to"""
+    alias = _replica.get()
+    if alias is None or _pinned.get():
+        return DEFAULT_DB_ALIAS
+    # Reads inside a transaction, select_for_update among them, belong with its writes
+    if transaction.get_connection(DEFAULT_DB_ALIAS).in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return alias
+
+def replica_behind(version, published):
+    """Whether a row read for the current context is older than the version last committed on the primary"""
+    return read_alias() != DEFAULT_DB_ALIAS and published is not None and version < published
+
+@contextmanager
+def use_replicas():
+    """Read from one replica, picked at random, for the rest of the block"""
+    aliases = replicas()
+    token = _replica.set(random.choice(aliases) if aliases else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+@contextmanager
+def use_primary():
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+def replica_reads(view):
+    """Serve a view's reads from a replica, unless its client has just written"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with use_replicas():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replicas():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+class ReplicaRouter:
+    """Writes and migrations go to the primary, reads to the replica of the current read policy"""
+
+    def db_for_read(self, model, **hints):
+        # Locks and counters of the database cache must never be read behind their writes
+        if model._meta.app_label == 'django_cache':
+            return DEFAULT_DB_ALIAS
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so any two rows may relate
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
+
+class ReadYourWritesMiddleware:
+    """
+    Pins a client to the primary for CROSSWORD_REPLICA_STICKY_SECONDS after
+    any successful write request, so a player who just joined or solved a
+    word never polls a replica that has not caught up with it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'CROSSWORD_REPLICA_STICKY_SECONDS', 5)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _pinned.set(self._is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        token = _pinned.set(self._is_pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._finish(request, response)
+
+    def _is_pinned(self, request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') or STICKY_COOKIE in request.COOKIES
+
+    def _finish(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and replicas():
+            response.set_cookie(STICKY_COOKIE, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from .models import PuzzleSnapshot, Word
+from . import routers
+import gzip
+import hashlib
+import json
+
+# Bump when the document layout below changes, old snapshots keep their format number
+FORMAT_VERSION = 2
+# Snapshots never change, so a cached copy only has to be evicted to save space
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+# Browser cache lifetime; safe to be long because the URL changes with the content
+SNAPSHOT_MAX_AGE = 365 * 24 * 60 * 60
+
+WORD_FIELDS = ('id', 'word', 'hint', 'direction', 'start_row', 'start_col')
+
+def snapshot_key(etag):
+    # Keyed by content, so a cached snapshot can never be stale
+    return f'puzzle_snapshot_{etag}'
+
+def compile_snapshot(rows, cols, words):
+    """
+    (etag, gzip compressed JSON) of a puzzle's size and slots, given its
+    words as Word field dicts.
+
+    Slots carry geometry, clue number and hint but never the answer, which
+    is only revealed through the puzzle state once solved.
+    """
+    starts = sorted({(word['start_row'], word['start_col']) for word in words})
+    numbers = {start: number for number, start in enumerate(starts, 1)}
+    document = {
+        'format': FORMAT_VERSION,
+        'rows': rows,
+        'cols': cols,
+        'slots': [
+            {
+                'id': word['id'],
+                'number': numbers[(word['start_row'], word['start_col'])],
+                'direction': word['direction'],
+                'start_row': word['start_row'],
+                'start_col': word['start_col'],
+                'length': len(word['word']),
+                'hint': word['hint'],
+            }
+            for word in words
+        ],
+    }
+    body = json.dumps(document, separators=(',', ':')).encode()
+    # mtime=0 keeps the compressed bytes identical for identical puzzles
+    return hashlib.sha256(body).hexdigest()[:32], gzip.compress(body, mtime=0)
+
+def create(puzzle, words):
+    """Compile and store the snapshot of a puzzle from its just inserted Word objects"""
+    if any(word.pk is None for word in words):
+        # The database did not return ids from the bulk insert
+        rows = list(Word.objects.filter(puzzle=puzzle).order_by('id').values(*WORD_FIELDS))
+    else:
+        rows = [{field: getattr(word, field) for field in WORD_FIELDS} for word in words]
+    etag, data = compile_snapshot(puzzle.rows, puzzle.cols, rows)
+    return PuzzleSnapshot.objects.create(puzzle=puzzle, format=FORMAT_VERSION, etag=etag, data=data)
+
+def refresh(puzzle):
+    """
+    Recompile and store the snapshot of a puzzle from its saved words and
+    return the new etag. Used for puzzles created or edited outside
+    create_with_words, such as through the admin.
+    """
+    with routers.use_primary():
+        rows = list(Word.objects.filter(puzzle=puzzle).order_by('id').values(*WORD_FIELDS))
+    etag, data = compile_snapshot(puzzle.rows, puzzle.cols, rows)
+    PuzzleSnapshot.objects.update_or_create(
+        puzzle=puzzle, defaults={'format': FORMAT_VERSION, 'etag': etag, 'data': data}
+    )
+    return etag
+
+def load(code, etag):
+    """gzip compressed snapshot of a puzzle if etag is its current one, otherwise None"""
+    key = snapshot_key(etag)
+    data = cache.get(key)
+    if data is None:
+        data = PuzzleSnapshot.objects.filter(puzzle__code=code, etag=etag).values_list('data', flat=True).first()
+        if data is None:
+            return None
+        data = bytes(data)
+        cache.set(key, data, SNAPSHOT_TIMEOUT)
+    return data
@@ -0,0 +1,53 @@
+from django.db.models import Count, Max
+from .models import Player, STANDINGS_ORDER
+import logging
+
+logger = logging.getLogger(__name__)
+
+def get_standings(puzzle_id, active_only=True):
+    """
+    Ranked players of a puzzle read from the materialized points and
+    last_solve_at columns, which submission.claim_word keeps current.
+    """
+    players = Player.objects.filter(puzzle_id=puzzle_id)
+    if active_only:
+        players = players.filter(is_active=True)
+    return [
+        {
+            'id': player['id'],
+            'display_name': player['display_name'],
+            'points': player['points'],
+            'words_solved': player['points'],
+            'last_solve_time': player['last_solve_at'] or player['joined_at'],
+            'joined_at': player['joined_at'],
+        }
+        for player in players.order_by(*STANDINGS_ORDER).values(
+            'id', 'display_name', 'points', 'last_solve_at', 'joined_at'
+        )
+    ]
+
+def compute_standings(puzzle_id):
+    """Points and last solve time of every player, aggregated from SolvedWord in one query"""
+    return {
+        player['id']: {'points': player['solved'], 'last_solve_at': player['last_solve']}
+        for player in Player.objects.filter(puzzle_id=puzzle_id).annotate(
+            solved=Count('solvedword'),
+            last_solve=Max('solvedword__solved_at'),
+        ).values('id', 'solved', 'last_solve')
+    }
+
+def rebuild_standings(puzzle_id):
+    """Recompute the materialized standings of a puzzle from its solved words"""
+    computed = compute_standings(puzzle_id)
+    players = list(Player.objects.filter(puzzle_id=puzzle_id).only('id', 'points', 'last_solve_at'))
+    changed = []
+    for player in players:
+        row = computed[player.id]
+        if (player.points, player.last_solve_at) != (row['points'], row['last_solve_at']):
+            player.points = row['points']
+            player.last_solve_at = row['last_solve_at']
+            changed.append(player)
+    if changed:
+        Player.objects.bulk_update(changed, ['points', 'last_solve_at'])
+        logger.info(f"Rebuilt standings of {len(changed)} players in puzzle {puzzle_id}")
+    return len(changed)
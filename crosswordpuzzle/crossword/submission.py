@@ -0,0 +1,117 @@
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from .models import CrosswordPuzzle, Player, SolvedWord, publish_versions, supports_returning
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _insert_claim(puzzle_id, word_id, player_id, now):
+    """Insert the solve unless the word is taken or the game is not running, returning its id"""
+    solved = SolvedWord._meta.db_table
+    puzzles = CrosswordPuzzle._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {solved} (puzzle_id, word_id, solved_by_id, solved_at, version) '
+            f'SELECT %s, %s, %s, %s, 0 '
+            f'WHERE EXISTS (SELECT 1 FROM {puzzles} WHERE id = %s AND status = %s) '
+            f'ON CONFLICT (puzzle_id, word_id) DO NOTHING '
+            f'RETURNING id',
+            [puzzle_id, word_id, player_id, connection.ops.adapt_datetimefield_value(now), puzzle_id, 'in_progress']
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def _insert_claim_fallback(puzzle_id, word_id, player_id, now):
+    """Portable claim for databases without ON CONFLICT ... RETURNING"""
+    if not CrosswordPuzzle.objects.filter(pk=puzzle_id, status='in_progress').exists():
+        return None
+    try:
+        with transaction.atomic():
+            return SolvedWord.objects.create(
+                puzzle_id=puzzle_id,
+                word_id=word_id,
+                solved_by_id=player_id
+            ).pk
+    except IntegrityError:
+        return None
+
+def _award_point(puzzle_id, player_id, version, now):
+    """Increment the solver's standing in place, returning (points, display_name)"""
+    if supports_returning():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {Player._meta.db_table} SET points = points + 1, version = %s, last_solve_at = %s '
+                f'WHERE id = %s AND puzzle_id = %s '
+                f'RETURNING points, display_name',
+                [version, connection.ops.adapt_datetimefield_value(now), player_id, puzzle_id]
+            )
+            row = cursor.fetchone()
+    else:
+        players = Player.objects.filter(pk=player_id, puzzle_id=puzzle_id)
+        updated = players.update(points=F('points') + 1, version=version, last_solve_at=now)
+        row = players.values_list('points', 'display_name').first() if updated else None
+    if row is None:
+        raise Player.DoesNotExist('Player not found in this puzzle')
+    return row
+
+def _bump_and_award(puzzle_id, solved_id, player_id, now):
+    """
+    Bump the puzzle version, stamp the claim with it and award the point in
+    one statement, returning (points, display_name, version).
+    """
+    puzzles = CrosswordPuzzle._meta.db_table
+    adapted_now = connection.ops.adapt_datetimefield_value(now)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH bumped AS (UPDATE {puzzles} SET version = version + 1 WHERE id = %s RETURNING version), '
+            f'stamped AS (UPDATE {SolvedWord._meta.db_table} SET version = (SELECT version FROM bumped), solved_at = %s '
+            f'WHERE id = %s) '
+            f'UPDATE {Player._meta.db_table} SET points = points + 1, version = (SELECT version FROM bumped), '
+            f'last_solve_at = %s '
+            f'WHERE id = %s AND puzzle_id = %s '
+            f'RETURNING points, display_name, version',
+            [puzzle_id, adapted_now, solved_id, adapted_now, player_id, puzzle_id]
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise Player.DoesNotExist('Player not found in this puzzle')
+    publish_versions({puzzle_id: row[2]})
+    return row
+
+def claim_word(puzzle_id, word_id, player_id):
+    """
+    Record a correct guess, the ('puzzle', 'word') unique constraint deciding
+    the winner of concurrent claims.
+
+    A lost claim writes nothing else. A won one bumps the puzzle version, which
+    locks the puzzle row until commit so commits happen in version order, and
+    updates the solver's row. The bump comes last, and on PostgreSQL it is one
+    statement with the point award, so the puzzle row is held as briefly as
+    possible. Returns a dict with the solver's new points and the puzzle
+    version, or None when the word was already solved or the game is not in
+    progress.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if supports_returning():
+            solved_id = _insert_claim(puzzle_id, word_id, player_id, now)
+        else:
+            solved_id = _insert_claim_fallback(puzzle_id, word_id, player_id, now)
+        if solved_id is None:
+            return None
+
+        if connection.vendor == 'postgresql':
+            points, display_name, version = _bump_and_award(puzzle_id, solved_id, player_id, now)
+        else:
+            version = CrosswordPuzzle.objects.bump_version(puzzle_id)
+            # auto_now_add ignores the claim time on create, update pins it for the fallback path
+            SolvedWord.objects.filter(pk=solved_id).update(version=version, solved_at=now)
+            points, display_name = _award_point(puzzle_id, player_id, version, now)
+
+    return {
+        'points': points,
+        'display_name': display_name,
+        'version': version,
+        'solved_at': now,
+    }
@@ -1,69 +1,89 @@
 from django.utils import timezone
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.core.cache import cache
 from datetime import timedelta
-from .models import CrosswordPuzzle, Player
+from .models import CrosswordPuzzle, Player, publish_versions
+from . import archive, lifecycle, recompute
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Completed puzzles are moved to PuzzleArchive records after ARCHIVE_AFTER_DAYS
+ARCHIVE_AFTER_DAYS = 1
+# Puzzles archived per transaction, which bounds how long each batch holds its locks
+ARCHIVE_BATCH_SIZE = 100
+
 def cleanup_old_puzzles():
     """Clean up old completed puzzles"""
     try:
-        cutoff_date = timezone.now() - timedelta(days=7)
-        old_puzzles = CrosswordPuzzle.objects.filter(
-            created_at__lt=cutoff_date,
-            status='completed'
-        )
-        count = old_puzzles.update(is_active=False)
-        logger.info(f"Deactivated {count} old puzzles")
+        archive_old_puzzles(timezone.now() - timedelta(days=ARCHIVE_AFTER_DAYS))
     except Exception as e:
         logger.error(f"Error in cleanup_old_puzzles: {str(e)}", exc_info=True)
 
+def archive_old_puzzles(cutoff, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+    """
+    Archive puzzles completed before cutoff and delete their words, players
+    and solved words, batch_size puzzles per transaction.
+
+    Returns the number of puzzles archived.
+    """
+    old = archive.archivable(CrosswordPuzzle.objects.filter(created_at__lt=cutoff)).order_by('id')
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(old.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted = archive.archive_puzzles(ids)
+        archived += deleted['puzzles']
+        batches += 1
+        logger.info(
+            f"Archive batch {batches}: archived {deleted['puzzles']} puzzles, removed {deleted['words']} words, "
+            f"{deleted['players']} player rows, {deleted['solved_words']} solved words ({archived} puzzles so far)"
+        )
+    return archived
+
 def cleanup_inactive_players():
     """Clean up inactive players from active games"""
     try:
-        # Get active puzzles
-        active_puzzles = CrosswordPuzzle.objects.filter(
-            status='in_progress',
-            is_active=True
-        )
-        
+        # Players whose session, as long as the game itself, has run out
+        stale_players = Player.objects.filter(
+            is_active=True,
+            puzzle__status='in_progress',
+            puzzle__is_active=True
+        ).alias(
+            expires_at=lifecycle.ends_at('joined_at', 'puzzle__duration')
+        ).filter(expires_at__lt=timezone.now())
+
         total_cleaned = 0
-        for puzzle in active_puzzles:
-            # Calculate session timeout
-            timeout = timezone.now() - timedelta(minutes=puzzle.duration)
-            
-            # Mark players as inactive if they haven't reconnected
-            inactive_count = Player.objects.filter(
-                puzzle=puzzle,
-                is_active=True,
-                joined_at__lt=timeout
-            ).update(is_active=False)
-            
-            total_cleaned += inactive_count
-            
-            # If all players are inactive, end the game
-            if not Player.objects.filter(puzzle=puzzle, is_active=True).exists():
-                puzzle.end_game()
-                logger.info(f"Ended game {puzzle.code} due to all players inactive")
-        
-        logger.info(f"Cleaned up {total_cleaned} inactive players")
+        with transaction.atomic():
+            puzzle_ids = list(stale_players.order_by().values_list('puzzle_id', flat=True).distinct())
+            if puzzle_ids:
+                puzzles = CrosswordPuzzle.objects.filter(id__in=puzzle_ids)
+                puzzles.update(version=F('version') + 1)
+                total_cleaned = stale_players.update(
+                    is_active=False,
+                    version=Subquery(CrosswordPuzzle.objects.filter(pk=OuterRef('puzzle_id')).values('version')[:1])
+                )
+                changed = list(puzzles.values_list('id', 'version', 'code'))
+                publish_versions({puzzle_id: version for puzzle_id, version, _ in changed})
+                stale_keys = recompute.stale_keys(f'puzzle_data_{code}' for _, _, code in changed)
+                transaction.on_commit(lambda: cache.delete_many(stale_keys))
+        logger.info(f"Cleaned up {total_cleaned} inactive players in {len(puzzle_ids)} puzzles")
+
+        # End every running game nobody is left in
+        abandoned = CrosswordPuzzle.objects.filter(is_active=True).exclude(
+            Exists(Player.objects.filter(puzzle=OuterRef('pk'), is_active=True))
+        )
+        ended = lifecycle.end_games(abandoned)
+        for puzzle in ended:
+            logger.info(f"Ended game {puzzle['code']} due to all players inactive")
     except Exception as e:
         logger.error(f"Error in cleanup_inactive_players: {str(e)}", exc_info=True)
 
 def end_expired_games():
     """End games that have exceeded their duration"""
     try:
-        active_puzzles = CrosswordPuzzle.objects.filter(
-            status='in_progress',
-            is_active=True
-        )
-        
-        ended_count = 0
-        for puzzle in active_puzzles:
-            if puzzle.time_remaining == 0:
-                puzzle.end_game()
-                ended_count += 1
-        
-        logger.info(f"Ended {ended_count} expired games")
+        lifecycle.end_expired_games()
     except Exception as e:
-        logger.error(f"Error in end_expired_games: {str(e)}", exc_info=True) 
\ No newline at end of file
+        logger.error(f"Error in end_expired_games: {str(e)}", exc_info=True)
@@ -1,12 +1,43 @@
-from django.test import TestCase, Client
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from django.http import HttpResponse
 from django.urls import reverse
-from .models import CrosswordPuzzle, Word, Player, SolvedWord
+from .models import CrosswordPuzzle, Word, Player, PuzzleArchive, PuzzleSnapshot, SolvedWord, generate_code
+from . import answers, archive, broadcast, encoding, events, fill, generator, identity, instrumentation, joining, lifecycle, ranking, ratelimit, recompute, routers, snapshots, standings, submission, tasks, views
+from .cache_backends import DatabaseCache, TieredCache
+from .layout import validate_layout, word_cells
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections, transaction
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from unittest import mock
+import asyncio
+import threading
+import gzip
+import os
+import tempfile
+import io
 import json
+import random
+import time
+import uuid
 from django.utils import timezone
 from datetime import timedelta
 
 # Create your tests here.
 
+# For tests that count queries or share the cache between threads
+LOCAL_CACHES = {
+    **settings.CACHES,
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'crossword-tests'},
+}
+
+def add_snapshot(puzzle):
+    """Compile the snapshot create_with_words would have, for puzzles built word by word"""
+    return snapshots.create(puzzle, list(puzzle.words.order_by('id')))
+
 class CrosswordPuzzleModelTests(TestCase):
     def setUp(self):
         self.puzzle = CrosswordPuzzle.objects.create(
@@ -185,10 +216,13 @@ class ViewTests(TestCase):
         response = self.client.get(reverse('get_puzzle', args=[puzzle_code]))
         self.assertEqual(response.status_code, 200)
         data = response.json()
+        self.assertEqual(data['status'], 'waiting')
+
+        # Size and slots come from the snapshot
+        data = self.client.get(data['snapshot_url']).json()
         self.assertEqual(data['rows'], 15)
         self.assertEqual(data['cols'], 15)
-        self.assertEqual(len(data['words']), 1)
-        self.assertEqual(data['status'], 'waiting')
+        self.assertEqual(len(data['slots']), 1)
 
     def test_start_game(self):
         # Create and join puzzle
@@ -267,6 +301,16 @@ class ViewTests(TestCase):
         )
         self.assertEqual(response.status_code, 400)
 
+        # Submit a word that is not a string
+        for word in (123, ['TEST'], {'word': 'TEST'}):
+            response = self.client.post(
+                reverse('submit_word', args=[puzzle_code]),
+                data=json.dumps({'word': word}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], 'Word must be a string')
+
     def test_get_players(self):
         # Create and join puzzle
         create_response = self.client.post(
@@ -347,3 +391,1335 @@ class ViewTests(TestCase):
         response = self.client.get(reverse('leaderboard', args=[puzzle_code]))
         self.assertEqual(response.status_code, 200)
         self.assertIn('players', response.context)
+
+class BroadcastTests(TestCase):
+    def test_publish_reaches_subscribers(self):
+        async def scenario():
+            room = broadcast.get_room('room0001')
+            subscription = room.subscribe()
+            delivered = broadcast.publish('room0001', broadcast.EVENT_WORD_SOLVED, {'word': 'TEST'})
+            message = await subscription.get(1)
+            subscription.close()
+            return delivered, message
+
+        delivered, message = asyncio.run(scenario())
+        self.assertEqual(delivered, 1)
+        self.assertEqual(message['event'], broadcast.EVENT_WORD_SOLVED)
+        self.assertEqual(message['data'], {'word': 'TEST'})
+        # Room is dropped once its last subscriber leaves
+        self.assertEqual(broadcast.publish('room0001', broadcast.EVENT_GAME_ENDED), 0)
+
+    def test_format_sse(self):
+        frame = broadcast.format_sse({'id': 3, 'event': 'game_started', 'data': {'duration': 30}})
+        self.assertEqual(frame, 'id: 3\nevent: game_started\ndata: {"duration": 30}\n\n')
+
+    def test_stream_falls_back_to_polling_under_wsgi(self):
+        puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        response = self.client.get(reverse('puzzle_stream', args=[puzzle.code]))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['fallback'], 'polling')
+
+    async def test_stream_is_only_for_players_of_the_room(self):
+        own, other = [await CrosswordPuzzle.objects.acreate(rows=15, cols=15, duration=30) for _ in range(2)]
+        client = AsyncClient()
+        self.assertEqual((await client.get(reverse('puzzle_stream', args=[other.code]))).status_code, 401)
+        await client.post(
+            reverse('join_puzzle'),
+            data=json.dumps({'code': own.code, 'display_name': 'Streamer'}),
+            content_type='application/json'
+        )
+        response = await client.get(reverse('puzzle_stream', args=[other.code]))
+        self.assertEqual(response.status_code, 403)
+
+class PuzzleDeltaTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        self.word = Word.objects.create(
+            puzzle=self.puzzle,
+            word="TEST",
+            hint="A test word",
+            direction="across",
+            start_row=0,
+            start_col=0
+        )
+        add_snapshot(self.puzzle)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('join_puzzle'),
+                data=json.dumps({'code': self.puzzle.code, 'display_name': 'TestPlayer'}),
+                content_type='application/json'
+            )
+
+    def test_join_bumps_version(self):
+        self.puzzle.refresh_from_db()
+        self.assertEqual(self.puzzle.version, 1)
+        self.assertEqual(Player.objects.get(puzzle=self.puzzle).version, 1)
+
+    def test_unchanged_since_returns_not_modified(self):
+        data = self.client.get(reverse('get_puzzle', args=[self.puzzle.code])).json()
+        response = self.client.get(reverse('get_puzzle', args=[self.puzzle.code]), {'since': data['version']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_delta_contains_only_changes(self):
+        # A second word keeps the game running after the first is solved
+        Word.objects.create(puzzle=self.puzzle, word="TENT", hint="Camp", direction="down", start_row=0, start_col=0)
+        version = self.client.get(reverse('get_puzzle', args=[self.puzzle.code])).json()['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('start_game', args=[self.puzzle.code]))
+            self.client.post(
+                reverse('submit_word', args=[self.puzzle.code]),
+                data=json.dumps({'word': 'TEST'}),
+                content_type='application/json'
+            )
+
+        response = self.client.get(reverse('get_puzzle', args=[self.puzzle.code]), {'since': version})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['delta'])
+        self.assertEqual(data['status'], 'in_progress')
+        self.assertEqual(data['solved_words'], [{'id': self.word.id, 'word': 'TEST'}])
+        self.assertEqual([p['points'] for p in data['players']], [1])
+        self.assertNotIn('words', data)
+
+    def test_invalid_since(self):
+        response = self.client.get(reverse('get_puzzle', args=[self.puzzle.code]), {'since': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+class SubmissionTests(TestCase):
+    def setUp(self):
+        self.puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        self.word = Word.objects.create(
+            puzzle=self.puzzle,
+            word="TEST",
+            hint="A test word",
+            direction="across",
+            start_row=0,
+            start_col=0
+        )
+        self.first = Player.objects.create(display_name="Player1", puzzle=self.puzzle)
+        self.second = Player.objects.create(display_name="Player2", puzzle=self.puzzle)
+        self.puzzle.start_game()
+
+    def _assert_single_claim(self):
+        claim = submission.claim_word(self.puzzle.id, self.word.id, self.first.id)
+        self.assertEqual(claim['points'], 1)
+        self.assertIsNone(submission.claim_word(self.puzzle.id, self.word.id, self.second.id))
+
+        solved = SolvedWord.objects.get(puzzle=self.puzzle, word=self.word)
+        self.assertEqual(solved.solved_by, self.first)
+        self.assertEqual(solved.version, claim['version'])
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.points, self.second.points), (1, 0))
+        self.assertEqual(self.first.last_solve_at, solved.solved_at)
+        self.assertIsNone(self.second.last_solve_at)
+
+    def test_first_claim_wins(self):
+        self._assert_single_claim()
+
+    def test_first_claim_wins_without_returning(self):
+        with mock.patch('crossword.submission.supports_returning', return_value=False):
+            self._assert_single_claim()
+
+    def test_claim_requires_game_in_progress(self):
+        self.puzzle.end_game()
+        self.assertIsNone(submission.claim_word(self.puzzle.id, self.word.id, self.first.id))
+        self.assertFalse(SolvedWord.objects.exists())
+
+@override_settings(CACHES=LOCAL_CACHES)
+class StandingsTests(TestCase):
+    def setUp(self):
+        self.puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        self.words = [
+            Word.objects.create(
+                puzzle=self.puzzle, word=answer, hint="Hint",
+                direction="across", start_row=row, start_col=0
+            )
+            for row, answer in enumerate(["ONE", "TWO", "THREE"])
+        ]
+        self.players = [
+            Player.objects.create(display_name=f"Player{i}", puzzle=self.puzzle)
+            for i in range(3)
+        ]
+        self.puzzle.start_game()
+
+    def test_ties_broken_by_earliest_last_solve(self):
+        first, second, idle = self.players
+        submission.claim_word(self.puzzle.id, self.words[0].id, second.id)
+        submission.claim_word(self.puzzle.id, self.words[1].id, first.id)
+        submission.claim_word(self.puzzle.id, self.words[2].id, first.id)
+
+        names = [row['display_name'] for row in standings.get_standings(self.puzzle.id)]
+        self.assertEqual(names, ['Player0', 'Player1', 'Player2'])
+
+        # Tied on one point each: whoever reached it first ranks higher
+        SolvedWord.objects.filter(word=self.words[2]).delete()
+        standings.rebuild_standings(self.puzzle.id)
+        names = [row['display_name'] for row in standings.get_standings(self.puzzle.id)]
+        self.assertEqual(names, ['Player1', 'Player0', 'Player2'])
+
+    def test_rebuild_matches_solved_words(self):
+        first = self.players[0]
+        submission.claim_word(self.puzzle.id, self.words[0].id, first.id)
+        Player.objects.filter(id=first.id).update(points=7, last_solve_at=None)
+
+        self.assertEqual(standings.rebuild_standings(self.puzzle.id), 1)
+        first.refresh_from_db()
+        solved = SolvedWord.objects.get(word=self.words[0])
+        self.assertEqual((first.points, first.last_solve_at), (1, solved.solved_at))
+        self.assertEqual(standings.rebuild_standings(self.puzzle.id), 0)
+
+    def test_leaderboard_queries_do_not_grow_with_players(self):
+        for i in range(20):
+            Player.objects.create(display_name=f"Extra{i}", puzzle=self.puzzle)
+        cache.delete(f'leaderboard_{self.puzzle.code}')
+        with self.assertNumQueries(2):
+            # Puzzle row, standings
+            response = self.client.get(reverse('leaderboard', args=[self.puzzle.code]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['players']), 23)
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RankIndexTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.index = ranking.RankIndex(1, 10, [
+            {'id': i, 'display_name': f'Player{i}', 'points': points, 'is_creator': False,
+             'joined_at': now + timedelta(seconds=i), 'last_solve_at': None}
+            for i, points in enumerate([3, 0, 5, 3, 1])
+        ])
+
+    def test_rank_top_and_around(self):
+        self.assertEqual([p['id'] for p in self.index.top()], [2, 0, 3, 4, 1])
+        self.assertEqual([p['rank'] for p in self.index.top(2)], [1, 2])
+        self.assertEqual(self.index.rank(3), 3)
+        self.assertIsNone(self.index.rank(99))
+        self.assertEqual([(p['id'], p['rank']) for p in self.index.around(0, 1)], [(2, 1), (0, 2), (3, 3)])
+
+    def test_apply_moves_player(self):
+        self.assertTrue(self.index.apply(11, 1, points=6, last_solve_at=timezone.now()))
+        self.assertEqual(self.index.rank(1), 1)
+        self.assertTrue(self.index.apply(12, 2, is_active=False))
+        self.assertEqual(len(self.index), 4)
+        # A skipped version means the index missed a change elsewhere
+        self.assertFalse(self.index.apply(14, 0, points=9))
+
+    def test_get_players_served_from_index(self):
+        # Version counters are keyed by puzzle id and the cache outlives the test database
+        cache.clear()
+        puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        word = Word.objects.create(
+            puzzle=puzzle, word="TEST", hint="Hint", direction="across", start_row=0, start_col=0
+        )
+        for name in ('Player1', 'Player2'):
+            self.client.post(
+                reverse('join_puzzle'),
+                data=json.dumps({'code': puzzle.code, 'display_name': name}),
+                content_type='application/json'
+            )
+        puzzle.start_game()
+        response = self.client.get(reverse('get_players', args=[puzzle.code]))
+        self.assertEqual(response.json()['rank'], 2)
+
+        self.client.post(
+            reverse('submit_word', args=[puzzle.code]),
+            data=json.dumps({'word': 'test'}),
+            content_type='application/json'
+        )
+        self.assertTrue(SolvedWord.objects.filter(word=word).exists())
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('get_players', args=[puzzle.code]) + '?limit=1&around=1')
+        data = response.json()
+        self.assertEqual(data['rank'], 1)
+        self.assertEqual([p['display_name'] for p in data['players']], ['Player2'])
+        self.assertEqual([p['rank'] for p in data['around']], [1, 2])
+        self.assertEqual(data['total_players'], 2)
+
+class LifecycleTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.due = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        self.fresh = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        self.empty = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        for puzzle in (self.due, self.fresh):
+            Player.objects.create(display_name="Host", puzzle=puzzle)
+        CrosswordPuzzle.objects.filter(pk=self.due.pk).update(waiting_room_start_time=now - timedelta(seconds=60))
+        CrosswordPuzzle.objects.filter(pk=self.fresh.pk).update(waiting_room_start_time=now)
+        # A room whose only player left does not start on its own
+        Player.objects.create(display_name="Gone", puzzle=self.empty, is_active=False)
+        CrosswordPuzzle.objects.filter(pk=self.empty.pk).update(waiting_room_start_time=now - timedelta(seconds=60))
+
+    def test_waiting_room_clock_starts_on_first_join(self):
+        puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        self.assertIsNone(puzzle.waiting_room_start_time)
+        started = lifecycle.start_due_games(timezone.now() + timedelta(hours=1))
+        self.assertNotIn(puzzle.code, [p['code'] for p in started])
+
+        joining.join(puzzle, 'First')
+        puzzle.refresh_from_db()
+        opened = puzzle.waiting_room_start_time
+        self.assertIsNotNone(opened)
+        joining.join(puzzle, 'Second')
+        puzzle.refresh_from_db()
+        self.assertEqual(puzzle.waiting_room_start_time, opened)
+
+    def test_due_waiting_rooms_start_together(self):
+        started = lifecycle.start_due_games()
+        self.assertEqual([p['code'] for p in started], [self.due.code])
+        self.due.refresh_from_db()
+        self.fresh.refresh_from_db()
+        self.assertEqual((self.due.status, self.fresh.status), ('in_progress', 'waiting'))
+        self.assertEqual(self.due.version, 1)
+
+    def test_expired_games_end(self):
+        lifecycle.start_due_games()
+        self.assertEqual(lifecycle.end_expired_games(), [])
+        ended = lifecycle.end_expired_games(timezone.now() + timedelta(minutes=31))
+        self.assertEqual([p['code'] for p in ended], [self.due.code])
+        self.due.refresh_from_db()
+        self.assertEqual((self.due.status, self.due.is_active), ('completed', False))
+
+    def test_scheduler_waits_for_deadlines(self):
+        scheduler = lifecycle.LifecycleScheduler()
+        now = timezone.now()
+        self.assertEqual(scheduler.run_pending(now), (1, 0))
+        # Only the fresh room and the started game remain, neither is due yet
+        self.assertEqual(scheduler.run_pending(now + timedelta(seconds=1)), (0, 0))
+        self.assertEqual(scheduler.run_pending(now + timedelta(seconds=55)), (1, 0))
+        self.assertEqual(scheduler.run_pending(now + timedelta(minutes=31)), (0, 2))
+
+    def test_get_puzzle_has_no_side_effects(self):
+        add_snapshot(self.due)
+        self.client.post(
+            reverse('join_puzzle'),
+            data=json.dumps({'code': self.due.code, 'display_name': 'Player1'}),
+            content_type='application/json'
+        )
+        response = self.client.get(reverse('get_puzzle', args=[self.due.code]))
+        self.assertEqual(response.json()['status'], 'waiting')
+        self.due.refresh_from_db()
+        self.assertEqual(self.due.status, 'waiting')
+
+class MaintenanceTests(TestCase):
+    def _running_puzzle(self, joined_minutes_ago):
+        puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        word = Word.objects.create(
+            puzzle=puzzle, word="TEST", hint="Hint", direction="across", start_row=0, start_col=0
+        )
+        player = Player.objects.create(display_name="Player1", puzzle=puzzle)
+        puzzle.start_game()
+        Player.objects.filter(pk=player.pk).update(joined_at=timezone.now() - timedelta(minutes=joined_minutes_ago))
+        return puzzle, word, player
+
+    def test_inactive_players_swept_and_empty_games_ended(self):
+        stale, _, stale_player = self._running_puzzle(40)
+        fresh, _, fresh_player = self._running_puzzle(5)
+
+        tasks.cleanup_inactive_players()
+
+        stale_player.refresh_from_db()
+        fresh_player.refresh_from_db()
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale_player.is_active, fresh_player.is_active), (False, True))
+        self.assertEqual(stale_player.version, stale.version - 1)
+        self.assertEqual((stale.status, fresh.status), ('completed', 'in_progress'))
+
+    def _completed_puzzles(self, count):
+        puzzles = []
+        for _ in range(count):
+            puzzle, word, player = self._running_puzzle(0)
+            submission.claim_word(puzzle.id, word.id, player.id)
+            puzzle.end_game()
+            puzzles.append(puzzle)
+        return puzzles
+
+    def test_old_puzzles_archived_in_batches(self):
+        puzzles = self._completed_puzzles(3)
+        CrosswordPuzzle.objects.filter(pk__in=[p.pk for p in puzzles[:2]]).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+        cutoff = timezone.now() - timedelta(days=1)
+
+        self.assertEqual(tasks.archive_old_puzzles(cutoff, batch_size=1, max_batches=1), 1)
+        self.assertEqual(tasks.archive_old_puzzles(cutoff, batch_size=1), 1)
+        self.assertEqual(list(CrosswordPuzzle.objects.values_list('pk', flat=True)), [puzzles[2].pk])
+        self.assertEqual((Word.objects.count(), Player.objects.count(), SolvedWord.objects.count()), (1, 1, 1))
+
+        document = archive.load(puzzles[0].code)
+        self.assertEqual(document['words'][0][:3], ['TEST', 'Hint', 'across'])
+        self.assertEqual(document['players'][0][:2], ['Player1', 1])
+        self.assertEqual([entry[:2] for entry in document['timeline']], [[0, 0]])
+
+    def test_archived_codes_are_not_reused_or_block_archiving(self):
+        puzzles = self._completed_puzzles(2)
+        PuzzleArchive.objects.create(code=puzzles[0].code, created_at=timezone.now(), format=archive.FORMAT_VERSION, data=b'')
+        CrosswordPuzzle.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(tasks.archive_old_puzzles(timezone.now() - timedelta(days=1), batch_size=1), 1)
+        self.assertEqual(list(CrosswordPuzzle.objects.values_list('pk', flat=True)), [puzzles[0].pk])
+
+        taken = uuid.UUID(f'{puzzles[1].code}-0000-4000-8000-000000000000')
+        with mock.patch('crossword.models.uuid.uuid4', side_effect=[taken, uuid.UUID(int=1)]):
+            self.assertEqual(generate_code(), '00000000')
+
+    def test_delete_puzzles_runs_one_delete_per_table(self):
+        puzzles = self._completed_puzzles(2)
+        add_snapshot(puzzles[0])
+        player = Player.objects.filter(puzzle=puzzles[0]).get()
+        player.correct_words.add(*puzzles[0].words.all())
+
+        with self.assertNumQueries(6):
+            deleted = archive.delete_puzzles([p.pk for p in puzzles])
+        self.assertEqual(deleted, {'puzzles': 2, 'words': 2, 'players': 2, 'solved_words': 2})
+        self.assertFalse(CrosswordPuzzle.objects.exists())
+        self.assertFalse(PuzzleSnapshot.objects.exists())
+
+    def test_leaderboard_renders_archived_game(self):
+        puzzle = self._completed_puzzles(1)[0]
+        archive.archive_puzzles([puzzle.pk])
+        self.assertFalse(CrosswordPuzzle.objects.exists())
+
+        response = self.client.get(reverse('leaderboard', args=[puzzle.code]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['puzzle']['status'], 'completed')
+        self.assertEqual(
+            [(p['display_name'], p['points'], p['words_solved']) for p in response.context['players']],
+            [('Player1', 1, 1)]
+        )
+
+class BenchmarkCommandTests(TestCase):
+    def test_reports_every_endpoint_and_cleans_up(self):
+        output = io.StringIO()
+        call_command('benchmark', rooms=1, players=3, ticks=2, guess_rate=1, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(
+            set(report['endpoints']),
+            {'create_puzzle', 'join_puzzle', 'start_game', 'get_puzzle', 'get_players', 'submit_word', 'leaderboard'}
+        )
+        self.assertEqual(report['endpoints']['join_puzzle']['requests'], 3)
+        self.assertIn('p99', report['endpoints']['get_puzzle']['latency_ms'])
+        self.assertFalse(CrosswordPuzzle.objects.exists())
+
+    def test_refuses_configured_database_without_flag(self):
+        # Outside the test runner the command sets up its own test environment
+        with mock.patch('crossword.management.commands.benchmark.setup_test_environment'), \
+                mock.patch('crossword.management.commands.benchmark.teardown_test_environment'):
+            with self.assertRaises(CommandError):
+                call_command('benchmark', rooms=1, players=1, ticks=1, stdout=io.StringIO())
+        self.assertFalse(CrosswordPuzzle.objects.exists())
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.registry.reset()
+        self.puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+
+    @override_settings(CROSSWORD_METRICS={'ALLOWED_IPS': ['127.0.0.1']})
+    def test_requests_recorded_with_query_counts(self):
+        self.client.get(reverse('leaderboard', args=[self.puzzle.code]))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('crossword_requests_total{view="leaderboard",status="200"} 1', body)
+        self.assertIn('crossword_request_duration_seconds_count{view="leaderboard"} 1', body)
+        self.assertIn('crossword_db_queries_per_request_count{view="leaderboard"} 1', body)
+        self.assertIn('crossword_cache_lookups_total{prefix="leaderboard_",result="misses"}', body)
+
+    @override_settings(CROSSWORD_METRICS={})
+    def test_closed_without_token_or_allowed_ips(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(CROSSWORD_METRICS={'SAMPLE_RATE': 0, 'SLOW_REQUEST_MS': 0, 'TOKEN': 'secret'})
+    def test_token_sampling_and_slow_log(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with self.assertLogs('crossword.instrumentation', 'WARNING') as logs:
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('queries not sampled', logs.output[0])
+        self.assertNotIn('crossword_db_queries_per_request_count', response.content.decode())
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        self.word = Word.objects.create(
+            puzzle=self.puzzle, word="TEST", hint="Hint", direction="across", start_row=0, start_col=0
+        )
+        add_snapshot(self.puzzle)
+        self.client.post(
+            reverse('join_puzzle'),
+            data=json.dumps({'code': self.puzzle.code, 'display_name': 'TestPlayer'}),
+            content_type='application/json'
+        )
+        self.puzzle.start_game()
+        self.async_client = AsyncClient()
+        self.async_client.cookies = self.client.cookies
+
+    def test_hot_endpoints_are_coroutines(self):
+        for view in (views.get_puzzle, views.get_players, views.submit_word):
+            self.assertTrue(asyncio.iscoroutinefunction(view), view.__name__)
+
+    async def test_poll_and_guess_over_asgi(self):
+        response = await self.async_client.get(reverse('get_puzzle', args=[self.puzzle.code]))
+        self.assertEqual(response.json()['status'], 'in_progress')
+
+        response = await self.async_client.post(
+            reverse('submit_word', args=[self.puzzle.code]),
+            data=json.dumps({'word': 'nope'}), content_type='application/json'
+        )
+        self.assertEqual(response.json()['error'], 'Incorrect word')
+        response = await self.async_client.post(
+            reverse('submit_word', args=[self.puzzle.code]),
+            data=json.dumps({'word': 'test'}), content_type='application/json'
+        )
+        self.assertEqual(response.json(), {'success': True, 'id': self.word.id, 'points': 1})
+
+        response = await self.async_client.get(reverse('get_players', args=[self.puzzle.code]))
+        self.assertEqual(response.json()['players'][0]['points'], 1)
+
+class AnswerIndexTests(TestCase):
+    def setUp(self):
+        self.puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        self.word = Word.objects.create(
+            puzzle=self.puzzle,
+            word="test",
+            hint="A test word",
+            direction="across",
+            start_row=0,
+            start_col=0
+        )
+        self.player = Player.objects.create(display_name="Player1", puzzle=self.puzzle)
+
+    def test_waiting_puzzle_is_not_indexed(self):
+        index = answers.get_index(self.puzzle.code)
+        self.assertFalse(index.in_progress)
+        self.assertIsNone(index.lookup('TEST'))
+
+    def test_running_game_is_indexed(self):
+        self.puzzle.start_game()
+        index = answers.get_index(self.puzzle.code)
+        self.assertTrue(index.in_progress)
+        self.assertEqual(index.lookup(' test '), self.word.id)
+        self.assertIsNone(index.lookup('WRONG'))
+
+    def test_wrong_guess_skips_database(self):
+        self.puzzle.start_game()
+        answers.get_index(self.puzzle.code)
+        with self.assertNumQueries(0):
+            index = answers.get_index(self.puzzle.code)
+            self.assertIsNone(index.lookup('WRONG'))
+
+    def test_solved_word_marks_index(self):
+        self.puzzle.start_game()
+        SolvedWord.objects.create(puzzle=self.puzzle, word=self.word, solved_by=self.player)
+        self.assertTrue(answers.get_index(self.puzzle.code).is_solved(self.word.id))
+
+    def test_unknown_puzzle(self):
+        self.assertIsNone(answers.get_index('missing0'))
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        self.cache = TieredCache(f'tiered-test-{uuid.uuid4()}', {
+            'OPTIONS': {
+                'L2_BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCAL_TIMEOUT': 5,
+                'PREFIX_POLICIES': {
+                    'puzzle_data_': {'timeout': 10, 'local_timeout': 1},
+                    'ratelimit:': {'local_timeout': 0},
+                },
+            },
+        })
+
+    def test_hits_are_served_from_l1(self):
+        self.cache.set('puzzle_data_abc', {'rows': 5})
+        self.assertEqual(self.cache.get('puzzle_data_abc'), {'rows': 5})
+        self.assertIsNone(self.cache.get('puzzle_data_missing'))
+        stats = self.cache.stats.snapshot()['puzzle_data_']
+        self.assertEqual((stats['l1_hits'], stats['l2_hits'], stats['misses']), (1, 0, 1))
+
+    def test_l1_miss_falls_back_to_l2(self):
+        self.cache.set('leaderboard_abc', [1, 2])
+        self.cache._l1.clear()
+        self.assertEqual(self.cache.get('leaderboard_abc'), [1, 2])
+        self.assertEqual(self.cache.stats.snapshot()['other']['l2_hits'], 1)
+        self.assertTrue(self.cache._l1.has_key('leaderboard_abc'))
+
+    async def test_async_reads_skip_l2_on_local_hit(self):
+        await self.cache.aset('puzzle_data_abc', {'rows': 5})
+        with mock.patch.object(self.cache._l2, 'aget') as l2_get:
+            self.assertEqual(await self.cache.aget('puzzle_data_abc'), {'rows': 5})
+        l2_get.assert_not_called()
+        self.cache._l1.clear()
+        self.assertEqual(await self.cache.aget('puzzle_data_abc'), {'rows': 5})
+        self.assertEqual(self.cache.stats.snapshot()['puzzle_data_']['l2_hits'], 1)
+
+    def test_prefix_policy_timeouts(self):
+        self.assertEqual(self.cache._timeouts('puzzle_data_abc', DEFAULT_TIMEOUT), ('puzzle_data_', 10, 1))
+        self.assertEqual(self.cache._timeouts('ratelimit:x', 60), ('ratelimit:', 60, 0))
+        self.assertEqual(self.cache._timeouts('other_key', 3), ('other', 3, 3))
+
+    def test_counters_bypass_l1(self):
+        self.cache.set('ratelimit:x', 1, 60)
+        self.assertFalse(self.cache._l1.has_key('ratelimit:x'))
+        self.assertEqual(self.cache.incr('ratelimit:x'), 2)
+
+    def test_delete_clears_both_tiers(self):
+        self.cache.set('puzzle_data_abc', 1)
+        self.cache.delete('puzzle_data_abc')
+        self.assertIsNone(self.cache.get('puzzle_data_abc'))
+
+class DatabaseCacheTests(TestCase):
+    def setUp(self):
+        call_command('createcachetable', 'crossword_test_cache', verbosity=0)
+        self.cache = DatabaseCache('crossword_test_cache', {})
+
+    def test_add_only_takes_missing_or_expired_keys(self):
+        self.assertTrue(self.cache.add('rebuild:x', 1, 60))
+        self.assertFalse(self.cache.add('rebuild:x', 2, 60))
+        self.assertEqual(self.cache.get('rebuild:x'), 1)
+        with mock.patch('crossword.cache_backends.tz_now', return_value=timezone.now() + timedelta(seconds=120)):
+            self.assertTrue(self.cache.add('rebuild:x', 3, 60))
+        self.assertEqual(self.cache.get('rebuild:x'), 3)
+
+    def test_incr_and_decr(self):
+        self.cache.set('ratelimit:x', 1, 60)
+        self.assertEqual(self.cache.incr('ratelimit:x', 2), 3)
+        self.assertEqual(self.cache.decr('ratelimit:x'), 2)
+        self.assertEqual(self.cache.get('ratelimit:x'), 2)
+        with self.assertRaises(ValueError):
+            self.cache.incr('ratelimit:missing')
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        self.limiter = ratelimit.SlidingWindowLimiter('test', limit=10, period=60, storage=ratelimit.MemoryStorage())
+
+    def test_blocks_after_limit(self):
+        results = [self.limiter.hit('1.2.3.4', now=120.0)[0] for _ in range(12)]
+        self.assertEqual(results, [True] * 10 + [False] * 2)
+        self.assertEqual(self.limiter.hit('1.2.3.4', now=130.0), (False, 50))
+        # Other clients are unaffected
+        self.assertTrue(self.limiter.hit('5.6.7.8', now=130.0)[0])
+
+    def test_previous_window_decays(self):
+        for _ in range(10):
+            self.limiter.hit('1.2.3.4', now=170.0)
+        # Halfway through the next window half of the old hits still count
+        allowed = [self.limiter.hit('1.2.3.4', now=210.0)[0] for _ in range(6)]
+        self.assertEqual(allowed, [True] * 5 + [False])
+
+    def test_clients_under_threshold_skip_shared_store(self):
+        storage = mock.Mock(wraps=ratelimit.MemoryStorage())
+        limiter = ratelimit.SlidingWindowLimiter('test', limit=100, period=60, storage=storage)
+        for _ in range(6):
+            self.assertTrue(limiter.hit('1.2.3.4', now=120.0)[0])
+        # First hit reads both windows, the next five stay local
+        self.assertEqual(storage.incr.call_count, 1)
+        limiter.hit('1.2.3.4', now=121.0)
+        self.assertEqual(storage.incr.call_count, 2)
+        self.assertEqual(storage.get('ratelimit:test:1.2.3.4:2'), 7)
+
+    @override_settings(CROSSWORD_RATE_LIMITS={'scoped': {'limit': 3, 'period': 10}})
+    def test_settings_override_defaults(self):
+        limiter = ratelimit.get_limiter('scoped', 100, 3600)
+        self.assertEqual((limiter.limit, limiter.period), (3, 10))
+
+@override_settings(CACHES=LOCAL_CACHES)
+class PlayerIdentityTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.puzzle = CrosswordPuzzle.objects.create(rows=15, cols=15, duration=30)
+        Word.objects.create(
+            puzzle=self.puzzle,
+            word="TEST",
+            hint="A test word",
+            direction="across",
+            start_row=0,
+            start_col=0
+        )
+        add_snapshot(self.puzzle)
+        self.client.post(
+            reverse('join_puzzle'),
+            data=json.dumps({'code': self.puzzle.code, 'display_name': 'TestPlayer'}),
+            content_type='application/json'
+        )
+        self.player = Player.objects.get(puzzle=self.puzzle)
+
+    def test_session_carries_identity(self):
+        session = self.client.session
+        self.assertEqual(session['player_id'], str(self.player.id))
+        self.assertEqual(session['puzzle_id'], self.puzzle.id)
+        self.assertEqual(session['puzzle_code'], self.puzzle.code)
+        self.assertEqual(session['display_name'], 'TestPlayer')
+
+    def test_polling_needs_no_queries(self):
+        self.client.get(reverse('get_puzzle', args=[self.puzzle.code]))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('get_puzzle', args=[self.puzzle.code]))
+        self.assertEqual(response.json()['player_id'], str(self.player.id))
+
+    def test_identity_built_from_session(self):
+        identity.forget(self.player.id)
+        request = mock.Mock(session={name: self.client.session[name] for name in identity.SESSION_FIELDS})
+        with self.assertNumQueries(1):
+            # Only is_active is looked up
+            player = identity.resolve(request)
+        self.assertEqual(
+            (player.id, player.puzzle_id, player.puzzle_code, player.display_name, player.is_active),
+            (self.player.id, self.puzzle.id, self.puzzle.code, 'TestPlayer', True)
+        )
+        with self.assertNumQueries(0):
+            identity.resolve(request)
+
+    def test_session_without_identity_fields_is_rejected(self):
+        request = mock.Mock(session={'player_id': str(self.player.id)})
+        self.assertIsNone(identity.resolve(request))
+
+    def test_deleted_player_is_rejected(self):
+        identity.forget(self.player.id)
+        self.player.delete()
+        response = self.client.get(reverse('get_puzzle', args=[self.puzzle.code]))
+        self.assertEqual(response.status_code, 401)
+
+class PuzzleLayoutTests(TestCase):
+    def word(self, word, direction, row, col):
+        return {'word': word, 'hint': f'Hint for {word}', 'direction': direction, 'startRow': row, 'startCol': col}
+
+    def test_crossing_words_must_agree(self):
+        cleaned = validate_layout(10, 10, [self.word('cat', 'across', 0, 0), self.word('car', 'down', 0, 0)])
+        self.assertEqual([w['word'] for w in cleaned], ['CAT', 'CAR'])
+
+        with self.assertRaisesMessage(ValidationError, 'conflicts with'):
+            validate_layout(10, 10, [self.word('cat', 'across', 0, 0), self.word('dog', 'down', 0, 1)])
+
+    def test_bounds_and_duplicates(self):
+        with self.assertRaisesMessage(ValidationError, 'beyond puzzle width'):
+            validate_layout(5, 5, [self.word('toolong', 'across', 0, 0)])
+        with self.assertRaisesMessage(ValidationError, 'exceeds puzzle dimensions'):
+            validate_layout(5, 5, [self.word('cat', 'down', -1, 0)])
+        with self.assertRaisesMessage(ValidationError, 'more than once'):
+            validate_layout(10, 10, [self.word('cat', 'across', 0, 0), self.word('cat', 'across', 5, 0)])
+
+    def test_words_inserted_in_one_statement(self):
+        words = [self.word(chr(65 + i) * 10, 'across', i * 2, 0) for i in range(25)]
+        with self.assertNumQueries(7):
+            # Savepoint, archived code check, code uniqueness check, puzzle insert, word bulk insert, snapshot insert, release
+            puzzle = CrosswordPuzzle.objects.create_with_words(50, 50, 30, words)
+        self.assertEqual(puzzle.words.count(), len(words))
+
+    def test_invalid_layout_creates_nothing(self):
+        response = self.client.post(
+            reverse('create_puzzle'),
+            data=json.dumps({
+                'rows': 10, 'cols': 10,
+                'words': [self.word('cat', 'across', 0, 0), self.word('dog', 'down', 0, 1)],
+            }),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CrosswordPuzzle.objects.exists())
+
+class LayoutGeneratorTests(TestCase):
+    WORDS = ['PYTHON', 'DJANGO', 'GRID', 'HINT', 'CLUE', 'PUZZLE', 'ACROSS', 'DOWN', 'LETTER', 'ANSWER']
+
+    def entries(self, words):
+        return [{'word': word, 'hint': f'Hint for {word}'} for word in words]
+
+    def assert_connected(self, placed):
+        cells = {}
+        for word in placed:
+            for cell in word_cells(word['word'], word['direction'], word['startRow'], word['startCol']):
+                cells.setdefault(cell[:2], set()).add(word['word'])
+        groups = {word['word']: {word['word']} for word in placed}
+        for owners in cells.values():
+            merged = set().union(*(groups[owner] for owner in owners))
+            for owner in merged:
+                groups[owner] = merged
+        self.assertEqual(len(next(iter(groups.values()))), len(placed))
+
+    def test_layout_is_valid_and_connected(self):
+        layout = generator.generate_layout(15, 15, self.entries(self.WORDS))
+        self.assertTrue(layout['complete'])
+        self.assertEqual([w['word'] for w in layout['words']], self.WORDS)
+        validate_layout(15, 15, layout['words'])
+        self.assert_connected(layout['words'])
+
+    def test_words_that_cannot_cross_are_reported(self):
+        layout = generator.generate_layout(10, 10, self.entries(['CAT', 'ACT', 'XYZ', 'TOOLONGFORTHEGRID']))
+        self.assertFalse(layout['complete'])
+        self.assertEqual([w['word'] for w in layout['unplaced']], ['XYZ', 'TOOLONGFORTHEGRID'])
+        validate_layout(10, 10, layout['words'])
+
+    def test_large_grid_within_budget(self):
+        rng = random.Random(7)
+        letters = 'EEEEAAARRIIOOTTNNSSLCUDPMHGBFYWKV'
+        words = sorted({''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(200)})
+        started = time.perf_counter()
+        layout = generator.generate_layout(50, 50, self.entries(words[:200]))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertGreater(len(layout['words']), 100)
+        validate_layout(50, 50, layout['words'])
+        self.assert_connected(layout['words'])
+
+    def test_generated_layout_creates_puzzle(self):
+        response = self.client.post(
+            reverse('generate_layout'),
+            data=json.dumps({'rows': 15, 'cols': 15, 'words': self.entries(self.WORDS)}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        layout = response.json()
+        response = self.client.post(
+            reverse('create_puzzle'),
+            data=json.dumps({'rows': layout['rows'], 'cols': layout['cols'], 'words': layout['words']}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(
+            reverse('generate_layout'),
+            data=json.dumps({'rows': 15, 'cols': 15, 'words': [{'word': 'C4T', 'hint': 'x'}]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+class TemplateFillTests(TestCase):
+    # Rows BAT ONE WED read down as BOW ANE TED
+    SQUARE = ['BAT', 'ONE', 'WED', 'BOW', 'ANE', 'TED']
+
+    def entries(self, words):
+        return [{'word': word, 'hint': f'Hint for {word}'} for word in words]
+
+    def test_index_matches_patterns(self):
+        index = fill.WordIndex(['CAT', 'COT', 'DOG', 'CATS'])
+        self.assertEqual(index.matches(['C', '', 'T']), 0b011)
+        self.assertEqual(index.matches(['', 'O', '']), 0b110)
+        self.assertEqual(index.matches(['', '', '', 'S']), 0b1)
+        self.assertEqual(index.matches(['X', '', '']), 0)
+
+    def test_fills_every_slot_with_distinct_words(self):
+        dictionary = self.entries(['BAD', 'ODE', 'TEN', 'BEE', 'ATE'] + self.SQUARE)
+        rows, cols, words = fill.fill_template([[0, 0, 0], [0, 0, 0], [0, 0, 0]], dictionary)
+        self.assertEqual((rows, cols), (3, 3))
+        self.assertEqual(len(words), 6)
+        self.assertEqual(len({w['word'] for w in words}), 6)
+        self.assertEqual(words[0]['hint'], f"Hint for {words[0]['word']}")
+        validate_layout(rows, cols, words)
+
+    def test_blocks_split_slots(self):
+        slots = fill.find_slots([[0, 0, 1, 0, 0], [0, 1, 1, 1, 0], [0, 0, 0, 0, 0]])
+        self.assertEqual(
+            [(s.direction, s.row, s.col, len(s.cells)) for s in slots],
+            [('across', 0, 0, 2), ('across', 0, 3, 2), ('across', 2, 0, 5), ('down', 0, 0, 3), ('down', 0, 4, 3)]
+        )
+
+    def test_unfillable_template_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'cannot fill'):
+            fill.fill_template([[0, 0, 0], [0, 0, 0], [0, 0, 0]], self.entries(['BAT', 'ONE', 'WED', 'BOW']))
+        with self.assertRaisesMessage(ValidationError, 'same length'):
+            fill.fill_template([[0, 0], [0]], self.entries(['AB']))
+
+    def test_fill_endpoint(self):
+        response = self.client.post(
+            reverse('fill_template'),
+            data=json.dumps({'grid': [[0, 0, 0], [0, 0, 0], [0, 0, 0]], 'words': self.entries(self.SQUARE)}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(
+            reverse('create_puzzle'), data=response.content, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.puzzle = CrosswordPuzzle.objects.create_with_words(10, 10, 30, [
+            {'word': 'cat', 'hint': 'Pet', 'direction': 'across', 'startRow': 0, 'startCol': 0},
+            {'word': 'car', 'hint': 'Vehicle', 'direction': 'down', 'startRow': 0, 'startCol': 0},
+        ])
+        self.client.post(
+            reverse('join_puzzle'),
+            data=json.dumps({'code': self.puzzle.code, 'display_name': 'Player1'}),
+            content_type='application/json'
+        )
+        self.url = self.client.get(reverse('get_puzzle', args=[self.puzzle.code])).json()['snapshot_url']
+        self.etag = self.puzzle.snapshot.etag
+
+    def test_compiled_at_creation(self):
+        data = json.loads(gzip.decompress(self.puzzle.snapshot.data))
+        self.assertEqual(data['format'], snapshots.FORMAT_VERSION)
+        self.assertEqual(
+            [(s['number'], s['direction'], s['length'], s['hint']) for s in data['slots']],
+            [(1, 'across', 3, 'Pet'), (1, 'down', 3, 'Vehicle')]
+        )
+        self.assertEqual(self.url, reverse('puzzle_snapshot', args=[self.puzzle.code, self.etag]))
+        # Same content, same ETag
+        words = list(self.puzzle.words.order_by('id').values(*snapshots.WORD_FIELDS))
+        self.assertEqual(snapshots.compile_snapshot(10, 10, words)[0], self.etag)
+
+    def test_answers_never_leave_the_server_unsolved(self):
+        self.assertNotIn(b'CAT', gzip.decompress(self.puzzle.snapshot.data))
+        self.assertNotIn(b'CAT', self.client.get(reverse('get_puzzle', args=[self.puzzle.code])).content)
+
+        self.puzzle.start_game()
+        index = answers.build_index(self.puzzle.code)
+        self.assertNotIn('CAT', index.answers)
+        self.assertEqual(index.lookup(' cat '), self.puzzle.words.get(word='CAT').id)
+        self.assertIsNone(index.lookup('DOG'))
+
+    def test_missing_snapshot_compiled_once_on_first_read(self):
+        puzzle = CrosswordPuzzle.objects.create(rows=5, cols=5, duration=30)
+        Word.objects.create(puzzle=puzzle, word='DOG', hint='Pet', direction='down', start_row=0, start_col=2)
+        with self.assertLogs('crossword.views', 'WARNING'):
+            response = self.client.get(reverse('get_puzzle', args=[puzzle.code]))
+        self.assertEqual(response.status_code, 200)
+        snapshot = PuzzleSnapshot.objects.get(puzzle=puzzle)
+        self.assertEqual(response.json()['snapshot_url'], reverse('puzzle_snapshot', args=[puzzle.code, snapshot.etag]))
+
+        cache.clear()
+        with self.assertNoLogs('crossword.views', 'WARNING'):
+            self.client.get(reverse('get_puzzle', args=[puzzle.code]))
+
+    def test_admin_word_edits_recompile_the_snapshot(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        admin_client = Client()
+        admin_client.login(username='admin', password='password')
+        word = self.puzzle.words.get(word='CAT')
+        version = CrosswordPuzzle.objects.get(pk=self.puzzle.pk).version
+
+        response = admin_client.post(reverse('admin:crossword_word_change', args=[word.pk]), {
+            'puzzle': self.puzzle.pk, 'word': 'cow', 'hint': 'Farm animal',
+            'direction': 'across', 'start_row': 0, 'start_col': 0,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.puzzle.refresh_from_db()
+        self.assertNotEqual(self.puzzle.snapshot.etag, self.etag)
+        self.assertIn(b'Farm animal', gzip.decompress(self.puzzle.snapshot.data))
+        self.assertEqual(self.puzzle.version, version + 1)
+
+    def test_served_pre_encoded_with_long_lived_headers(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], f'"{self.etag}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response.content, bytes(self.puzzle.snapshot.data))
+
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.json()['rows'], 10)
+
+    def test_revalidation_and_unknown_etag(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.etag}"')
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(reverse('puzzle_snapshot', args=[self.puzzle.code, 'f' * 32]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_polling_no_longer_loads_words(self):
+        cache.clear()
+        response = self.client.get(reverse('get_puzzle', args=[self.puzzle.code]))
+        self.assertNotIn('words', response.json())
+
+class EventBusTests(TestCase):
+    def setUp(self):
+        self.puzzle = CrosswordPuzzle.objects.create(rows=5, cols=5, duration=30, status='in_progress', start_time=timezone.now())
+        self.word = Word.objects.create(puzzle=self.puzzle, word='CAT', hint='Pet', direction='across', start_row=0, start_col=0)
+        self.code = self.puzzle.code
+
+    def test_events_of_a_transaction_are_handled_together(self):
+        with mock.patch('crossword.events.cache.delete_many') as delete_many, \
+                mock.patch('crossword.handlers.broadcast.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with transaction.atomic():
+                    for i in range(50):
+                        events.emit(events.PlayerJoined(self.puzzle.pk, self.code, i, f'Player{i}'))
+                    # Nothing happens before the commit
+                    publish.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(publish.call_count, 50)
+        delete_many.assert_called_once_with([f'puzzle_data_{self.code}:fresh'])
+
+    def test_rolled_back_events_are_dropped(self):
+        with mock.patch('crossword.events.cache.delete_many') as delete_many, \
+                mock.patch('crossword.handlers.broadcast.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        events.emit(events.PlayerJoined(self.puzzle.pk, self.code, 1, 'Gone'))
+                        raise IntegrityError
+                except IntegrityError:
+                    pass
+                with transaction.atomic():
+                    events.emit(events.GameEnded(self.puzzle.pk, self.code))
+        publish.assert_called_once_with(self.code, broadcast.EVENT_GAME_ENDED)
+        delete_many.assert_called_once_with([f'leaderboard_{self.code}:fresh', f'puzzle_data_{self.code}:fresh'])
+
+    def test_events_after_a_released_savepoint_are_delivered(self):
+        with mock.patch('crossword.handlers.broadcast.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    with transaction.atomic():
+                        events.emit(events.PlayerJoined(self.puzzle.pk, self.code, 1, 'Inner'))
+                    events.emit(events.PlayerJoined(self.puzzle.pk, self.code, 2, 'Outer'))
+        self.assertEqual(publish.call_count, 2)
+
+    def test_solving_every_word_ends_the_game(self):
+        player = Player.objects.create(display_name='Solver', puzzle=self.puzzle)
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.claim_word(self.puzzle.id, self.word.id, player.id)
+            events.emit(events.WordSolved(self.puzzle.pk, self.code, self.word.id))
+        self.puzzle.refresh_from_db()
+        self.assertEqual(self.puzzle.status, 'completed')
+
+    def test_first_player_to_join_is_creator(self):
+        self.puzzle.status = 'waiting'
+        self.puzzle.start_time = None
+        self.puzzle.save()
+        for name in ('First', 'Second'):
+            self.client.post(
+                reverse('join_puzzle'),
+                data=json.dumps({'code': self.code, 'display_name': name}),
+                content_type='application/json'
+            )
+        self.assertEqual(
+            list(self.puzzle.players.order_by('joined_at').values_list('is_creator', flat=True)), [True, False]
+        )
+
+class JoinTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.puzzle = CrosswordPuzzle.objects.create(rows=5, cols=5, duration=30)
+
+    def _join(self, name):
+        return self.client.post(
+            reverse('join_puzzle'),
+            data=json.dumps({'code': self.puzzle.code, 'display_name': name}),
+            content_type='application/json'
+        )
+
+    def test_taken_name_is_rejected_by_the_constraint(self):
+        self.assertEqual(self._join('Alice').status_code, 200)
+        response = self._join('Alice')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name_taken', response.json()['error'])
+        self.puzzle.refresh_from_db()
+        # A taken name never reaches the version bump
+        self.assertEqual((self.puzzle.version, self.puzzle.players.count()), (1, 1))
+
+    def test_creator_without_returning(self):
+        with mock.patch('crossword.joining.supports_returning', return_value=False):
+            first = joining.join(self.puzzle, 'First')
+            second = joining.join(self.puzzle, 'Second')
+            with self.assertRaises(ValidationError):
+                joining.join(self.puzzle, 'First')
+        self.assertEqual((first.is_creator, second.is_creator), (True, False))
+
+    def test_one_creator_per_puzzle(self):
+        Player.objects.create(display_name='First', puzzle=self.puzzle, is_creator=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Player.objects.create(display_name='Second', puzzle=self.puzzle, is_creator=True)
+
+    def test_join_losing_the_creator_race_joins_as_player(self):
+        insert = joining._insert_player
+        attempts = []
+
+        def racing_insert(puzzle_id, display_name, now, may_create):
+            attempts.append(may_create)
+            if may_create:
+                raise IntegrityError('player_one_creator')
+            return insert(puzzle_id, display_name, now, may_create)
+
+        with mock.patch('crossword.joining._insert_player', racing_insert):
+            player = joining.join(self.puzzle, 'Second')
+        self.assertEqual(attempts, [True, False])
+        self.assertFalse(player.is_creator)
+        self.puzzle.refresh_from_db()
+        self.assertEqual(Player.objects.get(pk=player.pk).version, self.puzzle.version)
+
+    @override_settings(CROSSWORD_ROOM_CAPACITY=3)
+    def test_room_capacity(self):
+        Player.objects.create(display_name='Early', puzzle=self.puzzle)
+        self.assertEqual(self._join('Alice').status_code, 200)
+        # A rejected name gives its seat back
+        self.assertIn('name_taken', self._join('Alice').json()['error'])
+        self.assertEqual(self._join('Bob').status_code, 200)
+        response = self._join('Carol')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('room_full', response.json()['error'])
+        self.assertEqual(self.puzzle.players.count(), 3)
+
+    def test_invalid_display_name(self):
+        self.assertEqual(self._join('<script>').status_code, 400)
+        self.assertFalse(self.puzzle.players.exists())
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RecomputeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def _compute(self, value='value', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_fresh_value_is_reused_until_marked_stale(self):
+        self.assertEqual(recompute.get_or_compute('puzzle_data_x', self._compute('a'), 10), 'a')
+        self.assertEqual(recompute.get_or_compute('puzzle_data_x', self._compute('b'), 10), 'a')
+        cache.delete_many(recompute.stale_keys(['puzzle_data_x']))
+        self.assertEqual(recompute.get_or_compute('puzzle_data_x', self._compute('b'), 10), 'b')
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_value_served_while_another_request_rebuilds(self):
+        recompute.get_or_compute('puzzle_data_x', self._compute('old'), 10)
+        cache.delete_many(recompute.stale_keys(['puzzle_data_x']))
+        cache.add(recompute.lock_key('puzzle_data_x'), 1)
+        self.assertEqual(recompute.get_or_compute('puzzle_data_x', self._compute('new'), 10), 'old')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        compute = self._compute('value', delay=0.1)
+        threads = [
+            threading.Thread(target=lambda: results.append(recompute.get_or_compute('leaderboard_x', compute, 10)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_rebuild_lock_is_taken_in_the_shared_tier(self):
+        # Two processes: separate in-process tiers in front of the same shared one
+        options = settings.CACHES['default']['OPTIONS']
+        first, second = (TieredCache(f'process-{uuid.uuid4()}', {'OPTIONS': options}) for _ in range(2))
+        self.assertTrue(first.add(recompute.lock_key('leaderboard_x'), 1, recompute.REBUILD_LOCK_TIMEOUT))
+        self.assertFalse(second.add(recompute.lock_key('leaderboard_x'), 1, recompute.REBUILD_LOCK_TIMEOUT))
+        first.delete(recompute.lock_key('leaderboard_x'))
+        self.assertTrue(second.add(recompute.lock_key('leaderboard_x'), 1, recompute.REBUILD_LOCK_TIMEOUT))
+
+    def test_waiter_computes_itself_when_the_rebuild_never_lands(self):
+        cache.add(recompute.lock_key('leaderboard_x'), 1)
+        with mock.patch('crossword.recompute.WAIT_SECONDS', 0.05):
+            self.assertEqual(recompute.get_or_compute('leaderboard_x', self._compute(), 10), 'value')
+        self.assertEqual(self.calls, 1)
+
+    def test_refreshes_early_near_expiry(self):
+        recompute.get_or_compute('puzzle_data_x', self._compute('a'), 10)
+        cache.set(recompute.fresh_key('puzzle_data_x'), (1.0, time.time() + 0.5), 10)
+        # A draw this close to 1 expires a value that takes a second to compute half a second early
+        with mock.patch('crossword.recompute.random.random', return_value=0.9):
+            self.assertEqual(recompute.get_or_compute('puzzle_data_x', self._compute('b'), 10), 'b')
+
+    def test_none_is_not_cached(self):
+        self.assertIsNone(recompute.get_or_compute('leaderboard_x', self._compute(None), 10))
+        self.assertIsNone(cache.get('leaderboard_x'))
+
+    async def test_async_single_flight(self):
+        async def compute():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return 'value'
+        results = await asyncio.gather(*[recompute.aget_or_compute('puzzle_data_y', compute, 10) for _ in range(5)])
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(self.calls, 1)
+
+@override_settings(CROSSWORD_READ_REPLICAS=['replica_test'], CACHES=LOCAL_CACHES)
+class ReplicaDatabaseTests(TransactionTestCase):
+    """Routing against a second database standing in for a replica that lags behind the primary"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Added once the runner has set up the test databases, so it never creates or checks this one
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.settings['replica_test'] = {
+            **connections.settings['default'],
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.replica_path, 'OPTIONS': {},
+            'HOST': '', 'PORT': '', 'USER': '', 'PASSWORD': '',
+        }
+        cls.databases = {'default', 'replica_test'}
+        # Before the settings override, which keeps replicas out of migrations
+        call_command('migrate', database='replica_test', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_test'].close()
+        del connections['replica_test']
+        del connections.settings['replica_test']
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        cache.clear()
+        self.puzzle = CrosswordPuzzle.objects.create(rows=5, cols=5, duration=30)
+        joining.join(self.puzzle, 'Alice')
+        self.puzzle.refresh_from_db()
+
+    def tearDown(self):
+        # Only the test databases are flushed
+        CrosswordPuzzle.objects.using('replica_test').all().delete()
+
+    def _replicate(self, version, *names):
+        """Copy the puzzle to the replica as it was at version, with other players"""
+        CrosswordPuzzle.objects.using('replica_test').bulk_create([CrosswordPuzzle(
+            id=self.puzzle.id, code=self.puzzle.code, rows=5, cols=5, duration=30, status='completed', version=version
+        )])
+        Player.objects.using('replica_test').bulk_create([
+            Player(puzzle_id=self.puzzle.id, display_name=name, version=version) for name in names
+        ])
+
+    def _leaderboard_names(self):
+        response = self.client.get(reverse('leaderboard', args=[self.puzzle.code]))
+        return [player['display_name'] for player in response.context['players']]
+
+    def test_reads_are_served_by_the_replica(self):
+        self._replicate(self.puzzle.version, 'OnReplica')
+        self.assertEqual(self._leaderboard_names(), ['OnReplica'])
+        with routers.use_replicas():
+            self.assertEqual([p['display_name'] for p in ranking.build_index(self.puzzle.code).top(10)], ['OnReplica'])
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        self._replicate(self.puzzle.version - 1, 'OnReplica')
+        self.assertEqual(self._leaderboard_names(), ['Alice'])
+        with routers.use_replicas():
+            index = ranking.build_index(self.puzzle.code)
+        self.assertEqual(([p['display_name'] for p in index.top(10)], index.version), (['Alice'], self.puzzle.version))
+
+    def test_leaderboard_writes_nothing(self):
+        self._replicate(self.puzzle.version, 'OnReplica')
+        self._leaderboard_names()
+        self.puzzle.refresh_from_db()
+        self.assertTrue(self.puzzle.is_active)
+
+@override_settings(CROSSWORD_READ_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_follow_the_view_policy(self):
+        self.assertEqual(self.router.db_for_read(Player), 'default')
+        with routers.use_replicas():
+            alias = self.router.db_for_read(Player)
+            self.assertIn(alias, ['replica1', 'replica2'])
+            # One replica for the whole request
+            self.assertEqual(self.router.db_for_read(CrosswordPuzzle), alias)
+            self.assertEqual(self.router.db_for_write(Player), 'default')
+            with routers.use_primary():
+                self.assertEqual(self.router.db_for_read(Player), 'default')
+
+    def test_transactions_read_from_the_primary(self):
+        with routers.use_replicas(), mock.patch('crossword.routers.transaction.get_connection') as get_connection:
+            get_connection.return_value.in_atomic_block = True
+            self.assertEqual(self.router.db_for_read(Player), 'default')
+
+    def test_cache_table_is_read_from_the_primary(self):
+        with routers.use_replicas():
+            self.assertEqual(self.router.db_for_read(DatabaseCache('cache_table', {}).cache_model_class), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'crossword'))
+        self.assertIsNone(self.router.allow_migrate('default', 'crossword'))
+
+    def test_view_decorator(self):
+        @routers.replica_reads
+        def view(request):
+            return routers.read_alias()
+
+        @routers.replica_reads
+        async def async_view(request):
+            return routers.read_alias()
+
+        self.assertIn(view(None), ['replica1', 'replica2'])
+        self.assertIn(asyncio.run(async_view(None)), ['replica1', 'replica2'])
+        self.assertEqual(routers.read_alias(), 'default')
+
+    def test_clients_read_their_own_writes(self):
+        middleware = routers.ReadYourWritesMiddleware(lambda request: HttpResponse(routers.read_alias()))
+        factory = RequestFactory()
+
+        with routers.use_replicas():
+            self.assertNotEqual(middleware(factory.get('/')).content, b'default')
+            response = middleware(factory.post('/'))
+            self.assertEqual(response.content, b'default')
+            self.assertEqual(response.cookies[routers.STICKY_COOKIE]['max-age'], 5)
+
+            request = factory.get('/')
+            request.COOKIES[routers.STICKY_COOKIE] = '1'
+            self.assertEqual(middleware(request).content, b'default')
+
+    def test_failed_writes_do_not_pin(self):
+        middleware = routers.ReadYourWritesMiddleware(lambda request: HttpResponse(status=400))
+        self.assertNotIn(routers.STICKY_COOKIE, middleware(RequestFactory().post('/')).cookies)
+
+class ResponseEncodingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.puzzle = CrosswordPuzzle.objects.create(rows=5, cols=5, duration=30)
+        Word.objects.create(puzzle=self.puzzle, word='CAT', hint='Pet', direction='across', start_row=0, start_col=0)
+        add_snapshot(self.puzzle)
+        Player.objects.bulk_create([Player(puzzle=self.puzzle, display_name=f'Player{i}') for i in range(40)])
+        self.client.post(
+            reverse('join_puzzle'),
+            data=json.dumps({'code': self.puzzle.code, 'display_name': 'Me'}),
+            content_type='application/json'
+        )
+        self.player_id = str(self.client.session['player_id'])
+
+    def test_fields_are_spliced_into_plain_and_gzip_bodies(self):
+        document = encoding.encode({'players': list(range(1000))})
+        fields = {'player_id': '7', 'time_remaining': None}
+        self.assertEqual(json.loads(encoding.render(document, fields)), {'players': list(range(1000)), **fields})
+        body = encoding.render(document, fields, gzip=True)
+        self.assertEqual(json.loads(gzip.decompress(body)), {'players': list(range(1000)), **fields})
+        # Too small to compress
+        self.assertEqual(encoding.encode({'a': 1}).deflated, b'')
+        self.assertEqual(encoding.render(encoding.encode({'a': 1}), {}, gzip=True), b'{"a":1}')
+
+    def test_cached_puzzle_state_is_not_re_encoded(self):
+        url = reverse('get_puzzle', args=[self.puzzle.code])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual((data['player_id'], len(data['players'])), (self.player_id, 41))
+
+        with mock.patch('crossword.encoding.json.dumps', wraps=json.dumps) as dumps:
+            data = self.client.get(url).json()
+        # Only the player's own two fields and their names
+        self.assertEqual(dumps.call_count, 4)
+        self.assertEqual(data['player_id'], self.player_id)
+        self.assertIn('snapshot_url', data)
+
+    def test_shared_state_holds_no_lists_or_encoded_bodies(self):
+        url = reverse('get_puzzle', args=[self.puzzle.code])
+        version = self.client.get(url).json()['version']
+        state = cache.get(f'puzzle_data_{self.puzzle.code}')
+        self.assertEqual(state['version'], version)
+        self.assertFalse({'full', 'players', 'solved_words'} & set(state))
+
+        # Another process has the state but neither the encoded body nor, once expired, the lists
+        views._local_states.clear()
+        cache.delete(views._changes_key(self.puzzle.code, version))
+        self.assertEqual(len(self.client.get(url).json()['players']), 41)
+        cache.delete(views._changes_key(self.puzzle.code, version))
+        data = self.client.get(url, {'since': version - 1}).json()
+        self.assertEqual(([p['display_name'] for p in data['players']], data['version']), (['Me'], version))
+
+    def test_players_top_list_reused_until_standings_change(self):
+        url = reverse('get_players', args=[self.puzzle.code])
+        data = self.client.get(url, {'limit': 5}).json()
+        self.assertEqual((len(data['players']), data['total_players'], data['rank']), (5, 41, 41))
+
+        index = ranking.get_index(self.puzzle.code)
+        encoded = index.encoded_top(5)
+        self.assertIs(index.encoded_top(5), encoded)
+        me = Player.objects.get(display_name='Me')
+        index.apply(index.version + 1, me.id, points=3, last_solve_at=timezone.now())
+        self.assertIsNot(index.encoded_top(5), encoded)
+        data = self.client.get(url, {'limit': 5}).json()
+        self.assertEqual((data['players'][0]['display_name'], data['rank']), ('Me', 1))
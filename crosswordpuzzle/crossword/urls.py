@@ -11,9 +11,15 @@ urlpatterns = [
     
     # API endpoints
     path('api/create-puzzle/', views.create_puzzle, name='create_puzzle'),
+    path('api/generate-layout/', views.generate_layout, name='generate_layout'),
+    path('api/fill-template/', views.fill_template, name='fill_template'),
     path('api/join-puzzle/', views.join_puzzle, name='join_puzzle'),
     path('api/puzzle/<str:code>/', views.get_puzzle, name='get_puzzle'),
+    path('api/puzzle/<str:code>/snapshot/<str:etag>/', views.get_snapshot, name='puzzle_snapshot'),
     path('api/puzzle/<str:code>/start/', views.start_game, name='start_game'),
     path('api/puzzle/<str:code>/submit/', views.submit_word, name='submit_word'),
     path('api/puzzle/<str:code>/players/', views.get_players, name='get_players'),
+    path('api/puzzle/<str:code>/stream/', views.puzzle_stream, name='puzzle_stream'),
+
+    path('internal/metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,49 +1,89 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, Http404
+from django.urls import reverse
+from django.http import HttpResponse, JsonResponse, Http404, HttpResponseNotModified, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import transaction
+from django.db.models import F
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.conf import settings
 from django.core.cache import cache
-from functools import wraps
+import gzip
 import json
 import logging
+import threading
 import uuid
 import datetime
+import asyncio
+import time
 from datetime import timedelta
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
-from .models import CrosswordPuzzle, Word, Player, SolvedWord
+from .models import CrosswordPuzzle, Word, Player, SolvedWord, puzzle_version_key
+from . import answers, archive, broadcast, encoding, events, fill, generator, identity, instrumentation, joining, lifecycle, ranking, recompute, routers, snapshots, standings, submission
+from .ratelimit import rate_limit
+
+# Server-Sent Events stream tuning
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+STREAM_RETRY_MS = 3000
+
+def _error_response(func, e):
+    if isinstance(e, ValidationError):
+        logger.warning(f"Validation error in {func.__name__}: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=400)
+    if isinstance(e, Http404):
+        logger.warning(f"Not found error in {func.__name__}: {str(e)}")
+        return JsonResponse({'error': 'Resource not found'}, status=404)
+    logger.error(f"Unexpected error in {func.__name__}: {str(e)}", exc_info=True)
+    return JsonResponse(
+        {'error': 'An unexpected error occurred'} if settings.DEBUG else {'error': 'Internal server error'},
+        status=500
+    )
 
 def handle_error(func):
     """Decorator to handle exceptions and return appropriate JSON responses"""
+    if iscoroutinefunction(func):
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                return _error_response(func, e)
+        return async_wrapper
+
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except ValidationError as e:
-            logger.warning(f"Validation error in {func.__name__}: {str(e)}")
-            return JsonResponse({'error': str(e)}, status=400)
-        except Http404 as e:
-            logger.warning(f"Not found error in {func.__name__}: {str(e)}")
-            return JsonResponse({'error': 'Resource not found'}, status=404)
         except Exception as e:
-            logger.error(f"Unexpected error in {func.__name__}: {str(e)}", exc_info=True)
-            return JsonResponse(
-                {'error': 'An unexpected error occurred'} if settings.DEBUG else {'error': 'Internal server error'},
-                status=500
-            )
+            return _error_response(func, e)
     return wrapper
 
 def require_player(func):
     """Decorator to validate player session"""
+    if iscoroutinefunction(func):
+        async def async_wrapper(request, *args, **kwargs):
+            if not await request.session.aget('player_id'):
+                return JsonResponse({'error': 'Session expired'}, status=401)
+
+            player = await identity.aresolve(request)
+            if not player:
+                return JsonResponse({'error': 'Player not found'}, status=401)
+
+            request.player = player
+            return await func(request, *args, **kwargs)
+        return async_wrapper
+
     def wrapper(request, *args, **kwargs):
-        player_id = request.session.get('player_id')
-        if not player_id:
+        if not request.session.get('player_id'):
             return JsonResponse({'error': 'Session expired'}, status=401)
         
-        player = Player.objects.filter(id=player_id).first()
+        # Signed session plus identity cache, no query while polling
+        player = identity.resolve(request)
         if not player:
             return JsonResponse({'error': 'Player not found'}, status=401)
         
@@ -51,20 +91,6 @@ def require_player(func):
         return func(request, *args, **kwargs)
     return wrapper
 
-def rate_limit(key_prefix, limit=100, period=3600):
-    """Rate limiting decorator"""
-    def decorator(view_func):
-        @wraps(view_func)
-        def _wrapped_view(request, *args, **kwargs):
-            key = f"ratelimit:{key_prefix}:{request.META.get('REMOTE_ADDR', '')}"
-            count = cache.get(key, 0)
-            if count >= limit:
-                return JsonResponse({'error': 'Rate limit exceeded'}, status=429)
-            cache.set(key, count + 1, period)
-            return view_func(request, *args, **kwargs)
-        return _wrapped_view
-    return decorator
-
 # Create your views here.
 def home(request):
     return render(request, 'index.html')
@@ -86,11 +112,7 @@ def game(request, code):
         return redirect('home')
     
     # Get player info from session
-    player_id = request.session.get('player_id')
-    if not player_id:
-        return redirect('home')
-    
-    player = Player.objects.filter(id=player_id).first()
+    player = identity.resolve(request)
     if not player:
         return redirect('home')
     
@@ -136,60 +158,72 @@ def create_puzzle(request):
         logger.error(f"Invalid data types: {e}")
         raise ValidationError('Invalid data types for rows, cols, or duration')
 
-    if not (1 <= rows <= 50 and 1 <= cols <= 50):
+    if not (1 <= rows <= CrosswordPuzzle.MAX_ROWS and 1 <= cols <= CrosswordPuzzle.MAX_COLS):
         logger.error(f"Grid size out of range: {rows}x{cols}")
         raise ValidationError('Grid size must be between 1x1 and 50x50')
 
-    if len(words) == 0:
+    if not isinstance(words, list) or len(words) == 0:
         logger.error("No words provided")
         raise ValidationError('At least one word is required')
 
-    # Create puzzle with validation
+    # Validate every word against the grid in memory, then insert puzzle and words atomically
     try:
-        puzzle = CrosswordPuzzle.objects.create(
-            rows=rows,
-            cols=cols,
-            duration=duration,
-            status='waiting'
-        )
-        logger.info(f"Created puzzle with code: {puzzle.code}")
+        puzzle = CrosswordPuzzle.objects.create_with_words(rows, cols, duration, words)
+    except ValidationError as e:
+        logger.error(f"Invalid puzzle layout: {e}")
+        raise
     except Exception as e:
         logger.error(f"Failed to create puzzle: {e}")
         raise ValidationError(f'Failed to create puzzle: {str(e)}')
-    
-    # Create Word objects with validation
-    try:
-        for i, word_data in enumerate(words):
-            Word.objects.create(
-                puzzle=puzzle,
-                word=word_data['word'],
-                hint=word_data['hint'],
-                direction=word_data['direction'],
-                start_row=word_data['startRow'],
-                start_col=word_data['startCol']
-            )
-        logger.info(f"Created {len(words)} words for puzzle {puzzle.code}")
-    except Exception as e:
-        logger.error(f"Failed to create words: {e}")
-        # Clean up the puzzle if word creation failed
-        puzzle.delete()
-        raise ValidationError(f'Failed to create words: {str(e)}')
 
+    logger.info(f"Created puzzle {puzzle.code} with {len(words)} words")
     return JsonResponse({'code': puzzle.code})
 
+@ensure_csrf_cookie
+@require_http_methods(['POST'])
+@rate_limit('generate_layout', limit=20, period=60)
+@handle_error
+def generate_layout(request):
+    """Place a list of words and hints on the grid; the result can be posted to create_puzzle as is"""
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+
+    try:
+        rows = int(data.get('rows'))
+        cols = int(data.get('cols'))
+    except (ValueError, TypeError):
+        raise ValidationError('Invalid data types for rows or cols')
+    if not (1 <= rows <= CrosswordPuzzle.MAX_ROWS and 1 <= cols <= CrosswordPuzzle.MAX_COLS):
+        raise ValidationError('Grid size must be between 1x1 and 50x50')
+
+    layout = generator.generate_layout(rows, cols, data.get('words'))
+    return JsonResponse({'rows': rows, 'cols': cols, **layout})
+
+@ensure_csrf_cookie
+@require_http_methods(['POST'])
+@rate_limit('fill_template', limit=20, period=60)
+@handle_error
+def fill_template(request):
+    """Fill a block template from a word list; the result can be posted to create_puzzle as is"""
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+
+    rows, cols, words = fill.fill_template(
+        data.get('grid'), data.get('words'), max_rows=CrosswordPuzzle.MAX_ROWS, max_cols=CrosswordPuzzle.MAX_COLS
+    )
+    return JsonResponse({'rows': rows, 'cols': cols, 'words': words})
+
 @csrf_exempt  # Temporary for debugging
 @require_http_methods(['POST'])
 @handle_error
 def join_puzzle(request):
-    # Add debugging
-    logger.info(f"Join puzzle request received. Method: {request.method}")
-    logger.info(f"Headers: {dict(request.headers)}")
-    
     try:
         data = json.loads(request.body)
-        logger.info(f"Request data: {data}")
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error: {e}")
+    except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     
     code = data.get('code')
@@ -198,7 +232,9 @@ def join_puzzle(request):
     if not all([code, player_name]):
         raise ValidationError('Please provide both puzzle code and your name')
 
-    puzzle = CrosswordPuzzle.objects.filter(code=code).first()
+    puzzle = CrosswordPuzzle.objects.filter(code=code).only(
+        'id', 'code', 'status', 'duration', 'waiting_room_start_time'
+    ).first()
     if not puzzle:
         raise Http404('Invalid puzzle code')
 
@@ -206,25 +242,11 @@ def join_puzzle(request):
     if puzzle.status == 'completed':
         raise ValidationError('This game has already ended')
 
-    if Player.objects.filter(puzzle=puzzle, display_name=player_name).exists():
-        raise ValidationError({
-            'error': 'This name is already taken in this puzzle',
-            'error_type': 'name_taken'
-        })
-
-    player = Player.objects.create(
-        display_name=player_name,
-        puzzle=puzzle
-    )
-    
-    # Only set waiting room timer if the game is still waiting
-    if puzzle.status == 'waiting' and not puzzle.waiting_room_start_time:
-        puzzle.waiting_room_start_time = timezone.now()
-        puzzle.save(update_fields=['waiting_room_start_time'])
+    player = joining.join(puzzle, player_name)
+    ranking.record(code, player.version, player.id, **ranking.player_row(player))
 
     # Set session expiry to puzzle duration plus 10 minutes buffer
-    request.session['player_id'] = str(player.id)
-    request.session.set_expiry(puzzle.duration * 60 + 600)
+    identity.remember(request.session, player, puzzle.code, puzzle.duration * 60 + 600)
 
     logger.info(f"Player {player_name} successfully joined puzzle {code}")
     return JsonResponse({
@@ -233,75 +255,276 @@ def join_puzzle(request):
         'game_status': puzzle.status  # Include game status in response
     })
 
-@require_http_methods(['GET'])
-@handle_error
-@require_player
-def get_puzzle(request, code):
-    from django.core.cache import cache
-    
-    # Try cache first for better performance
-    cache_key = f'puzzle_data_{code}'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        # Update player_id for current request
-        cached_data['player_id'] = str(request.player.id)
-        return JsonResponse(cached_data)
-    
-    # Optimized query with select_related and prefetch_related
-    puzzle = CrosswordPuzzle.objects.select_related().prefetch_related(
-        'players',
-        'words',
-        'solvedword_set__word'
-    ).filter(code=code).first()
-    
+PUZZLE_STATE_TIMEOUT = 10
+LEADERBOARD_TIMEOUT = 15
+# Players and solved words of one version, only read to answer ?since= polls
+PUZZLE_CHANGES_TIMEOUT = 60
+# Puzzles whose encoded full state this process keeps
+LOCAL_STATE_SIZE = 256
+
+class _LocalStates:
+    """
+    Thread-safe LRU of the latest encoded full state of each puzzle.
+
+    Kept in process memory rather than the cache, which would unpickle the
+    encoded bytes on every poll.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, code, version):
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(code)
+            return entry[1]
+
+    def set(self, code, version, encoded):
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is not None and entry[0] > version:
+                return
+            self._entries[code] = (version, encoded)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_local_states = _LocalStates(LOCAL_STATE_SIZE)
+
+def _changes_key(code, version):
+    # Keyed by version, so a cached copy is never stale
+    return f'puzzle_changes_{code}_{version}'
+
+def _encode_full(code, state, changes):
+    """The full response is the same for every player, so it is encoded once per version"""
+    return encoding.encode({
+        'version': state['version'],
+        'status': state['status'],
+        'duration': state['duration'],
+        'waiting_room_start_time': state['waiting_room_start_time'],
+        # Size and words never change, clients fetch them once from the snapshot
+        'snapshot_url': reverse('puzzle_snapshot', args=[code, state['snapshot_etag']]),
+        'players': [_player_fields(p) for p in changes['players'] if p['is_active']],
+        'solved_words': [_solved_fields(s) for s in changes['solved_words']],
+    })
+
+async def _load_puzzle_state(code):
+    """
+    Load the player independent state of a puzzle and its (state, changes);
+    timer transitions are applied by lifecycle.
+
+    The changes are shared through the cache for delta polls and the
+    encoded full state is kept in this process.
+    """
+    puzzle = await CrosswordPuzzle.objects.filter(code=code).annotate(snapshot_etag=F('snapshot__etag')).afirst()
     if not puzzle:
         raise Http404('Puzzle not found')
-    
-    # Handle waiting room timer logic
-    if puzzle.status == 'waiting':
-        if not puzzle.waiting_room_start_time:
-            puzzle.waiting_room_start_time = timezone.now()
-            puzzle.save(update_fields=['waiting_room_start_time'])
-        else:
-            elapsed = (timezone.now() - puzzle.waiting_room_start_time).total_seconds()
-            if elapsed >= 50:
-                puzzle.start_game()
-
-    # Mark game as completed if timer has run out
-    if puzzle.status == 'in_progress' and puzzle.time_remaining == 0:
-        puzzle.end_game()
-    
-    # Use optimized queries with prefetched data
-    players_data = list(puzzle.players.filter(is_active=True).values('id', 'display_name', 'points', 'is_creator'))
-    words_data = list(puzzle.words.values('word', 'hint', 'direction', 'start_row', 'start_col'))
-    solved_words_data = list(puzzle.solvedword_set.values_list('word__word', flat=True))
-    
-    response_data = {
-        'rows': puzzle.rows,
-        'cols': puzzle.cols,
-        'words': words_data,
+    if routers.replica_behind(puzzle.version, await cache.aget(puzzle_version_key(puzzle.id))):
+        # Never cache a state older than one already committed
+        with routers.use_primary():
+            return await _load_puzzle_state(code)
+    if puzzle.snapshot_etag is None:
+        # Snapshots are compiled with the puzzle, only one made outside create_with_words can lack one
+        logger.warning(f"Puzzle {code} has no snapshot, compiling it")
+        puzzle.snapshot_etag = await sync_to_async(snapshots.refresh)(puzzle)
+
+    players_data = [
+        player async for player in
+        puzzle.players.values('id', 'display_name', 'points', 'is_creator', 'is_active', 'version')
+    ]
+    # Answers are only ever sent for solved words
+    solved_words_data = [
+        {'id': word_id, 'word': word, 'version': version}
+        async for word_id, word, version in puzzle.solved_words.values_list('word_id', 'word__word', 'version')
+    ]
+
+    state = {
+        'version': puzzle.version,
+        'snapshot_etag': puzzle.snapshot_etag,
         'status': puzzle.status,
         'duration': puzzle.duration,
-        'time_remaining': puzzle.time_remaining,
-        'players': players_data,
-        'player_id': str(request.player.id),
-        'solved_words': solved_words_data,
+        'start_time': puzzle.start_time.isoformat() if puzzle.start_time else None,
         'waiting_room_start_time': puzzle.waiting_room_start_time.isoformat() if puzzle.waiting_room_start_time else None
     }
-    
-    # Cache for 10 seconds (balance between freshness and performance)
-    cache.set(cache_key, {k: v for k, v in response_data.items() if k != 'player_id'}, 10)
-    
-    return JsonResponse(response_data)
+    changes = {'players': players_data, 'solved_words': solved_words_data}
+    await cache.aset(_changes_key(code, state['version']), changes, PUZZLE_CHANGES_TIMEOUT)
+    _local_states.set(code, state['version'], _encode_full(code, state, changes))
+    return state, changes
+
+async def _build_puzzle_state(code):
+    state, _ = await _load_puzzle_state(code)
+    return state
+
+async def _puzzle_state(code):
+    """Shared puzzle state without its lists, cached briefly so polling players reuse one load"""
+    return await recompute.aget_or_compute(f'puzzle_data_{code}', lambda: _build_puzzle_state(code), PUZZLE_STATE_TIMEOUT)
+
+async def _puzzle_changes(code, state):
+    """(state, changes) for a delta poll, reloaded at the current version once the cached lists expired"""
+    changes = await cache.aget(_changes_key(code, state['version']))
+    if changes is None:
+        return await _load_puzzle_state(code)
+    return state, changes
+
+async def _full_state(code, state):
+    """(state, encoded full state), encoded in this process at most once per version"""
+    encoded = _local_states.get(code, state['version'])
+    if encoded is None:
+        state, changes = await _puzzle_changes(code, state)
+        encoded = _encode_full(code, state, changes)
+        _local_states.set(code, state['version'], encoded)
+    return state, encoded
+
+def _time_remaining(state):
+    """Seconds left in the game, computed per request so cached state never drifts"""
+    if state['status'] != 'in_progress' or not state['start_time']:
+        return None
+    elapsed = timezone.now() - datetime.datetime.fromisoformat(state['start_time'])
+    return max(0, state['duration'] * 60 - elapsed.total_seconds())
+
+def _player_fields(player, include_state=False):
+    fields = {
+        'id': player['id'],
+        'display_name': player['display_name'],
+        'points': player['points'],
+        'is_creator': player['is_creator'],
+    }
+    if include_state:
+        fields['is_active'] = player['is_active']
+    return fields
+
+def _solved_fields(solved):
+    return {'id': solved['id'], 'word': solved['word']}
+
+@require_http_methods(['GET'])
+@handle_error
+@require_player
+@routers.replica_reads
+async def get_puzzle(request, code):
+    """Full puzzle state, or with ?since=<version> only what changed after that version"""
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            raise ValidationError('since must be an integer version')
+
+    state = await _puzzle_state(code)
+    if since == state['version']:
+        return HttpResponseNotModified()
+
+    player_id = str(request.player.id)
+    if since is not None and since < state['version']:
+        # Only deltas need the players and solved words themselves
+        state, changes = await _puzzle_changes(code, state)
+        return JsonResponse({
+            'version': state['version'],
+            'status': state['status'],
+            'duration': state['duration'],
+            'time_remaining': _time_remaining(state),
+            'player_id': player_id,
+            'waiting_room_start_time': state['waiting_room_start_time'],
+            'delta': True,
+            'since': since,
+            'players': [_player_fields(p, include_state=True) for p in changes['players'] if p['version'] > since],
+            'solved_words': [_solved_fields(s) for s in changes['solved_words'] if s['version'] > since],
+        })
+
+    # Only the requesting player's fields are encoded per request
+    state, encoded = await _full_state(code, state)
+    return encoding.response(request, encoded, {
+        'player_id': player_id,
+        'time_remaining': _time_remaining(state),
+    })
+
+@require_http_methods(['GET'])
+@handle_error
+@require_player
+def get_snapshot(request, code, etag):
+    """Pre-compiled size and words of a puzzle; the URL carries the ETag, so the response never changes"""
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f'private, max-age={snapshots.SNAPSHOT_MAX_AGE}, immutable',
+        'Vary': 'Accept-Encoding',
+    }
+    if f'"{etag}"' in request.headers.get('If-None-Match', ''):
+        return HttpResponseNotModified(headers=headers)
+
+    data = snapshots.load(code, etag)
+    if data is None:
+        raise Http404('Snapshot not found')
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        data = gzip.decompress(data)
+    return HttpResponse(data, content_type='application/json', headers=headers)
+
+async def _event_stream(code, status):
+    """Yield SSE frames for a puzzle until the game ends or the stream ages out"""
+    subscription = broadcast.get_room(code).subscribe()
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        yield broadcast.format_sse({'id': 0, 'event': 'ready', 'data': {'status': status}})
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                message = await subscription.get(STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment frame keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield broadcast.format_sse(message)
+            if subscription.overflowed:
+                yield broadcast.format_sse({'id': message['id'], 'event': 'resync', 'data': {}})
+                break
+            if message['event'] == broadcast.EVENT_GAME_ENDED:
+                break
+    finally:
+        subscription.close()
+
+@require_http_methods(['GET'])
+async def puzzle_stream(request, code):
+    """Push puzzle events over Server-Sent Events; clients fall back to get_puzzle polling"""
+    if not isinstance(request, ASGIRequest):
+        # Streaming would pin a WSGI worker for the lifetime of the connection
+        return JsonResponse({'error': 'Streaming not available', 'fallback': 'polling'}, status=503)
+
+    if not await request.session.aget('player_id'):
+        return JsonResponse({'error': 'Session expired'}, status=401)
+    player = await identity.aresolve(request)
+    if not player:
+        return JsonResponse({'error': 'Player not found'}, status=401)
+    # Rooms are only pushed to their own players
+    if player.puzzle_code != code:
+        return JsonResponse({'error': 'Player not found in this puzzle'}, status=403)
+
+    puzzle = await CrosswordPuzzle.objects.filter(code=code).values('status').afirst()
+    if not puzzle:
+        return JsonResponse({'error': 'Puzzle not found'}, status=404)
+    if puzzle['status'] == 'completed':
+        return JsonResponse({'error': 'Game has ended'}, status=410)
+
+    response = StreamingHttpResponse(
+        _event_stream(code, puzzle['status']),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @ensure_csrf_cookie
 @require_http_methods(['POST'])
 @rate_limit('start_game', limit=10, period=60)  # 10 requests per minute
 def start_game(request, code):
     try:
-        puzzle = CrosswordPuzzle.objects.select_for_update().get(code=code)
-        
         # Get player info from session
         player_id = request.session.get('player_id')
         if not player_id:
@@ -309,17 +532,22 @@ def start_game(request, code):
 
         player = Player.objects.get(id=player_id)
 
-        # Only the first player to join can start the game
-        first_player = puzzle.players.order_by('joined_at').first()
-        if player.id != first_player.id:
-            return JsonResponse({'error': 'Only the first player can start the game'}, status=403)
+        with transaction.atomic():
+            puzzle = CrosswordPuzzle.objects.select_for_update().get(code=code)
+
+            # Only the first player to join can start the game
+            first_player = puzzle.players.order_by('joined_at').first()
+            if player.id != first_player.id:
+                return JsonResponse({'error': 'Only the first player can start the game'}, status=403)
 
-        # Prevent concurrent game starts
-        if puzzle.status != 'waiting':
-            return JsonResponse({'error': 'Game already started'}, status=400)
+            # Prevent concurrent game starts
+            if puzzle.status != 'waiting':
+                return JsonResponse({'error': 'Game already started'}, status=400)
 
-        # Start the game
-        puzzle.start_game()
+            # Start the game
+            puzzle.start_game()
+
+        lifecycle.schedule(puzzle.start_time + timedelta(minutes=puzzle.duration), code)
         logger.info(f"Game started: code={code}, start_time={puzzle.start_time}, status={puzzle.status}")
         return JsonResponse({'success': True, 'start_time': str(puzzle.start_time), 'status': puzzle.status})
     except CrosswordPuzzle.DoesNotExist:
@@ -328,57 +556,77 @@ def start_game(request, code):
         logger.error(f"Error starting game: {str(e)}", exc_info=True)
         return JsonResponse({'error': str(e)}, status=400)
 
+def _claim(code, puzzle_id, word_id, player_id):
+    """
+    Claim a word and update the answer and rank indexes, in one thread for async callers.
+
+    Returns (claim, None) or (None, error message).
+    """
+    # Concurrent guessers race on the unique constraint, not on row locks
+    claim = submission.claim_word(puzzle_id, word_id, player_id)
+    if claim is None:
+        # Our copy of the index was stale: the word was taken or the game ended elsewhere
+        if not CrosswordPuzzle.objects.filter(pk=puzzle_id, status='in_progress').exists():
+            answers.invalidate(code)
+            return None, 'Game is not in progress'
+        answers.mark_solved(code, word_id)
+        return None, 'Word already solved'
+
+    ranking.record(
+        code, claim['version'], int(player_id),
+        points=claim['points'], last_solve_at=claim['solved_at']
+    )
+    # The claim has committed, so this is handled right away
+    events.emit(events.WordSolved(puzzle_id, code, word_id))
+    return claim, None
+
 @ensure_csrf_cookie
 @require_http_methods(['POST'])
 @rate_limit('submit_word', limit=50, period=60)  # 50 requests per minute
-def submit_word(request, code):
+async def submit_word(request, code):
     try:
         data = json.loads(request.body)
         word = data.get('word')
         if not word:
             return JsonResponse({'error': 'Missing word'}, status=400)
+        if not isinstance(word, str):
+            return JsonResponse({'error': 'Word must be a string'}, status=400)
 
-        # Use select_for_update to prevent race conditions
-        puzzle = CrosswordPuzzle.objects.select_for_update().get(code=code)
-        
         # Get player info from session
-        player_id = request.session.get('player_id')
+        player_id = await request.session.aget('player_id')
         if not player_id:
             return JsonResponse({'error': 'Player not found'}, status=404)
 
-        player = Player.objects.select_for_update().get(id=player_id)
+        # Answers are checked against an in-memory index, wrong guesses never reach the database
+        index = await answers.aget_index(code)
+        if index is None:
+            return JsonResponse({'error': 'Puzzle not found'}, status=404)
 
         # Check if game is in progress
-        if puzzle.status != 'in_progress':
+        if not index.in_progress:
             return JsonResponse({'error': 'Game is not in progress'}, status=400)
 
-        # Check if word is correct and not already solved
-        puzzle_word = Word.objects.filter(puzzle=puzzle, word__iexact=word).first()
-        if puzzle_word:
-            # Check if word was already solved
-            already_solved = SolvedWord.objects.filter(puzzle=puzzle, word=puzzle_word).exists()
-            if already_solved:
-                return JsonResponse({'error': 'Word already solved'}, status=400)
-            
-            # Create solved word record
-            SolvedWord.objects.create(
-                puzzle=puzzle,
-                word=puzzle_word,
-                solved_by=player
-            )
-            
-            # Add points to player
-            player.add_points(1)
-            
-            # Clear cache for this puzzle
-            from django.core.cache import cache
-            cache.delete(f'puzzle_data_{code}')
-            cache.delete(f'leaderboard_{code}')
-            
-            return JsonResponse({'success': True, 'points': player.points})
-        else:
+        word_id = index.lookup(word)
+        if word_id is None:
             return JsonResponse({'error': 'Incorrect word'}, status=400)
-            
+        if index.is_solved(word_id):
+            return JsonResponse({'error': 'Word already solved'}, status=400)
+
+        # Only a correct guess needs the database, in a single thread hop
+        claim, error = await sync_to_async(_claim)(code, index.puzzle_id, word_id, player_id)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+
+        broadcast.publish(code, broadcast.EVENT_WORD_SOLVED, {
+            'id': word_id,
+            'word': answers.normalize(word),
+            'player_id': str(player_id),
+            'display_name': claim['display_name'],
+            'points': claim['points'],
+        })
+
+        return JsonResponse({'success': True, 'id': word_id, 'points': claim['points']})
+
     except CrosswordPuzzle.DoesNotExist:
         return JsonResponse({'error': 'Puzzle not found'}, status=404)
     except Player.DoesNotExist:
@@ -391,26 +639,38 @@ def submit_word(request, code):
 
 @require_http_methods(["GET"])
 @rate_limit('get_players', limit=100, period=60)
-def get_players(request, code):
-    """Get all active players in a puzzle with their scores"""
+@routers.replica_reads
+async def get_players(request, code):
+    """
+    Get active players in a puzzle ranked by score, from the in-memory rank index.
+
+    ?limit=N returns only the top N players and ?around=R adds the requesting
+    player's neighbourhood of R places either side.
+    """
     try:
-        puzzle = CrosswordPuzzle.objects.get(code=code)
-        
-        # Use simpler, faster query for consistency with leaderboard
-        players = puzzle.players.filter(is_active=True).order_by('-points', 'joined_at').values(
-            'id', 
-            'display_name', 
-            'points',
-            'is_creator',
-            'joined_at'
-        )
-        
-        return JsonResponse({
-            'players': list(players),
-            'total_players': len(players)
-        })
-    except CrosswordPuzzle.DoesNotExist:
-        return JsonResponse({'error': 'Puzzle not found'}, status=404)
+        limit = request.GET.get('limit')
+        limit = int(limit) if limit else None
+        radius = request.GET.get('around')
+        radius = int(radius) if radius else None
+        if (limit is not None and limit < 0) or (radius is not None and radius < 0):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'limit and around must be non-negative integers'}, status=400)
+
+    try:
+        index = await ranking.aget_index(code)
+        if index is None:
+            return JsonResponse({'error': 'Puzzle not found'}, status=404)
+
+        # The top list is encoded once per standings change, only the player's own fields per request
+        fields = {}
+        player_id = await request.session.aget('player_id')
+        if player_id:
+            fields['rank'] = index.rank(int(player_id))
+            if radius is not None:
+                fields['around'] = index.around(int(player_id), radius)
+
+        return encoding.response(request, index.encoded_top(limit), fields)
     except Exception as e:
         logger.error(f"Error getting players: {str(e)}", exc_info=True)
         return JsonResponse({'error': str(e)}, status=400)
@@ -420,6 +680,7 @@ def handle_session_expiry(request, puzzle):
     player_id = request.session.get('player_id')
     if player_id:
         Player.objects.filter(id=player_id).update(is_active=False)
+        identity.forget(player_id)
         del request.session['player_id']
     return JsonResponse({'error': 'Session expired'}, status=401)
 
@@ -440,11 +701,14 @@ def reconnect(request, code):
         if not player:
             return JsonResponse({'error': 'Player not found'}, status=404)
             
-        player.is_active = True
-        player.save()
-        
-        request.session['player_id'] = str(player.id)
-        request.session.set_expiry(puzzle.duration * 60)
+        with transaction.atomic():
+            player.is_active = True
+            player.version = CrosswordPuzzle.objects.bump_version(puzzle.pk)
+            player.save()
+            events.emit(events.PlayerJoined(puzzle.pk, code, player.id, player.display_name))
+
+        ranking.record(code, player.version, player.id, **ranking.player_row(player))
+        identity.remember(request.session, player, puzzle.code, puzzle.duration * 60)
         
         return JsonResponse({
             'success': True,
@@ -456,66 +720,39 @@ def reconnect(request, code):
         logger.error(f"Error reconnecting: {str(e)}", exc_info=True)
         return JsonResponse({'error': str(e)}, status=400)
 
-def leaderboard(request, code):
-    """Optimized leaderboard view with enhanced caching and query performance"""
-    from django.core.cache import cache
-    
-    # Try to get cached leaderboard data first
-    cache_key = f'leaderboard_{code}'
-    cached_data = cache.get(cache_key)
-    
-    if not cached_data:
-        # Look for puzzle with optimized query
-        puzzle = CrosswordPuzzle.objects.select_related().prefetch_related(
-            'players__solvedword_set'
-        ).filter(code=code).first()
-        
-        if not puzzle:
-            return redirect('home')
-        
-        # Get all players with their solved words count and timestamps using optimized queries
-        players_data = []
-        for player in puzzle.players.filter(is_active=True):
-            solved_words = player.solvedword_set.filter(puzzle=puzzle)
-            points = solved_words.count()
-            
-            # Get the timestamp of when they reached their current score
-            last_solve_time = None
-            if solved_words.exists():
-                last_solve_time = solved_words.order_by('-timestamp').first().timestamp
-            
-            players_data.append({
-                'name': player.name,
-                'points': points,
-                'last_solve_time': last_solve_time or player.joined_at,
-                'joined_at': player.joined_at
-            })
-        
-        # Sort players: by points descending, then by last solve time ascending (earlier = better)
-        players_data.sort(key=lambda x: (-x['points'], x['last_solve_time']))
-        
-        # Cache the results for 15 seconds to balance freshness with performance
-        cached_data = {
-            'puzzle': puzzle,
-            'players_data': players_data
+def _build_leaderboard(code):
+    puzzle = CrosswordPuzzle.objects.filter(code=code).values('id', 'code', 'status', 'version').first()
+    if puzzle and routers.replica_behind(puzzle['version'], cache.get(puzzle_version_key(puzzle['id']))):
+        with routers.use_primary():
+            return _build_leaderboard(code)
+    if puzzle:
+        return {
+            'puzzle': {'code': puzzle['code'], 'status': puzzle['status']},
+            'players_data': standings.get_standings(puzzle['id']),
         }
-        cache.set(cache_key, cached_data, 15)
-    
-    puzzle = cached_data['puzzle']
-    players_data = cached_data['players_data']
-    
+    # Old games only live on as archive records
+    archived = archive.archived_standings(code)
+    if archived is None:
+        return None
+    return {'puzzle': archived[0], 'players_data': archived[1]}
+
+@routers.replica_reads
+def leaderboard(request, code):
+    """Leaderboard read from the materialized standings, cached as plain data"""
+    cached_data = recompute.get_or_compute(f'leaderboard_{code}', lambda: _build_leaderboard(code), LEADERBOARD_TIMEOUT)
+    if cached_data is None:
+        return redirect('home')
+
     context = {
-        'puzzle': puzzle,
+        'puzzle': cached_data['puzzle'],
         'puzzle_code': code,
-        'players': players_data
+        'players': cached_data['players_data']
     }
-    
-    # Mark puzzle as inactive instead of deleting it immediately
-    # This preserves the data for the leaderboard display
-    if puzzle.is_active:
-        puzzle.is_active = False
-        puzzle.save()
-        # Clear cache since puzzle status changed
-        cache.delete(cache_key)
-    
     return render(request, 'leaderboard.html', context)
+
+@require_http_methods(['GET'])
+def metrics(request):
+    """Request, query and cache metrics of this process in Prometheus text format"""
+    if not instrumentation.authorized(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return HttpResponse(instrumentation.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
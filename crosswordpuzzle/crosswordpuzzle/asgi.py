@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crosswordpuzzle.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings
+
+if settings.CROSSWORD_LIFECYCLE_THREAD:
+    from crossword import lifecycle
+    lifecycle.start_background_thread()
@@ -1,5 +1,5 @@
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'crossword.instrumentation.InstrumentationMiddleware',
+    'crossword.routers.ReadYourWritesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -78,21 +80,88 @@ DATABASES = {
     }
 }
 
-# Caching configuration - using database cache for simplicity on Render
+# Read replicas of the primary, comma separated hosts. Polling views read from
+# them through crossword.routers; tests mirror them onto the primary.
+for number, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), 1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+CROSSWORD_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['crossword.routers.ReplicaRouter']
+# Seconds a client keeps reading from the primary after a write, above the usual replication lag
+CROSSWORD_REPLICA_STICKY_SECONDS = config('CROSSWORD_REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# Caching configuration - in-process L1 in front of a shared L2. Locks and
+# counters rely on the L2's add and incr being atomic across processes, which
+# Redis provides; without REDIS_URL the L2 is a table on the primary database.
+REDIS_URL = config('REDIS_URL', default='')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'cache_table',
+        'BACKEND': 'crossword.cache_backends.TieredCache',
+        'LOCATION': 'crossword',
         'TIMEOUT': 300,  # 5 minutes default timeout
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+            'L1_MAX_ENTRIES': 5000,
+            'LOCAL_TIMEOUT': 2,  # Seconds a value may be served from process memory
+            'L2_ALIAS': 'shared',
+            'PREFIX_POLICIES': {
+                'puzzle_data_': {'timeout': 10, 'local_timeout': 1},
+                'leaderboard_': {'timeout': 15, 'local_timeout': 5},
+                'player_identity_': {'timeout': 60, 'local_timeout': 30},
+                'puzzle_version_': {'local_timeout': 1},
+                # Answer indexes keep their own process-local LRU
+                'answers_': {'local_timeout': 0},
+                # Counters must be shared between processes
+                'ratelimit:': {'local_timeout': 0},
+                # So are the locks that let one request rebuild a stale value
+                'rebuild:': {'local_timeout': 0},
+            },
+        }
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': 300,
+    } if REDIS_URL else {
+        'BACKEND': 'crossword.cache_backends.DatabaseCache',
+        'LOCATION': 'cache_table',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
             'CULL_FREQUENCY': 3,  # Remove 1/3 of entries when MAX_ENTRIES is reached
         }
-    }
+    },
+}
+
+# Rate limits per endpoint (sliding window), overriding the defaults in views.py
+CROSSWORD_RATE_LIMITS = {
+    'start_game': {'limit': 10, 'period': 60},
+    'submit_word': {'limit': 50, 'period': 60},
+    'get_players': {'limit': 100, 'period': 60},
+    'reconnect': {'limit': 10, 'period': 60},
+}
+CROSSWORD_RATE_LIMIT_STORAGE = 'crossword.ratelimit.CacheStorage'
+
+# Most players a single puzzle admits, 0 for no limit
+CROSSWORD_ROOM_CAPACITY = config('CROSSWORD_ROOM_CAPACITY', default=0, cast=int)
+
+# Game starts and ends are applied by a scheduler thread in each server process.
+# Disable when a separate `manage.py run_lifecycle` process does this instead.
+CROSSWORD_LIFECYCLE_THREAD = config('CROSSWORD_LIFECYCLE_THREAD', default=True, cast=bool)
+
+# Request instrumentation, exported at /internal/metrics/ in Prometheus text format
+CROSSWORD_METRICS = {
+    # Share of requests whose SQL queries are counted and timed
+    'SAMPLE_RATE': config('METRICS_SAMPLE_RATE', default=1.0, cast=float),
+    'SLOW_REQUEST_MS': config('SLOW_REQUEST_MS', default=500, cast=int),
+    # Bearer token for scrapers; without one only ALLOWED_IPS may read the metrics,
+    # and with neither the endpoint is closed
+    'TOKEN': config('METRICS_TOKEN', default=''),
+    'ALLOWED_IPS': config('METRICS_ALLOWED_IPS', default='', cast=Csv()),
 }
 
-# Session configuration for better performance
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Session configuration for better performance: the player id, puzzle code and
+# display name travel in a signed cookie, so reading a session needs no query
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
 SESSION_CACHE_ALIAS = 'default'
 SESSION_COOKIE_AGE = 3600  # 1 hour
 SESSION_SAVE_EVERY_REQUEST = False
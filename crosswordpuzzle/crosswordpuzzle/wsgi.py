@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'crosswordpuzzle.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.CROSSWORD_LIFECYCLE_THREAD:
+    from crossword import lifecycle
+    lifecycle.start_background_thread()
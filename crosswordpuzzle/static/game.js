@@ -33,6 +33,7 @@ document.addEventListener('DOMContentLoaded', function() {
     let basePollingInterval = 2000; // Base interval: 2 seconds
     let fastPollingInterval = 1000;  // Fast interval: 1 second (during active gameplay)
     let slowPollingInterval = 5000;  // Slow interval: 5 seconds (when idle)
+    let streamPollingInterval = 15000; // Version check while streaming: 15 seconds
     let currentPollingInterval = basePollingInterval;
     let lastActivityTime = Date.now();
     let activityThreshold = 10000; // 10 seconds of inactivity before slowing down
@@ -51,6 +52,8 @@ document.addEventListener('DOMContentLoaded', function() {
     let waitingRoomTimer = null;
     let waitingRoomTimerStarted = false;
     let gameCompletedRedirectStarted = false; // Flag to prevent multiple redirections
+    let eventSource = null; // Server-Sent Events channel, polling is the fallback
+    let refreshQueued = false;
 
     // Add loading indicator
     const loadingIndicator = document.createElement('div');
@@ -108,12 +111,14 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // Fetch puzzle data with retry logic
-    async function fetchPuzzleData(retries = 3, silent = false) {
+    // Pass the last seen version as `since` to receive only changes, null means nothing changed
+    async function fetchPuzzleData(retries = 3, silent = false, since = null) {
         if (!silent) showLoading();
+        const url = since === null ? `/api/puzzle/${puzzleCode}/` : `/api/puzzle/${puzzleCode}/?since=${since}`;
         
         for (let i = 0; i < retries; i++) {
             try {
-                const response = await fetch(`/api/puzzle/${puzzleCode}/`, {
+                const response = await fetch(url, {
                     headers: {
                         'X-CSRFToken': getCsrfToken()
                     }
@@ -128,6 +133,10 @@ document.addEventListener('DOMContentLoaded', function() {
                     if (!silent) hideLoading();
                     throw new Error('Session expired');
                 }
+                if (response.status === 304) {
+                    if (!silent) hideLoading();
+                    return null;
+                }
                 if (!response.ok) {
                     const error = await response.json();
                     throw new Error(error.error || 'Failed to fetch puzzle data');
@@ -157,6 +166,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error('Failed to fetch puzzle data');
             }
 
+            // Size, slots and hints come from the immutable snapshot, cached by the browser
+            const snapshot = await fetchWithTimeout(puzzle.snapshot_url);
+            Object.assign(puzzle, await snapshot.json());
+
             gameData = puzzle;
             
             // Store puzzle start time
@@ -172,7 +185,7 @@ document.addEventListener('DOMContentLoaded', function() {
             initializeGrid();
             initializeClues();
             updateGameState(puzzle);
-            startPolling();
+            startEventStream();
         } catch (error) {
             console.error('Failed to initialize game:', error);
             showError('Failed to initialize game. Please refresh the page.');
@@ -237,8 +250,8 @@ document.addEventListener('DOMContentLoaded', function() {
     function initializeBlackCells() {
         // Create a map of all cells that are part of words
         const usedCells = new Set();
-        puzzle.words.forEach(word => {
-            const length = word.word.length;
+        puzzle.slots.forEach(word => {
+            const length = word.length;
             for (let i = 0; i < length; i++) {
                 if (word.direction === 'across') {
                     usedCells.add(`${word.start_row},${word.start_col + i}`);
@@ -272,7 +285,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const cellNumberMap = new Map(); // Store mapping of cell position to number
 
         // Sort words by row first, then column to ensure consistent numbering
-        const sortedWords = [...puzzle.words].sort((a, b) => {
+        const sortedWords = [...puzzle.slots].sort((a, b) => {
             if (a.start_row !== b.start_row) {
                 return a.start_row - b.start_row;
             }
@@ -409,8 +422,8 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function findWordAtPosition(row, col) {
-        return puzzle.words.find(word => {
-            const length = word.word.length;
+        return puzzle.slots.find(word => {
+            const length = word.length;
             if (word.direction === 'across') {
                 return row === word.start_row && col >= word.start_col && col < word.start_col + length;
             } else {
@@ -430,8 +443,8 @@ document.addEventListener('DOMContentLoaded', function() {
         const currentWord = findWordAtPosition(selectedCell.row, selectedCell.col);
         if (!currentWord) return;
 
-        const currentIndex = puzzle.words.indexOf(currentWord);
-        const nextWord = puzzle.words[(currentIndex + 1) % puzzle.words.length];
+        const currentIndex = puzzle.slots.indexOf(currentWord);
+        const nextWord = puzzle.slots[(currentIndex + 1) % puzzle.slots.length];
 
         // Select the first cell of the next word
         const cell = document.querySelector(
@@ -450,7 +463,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
 
         // Highlight the word cells
-        for (let i = 0; i < word.word.length; i++) {
+        for (let i = 0; i < word.length; i++) {
             const row = word.direction === 'across' ? word.start_row : word.start_row + i;
             const col = word.direction === 'across' ? word.start_col + i : word.start_col;
             const cell = document.querySelector(`.cell[data-row="${row}"][data-col="${col}"]`);
@@ -491,7 +504,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         // Get the current answer
         let answer = '';
-        for (let i = 0; i < word.word.length; i++) {
+        for (let i = 0; i < word.length; i++) {
             const row = word.direction === 'across' ? word.start_row : word.start_row + i;
             const col = word.direction === 'across' ? word.start_col + i : word.start_col;
             const input = document.querySelector(
@@ -501,7 +514,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         // Check if the answer is correct
-        if (answer.length === word.word.length) {
+        if (answer.length === word.length) {
             // Mark the word as completed
             const clue = document.querySelector(
                 `.clues-container li[data-direction="${word.direction}"][data-start-row="${word.start_row}"][data-start-col="${word.start_col}"]`
@@ -532,6 +545,112 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Fold a delta response into the last full state, full responses replace it
+    function mergeState(data) {
+        if (!data.delta || !gameData) {
+            return data;
+        }
+
+        const playersById = new Map(gameData.players.map(player => [player.id, player]));
+        data.players.forEach(player => {
+            if (player.is_active) {
+                playersById.set(player.id, player);
+            } else {
+                playersById.delete(player.id);
+            }
+        });
+
+        const known = new Set((gameData.solved_words || []).map(solved => solved.id));
+        const solvedWords = (gameData.solved_words || []).concat(
+            data.solved_words.filter(solved => !known.has(solved.id))
+        );
+
+        return {
+            ...gameData,
+            version: data.version,
+            status: data.status,
+            duration: data.duration,
+            time_remaining: data.time_remaining,
+            waiting_room_start_time: data.waiting_room_start_time,
+            players: Array.from(playersById.values()),
+            solved_words: solvedWords
+        };
+    }
+
+    // Fetch only what changed since the state we hold
+    async function fetchStateUpdate() {
+        const since = gameData && gameData.version !== undefined ? gameData.version : null;
+        const data = await fetchPuzzleData(3, true, since);
+        return data === null ? null : mergeState(data);
+    }
+
+    function stopPolling() {
+        if (pollingInterval) {
+            clearInterval(pollingInterval);
+            pollingInterval = null;
+        }
+    }
+
+    // Subscribe to pushed game events, falling back to polling when streaming is unavailable
+    function startEventStream() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+
+        let opened = false;
+        eventSource = new EventSource(`/api/puzzle/${puzzleCode}/stream/`);
+
+        eventSource.addEventListener('ready', () => {
+            opened = true;
+            stopPolling();
+            // The stream only carries events published by the worker serving it,
+            // so keep a slow ?since= check for changes made by other processes
+            pollingInterval = setInterval(refreshFromServer, streamPollingInterval);
+        });
+
+        ['word_solved', 'player_joined', 'game_started', 'game_ended', 'resync'].forEach(eventName => {
+            eventSource.addEventListener(eventName, () => refreshFromServer());
+        });
+
+        eventSource.onerror = () => {
+            eventSource.close();
+            eventSource = null;
+            if (gameCompletedRedirectStarted) return;
+
+            startPolling();
+            if (opened) {
+                // Stream aged out or dropped after working, try to upgrade again
+                setTimeout(startEventStream, 3000);
+            }
+        };
+    }
+
+    // Fetch fresh state once, coalescing events that arrive while a request is in flight
+    async function refreshFromServer() {
+        if (gameCompletedRedirectStarted) return;
+        if (pendingRequest) {
+            refreshQueued = true;
+            return;
+        }
+
+        try {
+            pendingRequest = true;
+            lastRequestTime = Date.now();
+            const data = await fetchStateUpdate();
+            if (data) updateGameState(data);
+        } catch (error) {
+            console.error('Refresh error:', error);
+        } finally {
+            pendingRequest = false;
+        }
+
+        if (refreshQueued) {
+            refreshQueued = false;
+            refreshFromServer();
+        }
+    }
+
     function startPolling() {
         if (pollingInterval) {
             clearInterval(pollingInterval);
@@ -574,8 +693,8 @@ document.addEventListener('DOMContentLoaded', function() {
             try {
                 pendingRequest = true;
                 lastRequestTime = now;
-                const data = await fetchPuzzleData(3, true);
-                updateGameState(data);
+                const data = await fetchStateUpdate();
+                if (data) updateGameState(data);
             } catch (error) {
                 console.error('Polling error:', error);
                 // Don't show error for polling failures to avoid spam
@@ -621,10 +740,11 @@ document.addEventListener('DOMContentLoaded', function() {
         updatePlayersList(data.players);
         // Disable cells for all solved words
         if (data.solved_words && Array.isArray(data.solved_words)) {
-            data.solved_words.forEach(wordStr => {
-                const wordObj = puzzle.words.find(w => w.word === wordStr);
+            // Answers arrive only once solved, reveal them in the grid
+            data.solved_words.forEach(solved => {
+                const wordObj = puzzle.slots.find(slot => slot.id === solved.id);
                 if (wordObj) {
-                    disableWordCells(wordObj);
+                    disableWordCells(wordObj, solved.word);
                 }
             });
         }
@@ -653,6 +773,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 clearInterval(pollingInterval);
                 pollingInterval = null;
             }
+            if (eventSource) {
+                eventSource.close();
+                eventSource = null;
+            }
             if (timerInterval) {
                 clearInterval(timerInterval);
                 timerInterval = null;
@@ -712,7 +836,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
             if (secondsLeft <= 0) {
                 clearWaitingRoomTimer();
-                // Trigger backend to move game to in_progress (see step 3)
+                // Ask the backend for the new status, pushed clients are not polling
+                refreshFromServer();
             }
         }
 
@@ -778,12 +903,13 @@ document.addEventListener('DOMContentLoaded', function() {
         // startGameBtn.disabled = false;
     }
 
-    function disableWordCells(wordObj) {
-        for (let i = 0; i < wordObj.word.length; i++) {
+    function disableWordCells(wordObj, answer = null) {
+        for (let i = 0; i < wordObj.length; i++) {
             const row = wordObj.direction === 'across' ? wordObj.start_row : wordObj.start_row + i;
             const col = wordObj.direction === 'across' ? wordObj.start_col + i : wordObj.start_col;
             const cell = document.querySelector(`.cell[data-row="${row}"][data-col="${col}"] input`);
             if (cell) {
+                if (answer) cell.value = answer[i];
                 cell.disabled = true;
                 cell.classList.add('inactive');
             }
@@ -819,6 +945,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 clearInterval(timerInterval);
                 timerElement.textContent = 'Time\'s up!';
                 timerElement.classList.add('warning');
+                refreshFromServer();
                 return;
             }
             timerElement.textContent = `Time Remaining: ${formatTime(seconds)}`;
@@ -890,14 +1017,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         // Group words by direction and sort by their grid number
-        const acrossWords = puzzle.words.filter(w => w.direction === 'across')
+        const acrossWords = puzzle.slots.filter(w => w.direction === 'across')
             .map(word => ({
                 ...word,
                 gridNumber: window.cellNumberMap.get(`${word.start_row},${word.start_col}`)
             }))
             .sort((a, b) => a.gridNumber - b.gridNumber);
         
-        const downWords = puzzle.words.filter(w => w.direction === 'down')
+        const downWords = puzzle.slots.filter(w => w.direction === 'down')
             .map(word => ({
                 ...word,
                 gridNumber: window.cellNumberMap.get(`${word.start_row},${word.start_col}`)